@@ -0,0 +1,94 @@
+"""
+違禁詞匹配效能測試
+比較舊的逐詞迴圈與預先編譯的 BannedWordMatcher（10 / 1k / 50k 個違禁詞）
+舊版正則模式每則訊息都要重新編譯每條規則，超過 LEGACY_REGEX_LIMIT 時只量測編譯後的匹配器
+
+用法: python -m benchmarks.bench_banned_words
+"""
+
+import random
+import re
+import string
+import time
+
+from utils.word_matcher import BannedWordMatcher
+
+SIZES = [10, 1_000, 50_000]
+MESSAGES = 200
+LEGACY_REGEX_LIMIT = 1_000
+
+
+def legacy_check(content, banned_words, case_sensitive=False, match_type="contains"):
+    """舊版 Security.check_banned_word 的實作（每則訊息逐詞檢查）"""
+    if not case_sensitive:
+        content = content.lower()
+    for word in banned_words:
+        check_word = word if case_sensitive else word.lower()
+        if match_type == "exact":
+            if content == check_word:
+                return True, word
+        elif match_type == "contains":
+            if check_word in content:
+                return True, word
+        elif match_type == "regex":
+            try:
+                pattern = re.compile(check_word, re.IGNORECASE if not case_sensitive else 0)
+                if pattern.search(content):
+                    return True, word
+            except re.error:
+                continue
+    return False, None
+
+
+def random_word(rng, length):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def make_messages(rng, words):
+    """大部分為正常訊息，約 5% 含有違禁詞"""
+    messages = []
+    for _ in range(MESSAGES):
+        text = ' '.join(random_word(rng, rng.randint(2, 8)) for _ in range(rng.randint(5, 40)))
+        if rng.random() < 0.05:
+            text += ' ' + rng.choice(words)
+        messages.append(text)
+    return messages
+
+
+def timed(func, messages):
+    start = time.perf_counter()
+    hits = sum(1 for message in messages if func(message))
+    return (time.perf_counter() - start) / len(messages), hits
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'模式':<10} {'違禁詞數':>8} {'舊版 µs/訊息':>14} {'編譯 µs/訊息':>14} {'建立 ms':>9} {'加速':>8}")
+    print("-" * 70)
+    for match_type in ["contains", "exact", "regex"]:
+        for size in SIZES:
+            words = list({random_word(rng, rng.randint(4, 10)) for _ in range(size)})
+            messages = make_messages(rng, words)
+
+            build_start = time.perf_counter()
+            matcher = BannedWordMatcher(words, False, match_type)
+            build_ms = (time.perf_counter() - build_start) * 1000
+
+            compiled, compiled_hits = timed(lambda m: matcher.find(m) is not None, messages)
+            if match_type == "regex" and size > LEGACY_REGEX_LIMIT:
+                # 舊版太慢（5 萬詞每則訊息需數秒），只確認命中數與實際插入的違禁詞一致
+                word_set = set(words)
+                expected = sum(1 for m in messages if any(token in word_set for token in m.split()))
+                assert compiled_hits >= expected, f"{match_type}/{size}: 命中數不足"
+                print(f"{match_type:<10} {size:>8,} {'-':>14} {compiled * 1e6:>14.1f} {build_ms:>9.1f} {'-':>8}")
+                continue
+
+            legacy, legacy_hits = timed(lambda m: legacy_check(m, words, False, match_type)[0], messages)
+            assert legacy_hits == compiled_hits, f"{match_type}/{size}: 命中數不一致"
+
+            print(f"{match_type:<10} {size:>8,} {legacy * 1e6:>14.1f} {compiled * 1e6:>14.1f} "
+                  f"{build_ms:>9.1f} {legacy / compiled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
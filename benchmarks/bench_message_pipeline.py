@@ -0,0 +1,296 @@
+"""
+訊息管線吞吐量測試
+離線建立機器人並載入 Security、Tickets、Statistics、Leveling、CustomCommands、AutoReply，
+以假的 Guild/Member/Message 驅動真正的訊息處理階段（不連線 Discord）。
+可調整伺服器數、每個伺服器的用戶數與規則數，以及訊息速率（0 為盡快送出）。
+輸出每秒訊息數、p50/p99 延遲、磁碟寫入量與最高記憶體，並保存 JSON 結果以便比較不同版本。
+
+用法: python -m benchmarks.bench_message_pipeline [--guilds 10] [--users 500] [--rules 100]
+                                                  [--messages 20000] [--rate 0]
+                                                  [--compare benchmarks/results/message_pipeline-4.0.0.json]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import string
+import time
+from collections import Counter
+from datetime import datetime
+
+from benchmarks.fakes import FakeGuild, FakeMessage, FakeRole, next_id
+from benchmarks.harness import (
+    close_bot, compare_results, create_bot, default_output, directory_size, environment,
+    io_bytes_written, peak_rss_mb, percentile, save_results, temp_workdir
+)
+
+EXTENSIONS = ['security', 'tickets', 'statistics', 'leveling', 'custom_commands', 'auto_reply']
+VOCABULARY_SIZE = 2000
+
+COMPARE_KEYS = [
+    ('messages_per_sec', '訊息/秒', True),
+    ('latency_p50_ms', 'p50 (ms)', False),
+    ('latency_p99_ms', 'p99 (ms)', False),
+    ('disk_bytes_written', '磁碟寫入 (B)', False),
+    ('peak_rss_mb', '最高記憶體 (MB)', False),
+]
+
+
+def random_word(rng, low, high):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(low, high)))
+
+
+def build_guilds(rng, args, calls):
+    """建立假的伺服器、頻道與成員"""
+    guilds = []
+    for g in range(args.guilds):
+        guild = FakeGuild(next_id(), f'guild-{g}', calls)
+        roles = [FakeRole(next_id()) for _ in range(5)]
+        for role in roles:
+            guild.roles[role.id] = role
+        for c in range(args.channels):
+            guild.add_channel(next_id(), f'channel-{c}')
+        for u in range(args.users):
+            guild.add_member(next_id(), f'user-{g}-{u}', rng.sample(roles, rng.randint(0, 2)))
+        guilds.append(guild)
+    return guilds
+
+
+async def seed_guild(bot, guild, rng, args, vocabulary):
+    """寫入違禁詞、自動回覆、自定義命令與開啟中的客服單，回傳可觸發的詞"""
+    store = bot.data_store
+    gid = str(guild.id)
+
+    def rule_words(count):
+        words = set()
+        while len(words) < count:
+            word = random_word(rng, 6, 10)
+            if word not in vocabulary:
+                words.add(word)
+        return sorted(words)
+
+    banned = rule_words(args.rules)
+    security = bot.get_cog('SecuritySystem').get_security_data(gid)
+    security['banned_words'] = banned
+    store.mark_dirty(gid, 'security')
+
+    triggers = rule_words(args.rules)
+    now = datetime.now().isoformat()
+    match_types = ['contains', 'contains', 'contains', 'exact', 'starts_with', 'ends_with']
+    store.set(gid, 'auto_reply', {'enabled': True, 'rules': [
+        {
+            'id': i + 1,
+            'trigger': trigger,
+            'reply': '{user} 觸發了 ' + trigger,
+            'match_type': match_types[i % len(match_types)],
+            'reply_type': 'message',
+            'enabled': True,
+            'case_sensitive': False,
+            'mention_user': False,
+            'trigger_once': False,
+            'channel_ids': [],
+            'role_ids': [],
+            'triggered_count': 0,
+            'created_at': now,
+            'created_by': '0',
+        }
+        for i, trigger in enumerate(triggers)
+    ]})
+
+    command_names = rule_words(args.rules)
+    store.set(gid, 'custom_commands', {
+        name: {'response': f'{name} 的回覆', 'created_by': '0', 'created_at': now, 'uses': 0}
+        for name in command_names
+    })
+
+    tickets = bot.get_cog('Tickets')
+    data = tickets.load_data(gid)
+    data['enabled'] = True
+    members = list(guild.members.values())
+    for channel in list(guild.channels.values())[:args.ticket_channels]:
+        data['ticket_count'] += 1
+        ticket_id = str(data['ticket_count']).zfill(4)
+        owner = rng.choice(members)
+        data['tickets'][ticket_id] = {
+            'user_id': owner.id,
+            'channel_id': channel.id,
+            'channel_name': channel.name,
+            'status': 'open',
+            'created_at': now,
+        }
+        await tickets.init_transcript(gid, ticket_id, channel.name, owner)
+    tickets.save_data(gid, data)
+    tickets.tickets[gid] = data
+    tickets.index_guild(gid, data)
+    return banned, triggers, command_names
+
+
+def build_messages(rng, args, guilds, vocabulary, rules):
+    """預先產生所有訊息（不計入測試時間），約 hit_rate 比例會觸發某個規則"""
+    members = {guild.id: list(guild.members.values()) for guild in guilds}
+    channels = {guild.id: list(guild.channels.values()) for guild in guilds}
+    messages = []
+    for _ in range(args.messages):
+        guild = rng.choice(guilds)
+        content = ' '.join(rng.choices(vocabulary, k=rng.randint(3, 25)))
+        roll = rng.random()
+        banned, triggers, command_names = rules[guild.id]
+        if roll < args.hit_rate / 3:
+            content += ' ' + rng.choice(banned)
+        elif roll < args.hit_rate * 2 / 3:
+            content = rng.choice(triggers) + ' ' + content
+        elif roll < args.hit_rate:
+            content = '!' + rng.choice(command_names)
+        messages.append(FakeMessage(next_id(), content, rng.choice(members[guild.id]), rng.choice(channels[guild.id])))
+    return messages
+
+
+async def drive(pipeline, messages, rate):
+    """送出所有訊息，回傳 (總耗時, 各訊息延遲)
+
+    rate 為 0 時逐則處理，延遲即處理時間；否則依固定速率送出（開放迴路），
+    延遲從預定送出時間算起，包含排隊等待。
+    """
+    latencies = []
+    begin = time.perf_counter()
+    if rate <= 0:
+        for message in messages:
+            start = time.perf_counter()
+            await pipeline.process(message)
+            latencies.append(time.perf_counter() - start)
+    else:
+        interval = 1 / rate
+        tasks = []
+
+        async def handle(message, due):
+            await pipeline.process(message)
+            latencies.append(time.perf_counter() - due)
+
+        for i, message in enumerate(messages):
+            due = begin + i * interval
+            await asyncio.sleep(max(due - time.perf_counter(), 0))
+            tasks.append(asyncio.create_task(handle(message, due)))
+        await asyncio.gather(*tasks)
+    return time.perf_counter() - begin, latencies
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    calls = Counter()
+    vocabulary = list({random_word(rng, 2, 8) for _ in range(VOCABULARY_SIZE)})
+    guilds = build_guilds(rng, args, calls)
+
+    with temp_workdir(args.keep_data) as workdir:
+        # cog 的載入與處罰訊息不輸出到終端
+        with contextlib.redirect_stdout(io.StringIO()):
+            bot = await create_bot(EXTENSIONS, calls)
+            rules = {guild.id: await seed_guild(bot, guild, rng, args, set(vocabulary)) for guild in guilds}
+            await bot.data_store.flush()
+            await bot.get_cog('Tickets').transcript_writer.flush()
+            messages = build_messages(rng, args, guilds, vocabulary, rules)
+            calls.clear()
+
+            written_before = io_bytes_written()
+            elapsed, latencies = await drive(bot.message_pipeline, messages, args.rate)
+            pipeline = bot.message_pipeline
+            stages = pipeline.stats()
+            stopped = pipeline.stopped
+            backend = bot.data_store.backend.name
+            # 寫入所有待保存的數據，計入磁碟寫入量
+            await close_bot(bot)
+            written_after = io_bytes_written()
+        data_bytes = directory_size(os.path.join(workdir, 'data'))
+
+    latencies.sort()
+    results = {
+        'messages': len(messages),
+        'elapsed_s': elapsed,
+        'messages_per_sec': len(messages) / elapsed if elapsed else 0.0,
+        'latency_mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        'latency_p50_ms': percentile(latencies, 0.50) * 1000,
+        'latency_p99_ms': percentile(latencies, 0.99) * 1000,
+        'latency_max_ms': latencies[-1] * 1000 if latencies else 0.0,
+        'stopped': stopped,
+        'disk_bytes_written': written_after - written_before if written_before is not None else None,
+        'data_dir_bytes': data_bytes,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    return {
+        'benchmark': 'message_pipeline',
+        'environment': environment(),
+        'config': {
+            'guilds': args.guilds,
+            'users': args.users,
+            'channels': args.channels,
+            'rules': args.rules,
+            'ticket_channels': args.ticket_channels,
+            'messages': args.messages,
+            'rate': args.rate,
+            'hit_rate': args.hit_rate,
+            'seed': args.seed,
+            'backend': backend,
+        },
+        'results': results,
+        'stages': stages,
+        'stubbed_calls': dict(calls.most_common()),
+    }
+
+
+def print_report(result):
+    config, results = result['config'], result['results']
+    print(f"\n⏱️  訊息管線測試（{config['guilds']} 個伺服器 × {config['users']} 位用戶，"
+          f"每種規則 {config['rules']} 條，{config['backend']} 存儲）")
+    print("-" * 70)
+    print(f"   訊息數:       {results['messages']:,}（被停止 {results['stopped']:,}）")
+    print(f"   吞吐量:       {results['messages_per_sec']:,.0f} 則/秒（{results['elapsed_s']:.2f} 秒）")
+    print(f"   延遲:         平均 {results['latency_mean_ms']:.3f}ms  p50 {results['latency_p50_ms']:.3f}ms  "
+          f"p99 {results['latency_p99_ms']:.3f}ms  最大 {results['latency_max_ms']:.1f}ms")
+    written = results['disk_bytes_written']
+    print(f"   磁碟寫入:     {'不支援' if written is None else f'{written:,} B'}"
+          f"（數據目錄 {results['data_dir_bytes']:,} B）")
+    peak = results['peak_rss_mb']
+    print(f"   最高記憶體:   {'不支援' if peak is None else f'{peak:.1f} MB'}")
+    print(f"\n{'階段':<18}{'次數':>10}{'平均 µs':>12}{'最大 ms':>12}")
+    for name, timing in result['stages'].items():
+        print(f"{name:<18}{timing['calls']:>10,}{timing['avg_ms'] * 1000:>12.1f}{timing['max_ms']:>12.2f}")
+    if result['stubbed_calls']:
+        print("\n略過的 API 呼叫: " + ', '.join(f"{name} × {count:,}" for name, count in result['stubbed_calls'].items()))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='訊息管線吞吐量測試')
+    parser.add_argument('--guilds', type=int, default=10, help='伺服器數量')
+    parser.add_argument('--users', type=int, default=500, help='每個伺服器的用戶數')
+    parser.add_argument('--channels', type=int, default=10, help='每個伺服器的頻道數')
+    parser.add_argument('--rules', type=int, default=100, help='每個伺服器的違禁詞、自動回覆與自定義命令數量（各）')
+    parser.add_argument('--ticket-channels', type=int, default=2, help='每個伺服器開啟中的客服單頻道數')
+    parser.add_argument('--messages', type=int, default=20_000, help='訊息總數')
+    parser.add_argument('--rate', type=float, default=0, help='每秒送出的訊息數（0 為盡快送出）')
+    parser.add_argument('--hit-rate', type=float, default=0.05, help='觸發規則的訊息比例')
+    parser.add_argument('--seed', type=int, default=42, help='隨機種子')
+    parser.add_argument('--output', default=None, help='JSON 結果路徑（預設 benchmarks/results/message_pipeline-<版本>.json）')
+    parser.add_argument('--no-save', action='store_true', help='不保存 JSON 結果')
+    parser.add_argument('--compare', default=None, help='與先前的 JSON 結果比較')
+    parser.add_argument('--keep-data', action='store_true', help='保留測試產生的數據目錄')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # 切換工作目錄前先確定輸出路徑
+    output = os.path.abspath(args.output or default_output('message_pipeline'))
+    compare = os.path.abspath(args.compare) if args.compare else None
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if compare:
+        compare_results(compare, result, COMPARE_KEYS)
+    if not args.no_save:
+        save_results(output, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+效能測試用的假 Discord 物件
+只實作各 cog 處理訊息、反應、語音與成員事件用到的屬性；所有會呼叫 Discord API 的方法都是空操作，
+只在共用的 Counter 中計數（例如 calls['channel.send']）。
+"""
+
+import itertools
+from datetime import datetime, timezone
+
+_ids = itertools.count(1_100_000_000_000_000_000)
+
+
+def next_id():
+    """產生不重複的假 snowflake ID"""
+    return next(_ids)
+
+
+class FakeAsset:
+    def __init__(self, url):
+        self.url = url
+
+    def __str__(self):
+        return self.url
+
+
+class FakeRole:
+    def __init__(self, role_id, name=None):
+        self.id = role_id
+        self.name = name or f'role-{role_id}'
+        self.mention = f'<@&{role_id}>'
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, guild_id, name, calls):
+        self.id = guild_id
+        self.name = name
+        self.calls = calls  # 被略過的 API 呼叫 {名稱: 次數}
+        self.channels = {}
+        self.members = {}
+        self.roles = {}
+        self.owner_id = None
+
+    @property
+    def member_count(self):
+        return len(self.members)
+
+    @property
+    def text_channels(self):
+        return list(self.channels.values())
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+    def add_channel(self, channel_id, name):
+        channel = self.channels[channel_id] = FakeChannel(channel_id, name, self)
+        return channel
+
+    def add_member(self, user_id, name, roles=(), bot=False):
+        member = self.members[user_id] = FakeMember(user_id, name, self, roles, bot)
+        return member
+
+    async def create_text_channel(self, name, **kwargs):
+        self.calls['guild.create_text_channel'] += 1
+        return self.add_channel(next_id(), name)
+
+    async def create_voice_channel(self, name, **kwargs):
+        self.calls['guild.create_voice_channel'] += 1
+        return self.add_channel(next_id(), name)
+
+    def __str__(self):
+        return self.name
+
+
+class FakeChannel:
+    def __init__(self, channel_id, name, guild):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.mention = f'<#{channel_id}>'
+        self.members = []  # 語音頻道中的成員
+        self.category = None
+        self.overwrites = {}
+
+    async def send(self, *args, **kwargs):
+        self.guild.calls['channel.send'] += 1
+
+    async def edit(self, *args, **kwargs):
+        self.guild.calls['channel.edit'] += 1
+
+    async def delete(self, *args, **kwargs):
+        self.guild.calls['channel.delete'] += 1
+        self.guild.channels.pop(self.id, None)
+
+    async def set_permissions(self, *args, **kwargs):
+        self.guild.calls['channel.set_permissions'] += 1
+
+    def get_partial_message(self, message_id):
+        return FakeMessage(message_id, '', None, self)
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMember:
+    def __init__(self, user_id, name, guild, roles=(), bot=False):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.global_name = name
+        self.discriminator = '0'
+        self.bot = bot
+        self.guild = guild
+        self.roles = list(roles)
+        self.mention = f'<@{user_id}>'
+        self.avatar = None
+        self.display_avatar = FakeAsset(f'https://cdn.discordapp.com/embed/avatars/{user_id % 5}.png')
+        self.created_at = self.joined_at = datetime.now(timezone.utc)
+        self.voice = None
+
+    async def send(self, *args, **kwargs):
+        self.guild.calls['member.send'] += 1
+
+    async def timeout(self, *args, **kwargs):
+        self.guild.calls['member.timeout'] += 1
+
+    async def add_roles(self, *roles, **kwargs):
+        self.guild.calls['member.add_roles'] += 1
+
+    async def remove_roles(self, *roles, **kwargs):
+        self.guild.calls['member.remove_roles'] += 1
+
+    async def move_to(self, *args, **kwargs):
+        self.guild.calls['member.move_to'] += 1
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMessage:
+    def __init__(self, message_id, content, author, channel, created_at=None):
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.created_at = created_at or datetime.now(timezone.utc)
+        self.attachments = []
+        self.embeds = []
+        self.mentions = []
+        self.reference = None
+        self._state = None  # commands.Context 會讀取
+
+    async def delete(self, *args, **kwargs):
+        self.guild.calls['message.delete'] += 1
+
+    async def reply(self, *args, **kwargs):
+        self.guild.calls['message.reply'] += 1
+
+    async def add_reaction(self, *args, **kwargs):
+        self.guild.calls['message.add_reaction'] += 1
+
+    async def edit(self, *args, **kwargs):
+        self.guild.calls['message.edit'] += 1
+
+
+class FakeVoiceState:
+    def __init__(self, channel=None, self_mute=False, self_deaf=False):
+        self.channel = channel
+        self.self_mute = self_mute
+        self.self_deaf = self_deaf
+        self.mute = self.deaf = False
+
+
+def stub_http(bot, calls):
+    """把機器人的 HTTP 請求換成只計數的空操作，確保測試不會連線 Discord"""
+    async def request(route, **kwargs):
+        calls[f'http {route.method} {route.path}'] += 1
+        return None
+
+    bot.http.request = request
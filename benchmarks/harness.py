@@ -0,0 +1,149 @@
+"""
+效能測試共用工具
+在臨時工作目錄中離線建立機器人（不連線 Discord，HTTP 請求只計數）、
+量測磁碟寫入與記憶體，以及保存與比較 JSON 結果。
+"""
+
+import contextlib
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from bot import MyBot, get_version
+from benchmarks.fakes import stub_http
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+@contextlib.contextmanager
+def temp_workdir(keep=False):
+    """切換到臨時工作目錄（cog 的 data/ 都寫在這裡），結束後刪除"""
+    original = os.getcwd()
+    path = tempfile.mkdtemp(prefix='curl-bench-')
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(original)
+        if keep:
+            print(f"📁 已保留數據目錄: {path}")
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+async def create_bot(extensions, calls=None):
+    """建立離線的 MyBot（與正式運行相同的共享服務）並載入指定的 cog
+
+    數據存儲後端依 DATA_BACKEND 環境變數，與正式運行相同。
+    """
+    bot = MyBot()
+    # 正式運行時在登入時綁定事件循環（bot.loop），離線時手動執行
+    await bot._async_setup_hook()
+    bot.gateway_recorder = None  # 重播時不再錄製
+    stub_http(bot, calls if calls is not None else Counter())
+    bot.data_store.start()
+    for name in extensions:
+        await bot.load_extension(f'cogs.{name}')
+    return bot
+
+
+async def close_bot(bot):
+    """卸載 cog 並寫入所有待保存的數據"""
+    await bot.close()
+
+
+def percentile(sorted_values, q):
+    """已排序數值的分位數（最近排名法）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def io_bytes_written():
+    """本進程（含寫入執行緒）累計寫出的位元組數，不支援時回傳 None"""
+    if psutil is None:
+        return None
+    try:
+        counters = psutil.Process().io_counters()
+    except (AttributeError, NotImplementedError, psutil.Error):
+        return None
+    # Linux 的 write_chars 包含寫入頁面快取的量（tmpfs 上 write_bytes 恆為 0）
+    return getattr(counters, 'write_chars', counters.write_bytes)
+
+
+def peak_rss_mb():
+    """進程的最高常駐記憶體（MB）"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 以位元組為單位，Linux 以 KB 為單位
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+    return None
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def environment():
+    return {
+        'version': get_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def default_output(name):
+    return os.path.join(RESULTS_DIR, f"{name}-{get_version()}.json")
+
+
+def save_results(path, result):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"💾 結果已保存: {path}")
+
+
+def compare_results(path, result, keys):
+    """與先前的結果比較，keys 為 [(欄位, 說明, 數值越大越好)]"""
+    with open(path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+    print(f"\n📊 與 {previous.get('environment', {}).get('version', '?')} 比較（{path}）")
+    if previous.get('config') != result.get('config'):
+        print("   ⚠️  測試參數不同，結果不能直接比較")
+    for key, label, higher_is_better in keys:
+        old, new = previous['results'].get(key), result['results'].get(key)
+        if not old or new is None:
+            print(f"   {label:<16} {'-':>12} → {new}")
+            continue
+        change = (new - old) / old * 100
+        worse = change < 0 if higher_is_better else change > 0
+        mark = '⚠️ ' if worse and abs(change) >= 10 else '   '
+        print(f"{mark}{label:<16} {old:>12,.2f} → {new:>12,.2f}  ({change:+.1f}%)")
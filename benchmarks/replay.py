@@ -0,0 +1,312 @@
+"""
+Gateway 事件重播
+把 GatewayRecorder 錄製的事件（設定 GATEWAY_RECORD_DIR 後錄製）送回離線的機器人：
+事件經過 MyBot.dispatch，與正式運行相同地觸發所有 cog 的 listener 與訊息管線，
+Discord API 呼叫只計數不連線。可依錄製時的速度（或倍速）重播，也可盡快送出，
+用來在本地重現正式環境的流量高峰並分析各 cog 的耗時。
+
+用法: python -m benchmarks.replay data/recordings/gateway-20260101-120000.ndjson.gz
+                                  [--speed 1] [--cogs security,leveling] [--profile replay.prof]
+      --speed 0 為盡快送出，2 為兩倍速
+"""
+
+import argparse
+import asyncio
+import cProfile
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+import discord
+
+from benchmarks.fakes import FakeGuild, FakeMember, FakeMessage, FakeRole, FakeVoiceState
+from benchmarks.harness import (
+    close_bot, create_bot, environment, io_bytes_written, peak_rss_mb, percentile, save_results, temp_workdir
+)
+from utils.gateway_recorder import read_recording
+
+COGS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cogs')
+MAX_IN_FLIGHT = 1000  # 盡快送出時，同時處理中的事件上限
+
+
+class ReplayWorld:
+    """依錄製內容按需建立的假伺服器、頻道與成員"""
+
+    def __init__(self, calls):
+        self.calls = calls
+        self.guilds = {}
+
+    def guild(self, guild_id):
+        guild = self.guilds.get(guild_id)
+        if guild is None:
+            guild = self.guilds[guild_id] = FakeGuild(guild_id, f'guild-{len(self.guilds)}', self.calls)
+        return guild
+
+    def channel(self, guild_id, channel_id):
+        if channel_id is None:
+            return None
+        guild = self.guild(guild_id)
+        channel = guild.get_channel(channel_id)
+        if channel is None:
+            channel = guild.add_channel(channel_id, f'channel-{len(guild.channels)}')
+        return channel
+
+    def member(self, data):
+        guild = self.guild(data['guild_id'])
+        member = guild.get_member(data['user_id'])
+        if member is None:
+            member = guild.add_member(data['user_id'], f"user-{data['user_id'] % 100_000}", bot=data.get('bot', False))
+        if data.get('role_ids') is not None:
+            member.roles = [
+                guild.roles.setdefault(role_id, FakeRole(role_id)) for role_id in data['role_ids']
+            ]
+        return member
+
+    def get_guild(self, guild_id):
+        return self.guilds.get(guild_id)
+
+    def get_channel(self, channel_id):
+        for guild in self.guilds.values():
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                return channel
+        return None
+
+    def get_user(self, user_id):
+        for guild in self.guilds.values():
+            member = guild.get_member(user_id)
+            if member is not None:
+                return member
+        return None
+
+    def build(self, event, data):
+        """把錄製的事件轉換為 dispatch 的參數"""
+        if event == 'message':
+            author = self.member(data)
+            channel = self.channel(data['guild_id'], data['channel_id'])
+            return (FakeMessage(data['id'], data['content'], author, channel),)
+
+        if event in ('raw_reaction_add', 'raw_reaction_remove'):
+            self.member({'guild_id': data['guild_id'], 'user_id': data['user_id']})
+            payload = discord.RawReactionActionEvent(
+                {
+                    'guild_id': data['guild_id'],
+                    'channel_id': data['channel_id'],
+                    'message_id': data['message_id'],
+                    'user_id': data['user_id'],
+                    'type': 0,
+                },
+                discord.PartialEmoji.from_str(data['emoji']),
+                'REACTION_ADD' if event == 'raw_reaction_add' else 'REACTION_REMOVE'
+            )
+            return (payload,)
+
+        if event == 'voice_state_update':
+            member = self.member(data)
+            before = self.channel(data['guild_id'], data['before'])
+            after = self.channel(data['guild_id'], data['after'])
+            # 先更新頻道成員，cog 看到的狀態與 Discord 送出事件時相同
+            if before is not None and member in before.members:
+                before.members.remove(member)
+            if after is not None and member not in after.members:
+                after.members.append(member)
+            after_state = FakeVoiceState(after, data.get('self_mute', False), data.get('self_deaf', False))
+            member.voice = after_state if after is not None else None
+            return (member, FakeVoiceState(before), after_state)
+
+        if event == 'member_join':
+            return (self.member(data),)
+
+        if event == 'member_remove':
+            member = self.member(data)
+            member.guild.members.pop(member.id, None)
+            return (member,)
+
+        return None
+
+
+def attach_world(bot, world, errors, first_errors):
+    """讓機器人的快取查詢回傳假物件，並統計處理函數的錯誤"""
+    bot.get_guild = world.get_guild
+    bot.get_channel = world.get_channel
+    bot.get_user = world.get_user
+    bot._connection.user = FakeMember(1, 'bot', None, bot=True)
+
+    async def on_error(event_method, *args, **kwargs):
+        errors[event_method] += 1
+        first_errors.setdefault(event_method, repr(sys.exc_info()[1]))
+
+    bot.on_error = on_error
+
+    # 追蹤 dispatch 建立的處理任務，盡快送出時限制同時處理的數量
+    in_flight = set()
+    schedule_event = bot._schedule_event
+
+    def tracked_schedule_event(*args, **kwargs):
+        task = schedule_event(*args, **kwargs)
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        return task
+
+    bot._schedule_event = tracked_schedule_event
+    return in_flight
+
+
+async def replay(bot, world, events, in_flight, speed, limit=None):
+    """送出錄製的事件，回傳 (事件數 Counter, 總耗時, 送出延遲列表, 錄製時長, 錄製中每秒最多事件數)"""
+    counts = Counter()
+    per_second = Counter()
+    lags = []
+    last_t = 0.0
+    begin = time.perf_counter()
+    for i, entry in enumerate(events):
+        if limit is not None and i >= limit:
+            break
+        args = world.build(entry['event'], entry['data'])
+        if args is None:
+            continue
+        last_t = entry['t']
+        per_second[int(last_t)] += 1
+
+        if speed > 0:
+            due = begin + entry['t'] / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(time.perf_counter() - due, 0.0))
+        elif len(in_flight) >= MAX_IN_FLIGHT:
+            await asyncio.wait(list(in_flight), return_when=asyncio.FIRST_COMPLETED)
+
+        bot.dispatch(entry['event'], *args)
+        counts[entry['event']] += 1
+        # 讓已建立的處理任務有機會執行
+        await asyncio.sleep(0)
+
+    if in_flight:
+        await asyncio.wait(list(in_flight))
+    elapsed = time.perf_counter() - begin
+    return counts, elapsed, lags, last_t, max(per_second.values(), default=0)
+
+
+async def run(args):
+    calls = Counter()
+    errors = Counter()
+    first_errors = {}
+    world = ReplayWorld(calls)
+    header, events = read_recording(args.recording)
+
+    # 未處理的命令（例如 !自定義命令）等 discord.py 日誌不輸出到終端
+    logging.getLogger('discord').addHandler(logging.NullHandler())
+    logging.getLogger('discord').propagate = False
+
+    with temp_workdir(args.keep_data):
+        with contextlib.redirect_stdout(io.StringIO()):
+            bot = await create_bot(args.cogs, calls)
+            in_flight = attach_world(bot, world, errors, first_errors)
+            calls.clear()
+
+            profiler = cProfile.Profile() if args.profile else None
+            written_before = io_bytes_written()
+            if profiler:
+                profiler.enable()
+            counts, elapsed, lags, duration, recorded_peak = await replay(bot, world, events, in_flight, args.speed, args.limit)
+            if profiler:
+                profiler.disable()
+            handlers = bot.metrics.summary(limit=0)
+            await close_bot(bot)
+            written_after = io_bytes_written()
+
+    if profiler:
+        profiler.dump_stats(args.profile)
+
+    lags.sort()
+    total = sum(counts.values())
+    handlers = [row for row in handlers if row['metric'] in ('bot_event_handler_seconds', 'bot_message_stage_seconds')]
+    return {
+        'benchmark': 'replay',
+        'environment': environment(),
+        'config': {
+            'recording': os.path.basename(args.recording),
+            'recorded_at': header.get('started_at'),
+            'content': header.get('content'),
+            'speed': args.speed,
+            'cogs': args.cogs,
+            'limit': args.limit,
+        },
+        'results': {
+            'events': total,
+            'elapsed_s': elapsed,
+            'events_per_sec': total / elapsed if elapsed else 0.0,
+            'recorded_duration_s': duration,
+            'recorded_peak_events_per_sec': recorded_peak,
+            'lag_p50_ms': percentile(lags, 0.50) * 1000 if lags else None,
+            'lag_p99_ms': percentile(lags, 0.99) * 1000 if lags else None,
+            'handler_errors': sum(errors.values()),
+            'disk_bytes_written': written_after - written_before if written_before is not None else None,
+            'peak_rss_mb': peak_rss_mb(),
+        },
+        'event_counts': dict(counts.most_common()),
+        'handlers': handlers,
+        'errors': {event: {'count': count, 'first': first_errors.get(event)} for event, count in errors.items()},
+        'stubbed_calls': dict(calls.most_common()),
+    }
+
+
+def print_report(result, top=15):
+    config, results = result['config'], result['results']
+    speed = '盡快送出' if not config['speed'] else f"{config['speed']:g} 倍速"
+    print(f"\n🎬 重播 {config['recording']}（{speed}，錄製於 {config['recorded_at']}）")
+    print("-" * 70)
+    print(f"   事件數:       {results['events']:,}（" +
+          ', '.join(f"{name} {count:,}" for name, count in result['event_counts'].items()) + "）")
+    print(f"   錄製時長:     {results['recorded_duration_s']:.1f} 秒（最高 {results['recorded_peak_events_per_sec']:,} 個事件/秒）")
+    print(f"   重播耗時:     {results['elapsed_s']:.2f} 秒（{results['events_per_sec']:,.0f} 個事件/秒）")
+    if results['lag_p50_ms'] is not None:
+        print(f"   送出延遲:     p50 {results['lag_p50_ms']:.2f}ms  p99 {results['lag_p99_ms']:.2f}ms")
+    peak = results['peak_rss_mb']
+    print(f"   最高記憶體:   {'不支援' if peak is None else f'{peak:.1f} MB'}")
+
+    print(f"\n{'處理函數（依總耗時）':<40}{'次數':>8}{'平均 ms':>10}{'P99 ms':>10}{'總計 s':>10}")
+    for row in result['handlers'][:top]:
+        print(f"{row['labels'][:40]:<40}{row['count']:>8,}{row['avg_ms']:>10.3f}{row['p99_ms']:>10.2f}{row['total_ms'] / 1000:>10.3f}")
+    for event, error in result['errors'].items():
+        print(f"⚠️  {event}: {error['count']:,} 次錯誤（第一個: {error['first']}）")
+    if result['stubbed_calls']:
+        print("\n略過的 API 呼叫: " + ', '.join(f"{name} × {count:,}" for name, count in result['stubbed_calls'].items()))
+
+
+def parse_args():
+    all_cogs = sorted(name[:-3] for name in os.listdir(COGS_DIR) if name.endswith('.py'))
+    parser = argparse.ArgumentParser(description='重播錄製的 Gateway 事件')
+    parser.add_argument('recording', help='GatewayRecorder 錄製的 .ndjson.gz 文件')
+    parser.add_argument('--speed', type=float, default=1.0, help='重播速度倍數（0 為盡快送出）')
+    parser.add_argument('--cogs', default=','.join(all_cogs), help='要載入的 cog（逗號分隔，預設全部）')
+    parser.add_argument('--limit', type=int, default=None, help='最多重播的事件數')
+    parser.add_argument('--profile', default=None, help='以 cProfile 分析並保存到此路徑（可用 snakeviz 等工具查看）')
+    parser.add_argument('--output', default=None, help='保存 JSON 結果的路徑')
+    parser.add_argument('--keep-data', action='store_true', help='保留重播產生的數據目錄')
+    args = parser.parse_args()
+    args.cogs = [name.strip() for name in args.cogs.split(',') if name.strip()]
+    # 切換工作目錄前先轉換為絕對路徑
+    args.recording = os.path.abspath(args.recording)
+    args.profile = os.path.abspath(args.profile) if args.profile else None
+    args.output = os.path.abspath(args.output) if args.output else None
+    return args
+
+
+def main():
+    args = parse_args()
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.profile:
+        print(f"\n🔬 分析結果已保存: {args.profile}")
+    if args.output:
+        save_results(args.output, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,19 @@ from discord.ext import commands
 import os
 import asyncio
 import sys
-import json
+import time
 from datetime import datetime
 from dotenv import load_dotenv
 from web.server import WebServer
+from utils.data_store import GuildDataStore
+from utils.storage import create_backend
+from utils.leaderboard import LeaderboardService
+from utils.economy import Economy
+from utils.message_pipeline import MessagePipeline
+from utils.block_list import BlockList
+from utils.scheduler import Scheduler
+from utils.metrics import Metrics, instrument_http
+from utils.gateway_recorder import GatewayRecorder
 
 # 載入環境變數
 load_dotenv()
@@ -18,6 +27,17 @@ BOT_STATUS_TYPE = os.getenv('BOT_STATUS_TYPE', 'playing')  # playing, watching,
 BOT_STATUS_TEXT = os.getenv('BOT_STATUS_TEXT', '/help 查看指令')
 BOT_STATUS_URL = os.getenv('BOT_STATUS_URL', '')  # 僅用於 streaming 類型
 
+# 數據存儲設定
+DATA_BACKEND = os.getenv('DATA_BACKEND', 'json')  # json 或 sqlite
+DATA_SQLITE_PATH = os.getenv('DATA_SQLITE_PATH', 'data/bot.db')  # SQLite 數據庫路徑
+DATA_FLUSH_INTERVAL = float(os.getenv('DATA_FLUSH_INTERVAL', 5))  # 背景寫入間隔（秒）
+DATA_FLUSH_THRESHOLD = int(os.getenv('DATA_FLUSH_THRESHOLD', 50))  # 累積多少個待寫入文件時立即寫入
+DATA_BACKUP_COUNT = int(os.getenv('DATA_BACKUP_COUNT', 0))  # JSON 文件保留的 .bak 備份代數（0 為不備份）
+
+# Gateway 事件錄製（用於 python -m benchmarks.replay 離線重播）
+GATEWAY_RECORD_DIR = os.getenv('GATEWAY_RECORD_DIR', '')  # 錄製文件目錄（留空則不錄製）
+GATEWAY_RECORD_CONTENT = os.getenv('GATEWAY_RECORD_CONTENT', 'redact')  # redact（只保留形狀）或 full（完整內容）
+
 # 讀取版本號
 def get_version():
     """從 version.txt 讀取版本號"""
@@ -66,48 +86,114 @@ class MyBot(commands.Bot):
             help_command=None
         )
         
+        # 效能指標（事件、斜線命令、數據讀寫與 Discord API 請求的次數與延遲）
+        self.metrics = Metrics()
+        instrument_http(self.http, self.metrics)
+        
+        # 共享數據存儲（所有 cog 與網頁後台共用）
+        self.data_store = GuildDataStore(
+            'data',
+            flush_interval=DATA_FLUSH_INTERVAL,
+            flush_threshold=DATA_FLUSH_THRESHOLD,
+            backend=create_backend(DATA_BACKEND, 'data', DATA_SQLITE_PATH, backups=DATA_BACKUP_COUNT),
+            metrics=self.metrics
+        )
+        
+        # 排行榜服務（各 cog 註冊並增量維護排名）
+        self.leaderboards = LeaderboardService(self)
+        
+        # 經驗值與積分發放服務（依伺服器串行、批次更新）
+        self.economy = Economy(self)
+        
+        # 訊息處理管線（各 cog 註冊處理階段，取代各自的 on_message）
+        self.message_pipeline = MessagePipeline(self)
+        
+        # 全局封鎖名單（常駐記憶體，每個互動只做一次查詢）
+        self.blocked_users = BlockList(self.data_store)
+        
+        # 排程服務（提醒、定時消息等延遲工作，持久化並在重啟後繼續）
+        self.scheduler = Scheduler(self)
+        
+        # Gateway 事件錄製器（選用）
+        self.gateway_recorder = GatewayRecorder(GATEWAY_RECORD_DIR, GATEWAY_RECORD_CONTENT) if GATEWAY_RECORD_DIR else None
+        
         # 初始化網頁伺服器
         self.web_server = WebServer(self, port=WEB_PORT)
         
         # 設置全局交互檢查
         self.tree.interaction_check = self.global_interaction_check
+        
+        # 記錄失敗的斜線命令後，交給原本的錯誤處理
+        self._tree_on_error = self.tree.on_error
+        self.tree.on_error = self.on_tree_error
+    
+    def dispatch(self, event_name, /, *args, **kwargs):
+        """分發事件（開啟錄製時先記錄事件）"""
+        if self.gateway_recorder is not None:
+            self.gateway_recorder.record(event_name, args)
+        super().dispatch(event_name, *args, **kwargs)
+    
+    async def _run_event(self, coro, event_name, *args, **kwargs):
+        """執行事件處理函數（包含各 cog 的 listener），並記錄耗時"""
+        start = time.perf_counter()
+        try:
+            await super()._run_event(coro, event_name, *args, **kwargs)
+        finally:
+            self.metrics.events.observe(
+                (event_name, getattr(coro, '__qualname__', event_name)),
+                time.perf_counter() - start
+            )
+    
+    def observe_command(self, interaction, status):
+        """記錄斜線命令從互動檢查到完成的耗時"""
+        start = interaction.extras.pop('metrics_start', None)
+        if start is None or interaction.command is None:
+            return
+        self.metrics.commands.observe(
+            (interaction.command.qualified_name, status),
+            time.perf_counter() - start
+        )
+    
+    async def on_app_command_completion(self, interaction, command):
+        self.observe_command(interaction, 'ok')
+    
+    async def on_tree_error(self, interaction, error):
+        self.observe_command(interaction, 'error')
+        await self._tree_on_error(interaction, error)
     
     async def global_interaction_check(self, interaction: discord.Interaction) -> bool:
         """全局交互檢查 - 攔截被封鎖用戶的命令"""
+        interaction.extras['metrics_start'] = time.perf_counter()
         # 檢查用戶是否被封鎖
-        blocked_file = './data/blocked_users.json'
-        if os.path.exists(blocked_file):
-            try:
-                with open(blocked_file, 'r', encoding='utf-8') as f:
-                    blocked = json.load(f)
+        try:
+            block_info = self.blocked_users.get(interaction.user.id)
+            
+            if block_info is not None:
+                # 用戶被封鎖，禁止執行命令
+                embed = discord.Embed(
+                    title="🚫 您已被封鎖",
+                    description="您已被機器人管理員封鎖，無法使用任何功能。",
+                    color=discord.Color.red()
+                )
                 
-                if str(interaction.user.id) in blocked:
-                    # 用戶被封鎖，禁止執行命令
-                    embed = discord.Embed(
-                        title="🚫 您已被封鎖",
-                        description="您已被機器人管理員封鎖，無法使用任何功能。",
-                        color=discord.Color.red()
-                    )
-                    
-                    block_info = blocked[str(interaction.user.id)]
-                    embed.add_field(
-                        name="封鎖原因",
-                        value=block_info.get('reason', '未提供'),
-                        inline=False
-                    )
-                    embed.add_field(
-                        name="封鎖時間",
-                        value=f"<t:{int(datetime.fromisoformat(block_info.get('blocked_at', datetime.now().isoformat())).timestamp())}:F>",
-                        inline=False
-                    )
-                    
-                    embed.set_footer(text="如有疑問，請聯繫機器人管理員")
-                    
-                    await interaction.response.send_message(embed=embed, ephemeral=True)
-                    return False
-            except Exception as e:
-                print(f"檢查封鎖列表時發生錯誤: {e}")
-        
+                embed.add_field(
+                    name="封鎖原因",
+                    value=block_info.get('reason', '未提供'),
+                    inline=False
+                )
+                embed.add_field(
+                    name="封鎖時間",
+                    value=f"<t:{int(datetime.fromisoformat(block_info.get('blocked_at', datetime.now().isoformat())).timestamp())}:F>",
+                    inline=False
+                )
+                
+                embed.set_footer(text="如有疑問，請聯繫機器人管理員")
+                
+                await interaction.response.send_message(embed=embed, ephemeral=True)
+                return False
+        except Exception as e:
+            print(f"檢查封鎖列表時發生錯誤: {e}")
+    
         return True
     
     async def set_bot_status(self):
@@ -139,6 +225,16 @@ class MyBot(commands.Bot):
         print("\n📦 正在初始化系統...")
         print("─" * 62)
         
+        # 啟動數據存儲背景寫入
+        self.data_store.start()
+        
+        # 啟動排程服務（機器人就緒後開始執行到期的工作）
+        self.scheduler.start()
+        
+        # 開始錄製 Gateway 事件
+        if self.gateway_recorder is not None:
+            self.gateway_recorder.start()
+        
         # 啟動網頁控制台
         print("🌐 啟動網頁控制台...")
         await self.web_server.start()
@@ -164,6 +260,27 @@ class MyBot(commands.Bot):
         # 啟動終端輸入監聽
         self.loop.create_task(self.handle_terminal_input())
     
+    async def close(self):
+        """關閉機器人並強制寫入所有待保存的數據"""
+        try:
+            # 停止排程計時並等待執行中的工作送出
+            await self.scheduler.close()
+            # 先卸載 cog，讓各系統把記憶體中的數據交給數據存儲
+            await super().close()
+        finally:
+            try:
+                await self.web_server.stop()
+                if self.gateway_recorder is not None:
+                    await self.gateway_recorder.close()
+            finally:
+                await self.data_store.close()
+    
+    async def on_message(self, message):
+        """所有訊息只經過一次訊息管線，被停止的訊息（例如因違禁詞被刪除）不再處理指令"""
+        if await self.message_pipeline.process(message):
+            return
+        await self.process_commands(message)
+    
     async def on_ready(self):
         print("╔══════════════════════════════════════════════════════════════╗")
         print("║                    🤖 機器人已成功啟動                       ║")
@@ -235,6 +352,25 @@ class MyBot(commands.Bot):
                     print(f'║  延遲:     {str(round(self.latency * 1000)) + "ms":<45}║')
                     print(f'║  網頁:     {"http://localhost:" + str(WEB_PORT):<45}║')
                     print(f'║  運行時間: {str(datetime.now().strftime("%Y-%m-%d %H:%M:%S")):<45}║')
+                    print('╠' + '═' * 60 + '╣')
+                    print(f'║  {"⏱️ 耗時最多（總耗時排序）":<26}{"次數":>6}{"平均":>9}{"P99":>11}    ║')
+                    for row in self.metrics.summary(limit=8):
+                        name = row['metric'].removeprefix('bot_').removesuffix('_seconds')
+                        label = f"{name}:{row['labels']}"[:26]
+                        line = f"{label:<26}{row['count']:>8} {row['avg_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms"
+                        print(f'║  {line:<58}║')
+                    print('╚' + '═' * 60 + '╝\n')
+                
+                elif command.lower() in ['pipeline', '管線']:
+                    stats = self.message_pipeline.stats()
+                    print('\n' + '╔' + '═' * 60 + '╗')
+                    print('║' + ' ' * 20 + '⏱️  訊息管線耗時' + ' ' * 21 + '║')
+                    print('╠' + '═' * 60 + '╣')
+                    print(f'║  已處理訊息: {self.message_pipeline.processed:<10} 被停止: {self.message_pipeline.stopped:<20}║')
+                    for name in self.message_pipeline.stage_names:
+                        timing = stats[name]
+                        line = f"{name:<16}{timing['calls']:>8} 次  平均 {timing['avg_ms']:>7.2f}ms  最大 {timing['max_ms']:>8.2f}ms"
+                        print(f'║  {line:<58}║')
                     print('╚' + '═' * 60 + '╝\n')
                 
                 elif command.lower() in ['ver', 'version', '版本']:
@@ -252,6 +388,7 @@ class MyBot(commands.Bot):
                     print('║  restart / 重啟     重新啟動機器人' + ' ' * 21 + '║')
                     print('║  stop / 關閉        關閉機器人' + ' ' * 25 + '║')
                     print('║  status / 狀態      顯示機器人狀態' + ' ' * 21 + '║')
+                    print('║  pipeline / 管線    顯示訊息管線各階段耗時' + ' ' * 13 + '║')
                     print('║  ver / 版本         顯示當前版本' + ' ' * 23 + '║')
                     print('║  help / 幫助        顯示此幫助訊息' + ' ' * 21 + '║')
                     print('╚' + '═' * 60 + '╝\n')
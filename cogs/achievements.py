@@ -1,9 +1,8 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
-import os
 from datetime import datetime
+from utils.xp_curve import get_curve
 
 class Achievements(commands.Cog):
     """成就系統"""
@@ -165,25 +164,13 @@ class Achievements(commands.Cog):
             },
         }
     
-    def get_achievement_file(self, guild_id: int) -> str:
-        """獲取成就檔案路徑"""
-        folder = os.path.join(self.data_folder, str(guild_id))
-        os.makedirs(folder, exist_ok=True)
-        return os.path.join(folder, 'achievements.json')
-    
     def load_achievements(self, guild_id: int) -> dict:
         """載入成就數據"""
-        file_path = self.get_achievement_file(guild_id)
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+        return self.bot.data_store.get(guild_id, 'achievements')
     
     def save_achievements(self, guild_id: int, achievements: dict):
         """儲存成就數據"""
-        file_path = self.get_achievement_file(guild_id)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(achievements, f, ensure_ascii=False, indent=2)
+        self.bot.data_store.set(guild_id, 'achievements', achievements)
     
     def unlock_achievement(self, guild_id: int, user_id: int, achievement_id: str) -> bool:
         """解鎖成就"""
@@ -212,32 +199,23 @@ class Achievements(commands.Cog):
         stats = {}
         
         # 等級數據
-        levels_file = os.path.join(self.data_folder, str(guild_id), 'levels.json')
-        if os.path.exists(levels_file):
-            with open(levels_file, 'r', encoding='utf-8') as f:
-                levels_data = json.load(f)
-                user_key = str(user_id)
-                if user_key in levels_data:
-                    stats['level'] = levels_data[user_key].get('level', 0)
-                    stats['messages'] = levels_data[user_key].get('messages', 0)
+        levels_data = self.bot.data_store.get(guild_id, 'levels')
+        user_key = str(user_id)
+        if user_key in levels_data:
+            stats['level'] = get_curve(self.bot.data_store, guild_id).level_for_xp(levels_data[user_key].get('xp', 0))
+            stats['messages'] = levels_data[user_key].get('messages', 0)
         
         # 遊戲數據
-        game_file = os.path.join(self.data_folder, str(guild_id), 'game_stats.json')
-        if os.path.exists(game_file):
-            with open(game_file, 'r', encoding='utf-8') as f:
-                game_data = json.load(f)
-                user_key = str(user_id)
-                if user_key in game_data:
-                    stats['game_wins'] = game_data[user_key].get('wins', 0)
+        game_data = self.bot.data_store.get(guild_id, 'game_stats')
+        user_key = str(user_id)
+        if user_key in game_data:
+            stats['game_wins'] = game_data[user_key].get('wins', 0)
         
         # 簽到數據
-        daily_file = os.path.join(self.data_folder, str(guild_id), 'daily.json')
-        if os.path.exists(daily_file):
-            with open(daily_file, 'r', encoding='utf-8') as f:
-                daily_data = json.load(f)
-                user_key = str(user_id)
-                if user_key in daily_data:
-                    stats['daily_streak'] = daily_data[user_key].get('streak', 0)
+        daily_data = self.bot.data_store.get(guild_id, 'daily')
+        user_key = str(user_id)
+        if user_key in daily_data:
+            stats['daily_streak'] = daily_data[user_key].get('streak', 0)
         
         # 檢查成就
         unlocked = []
@@ -364,32 +342,23 @@ class Achievements(commands.Cog):
         }
         
         # 等級數據
-        levels_file = os.path.join(self.data_folder, str(guild_id), 'levels.json')
-        if os.path.exists(levels_file):
-            with open(levels_file, 'r', encoding='utf-8') as f:
-                levels_data = json.load(f)
-                user_key = str(user_id)
-                if user_key in levels_data:
-                    stats['level'] = levels_data[user_key].get('level', 0)
-                    stats['messages'] = levels_data[user_key].get('messages', 0)
+        levels_data = self.bot.data_store.get(guild_id, 'levels')
+        user_key = str(user_id)
+        if user_key in levels_data:
+            stats['level'] = get_curve(self.bot.data_store, guild_id).level_for_xp(levels_data[user_key].get('xp', 0))
+            stats['messages'] = levels_data[user_key].get('messages', 0)
         
         # 遊戲數據
-        game_file = os.path.join(self.data_folder, str(guild_id), 'game_stats.json')
-        if os.path.exists(game_file):
-            with open(game_file, 'r', encoding='utf-8') as f:
-                game_data = json.load(f)
-                user_key = str(user_id)
-                if user_key in game_data:
-                    stats['game_wins'] = game_data[user_key].get('wins', 0)
+        game_data = self.bot.data_store.get(guild_id, 'game_stats')
+        user_key = str(user_id)
+        if user_key in game_data:
+            stats['game_wins'] = game_data[user_key].get('wins', 0)
         
         # 簽到數據
-        daily_file = os.path.join(self.data_folder, str(guild_id), 'daily.json')
-        if os.path.exists(daily_file):
-            with open(daily_file, 'r', encoding='utf-8') as f:
-                daily_data = json.load(f)
-                user_key = str(user_id)
-                if user_key in daily_data:
-                    stats['daily_streak'] = daily_data[user_key].get('streak', 0)
+        daily_data = self.bot.data_store.get(guild_id, 'daily')
+        user_key = str(user_id)
+        if user_key in daily_data:
+            stats['daily_streak'] = daily_data[user_key].get('streak', 0)
         
         embed = discord.Embed(
             title="📊 成就進度",
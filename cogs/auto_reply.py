@@ -1,10 +1,20 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
-import json
-import os
-import re
 from datetime import datetime
+from utils.auto_reply_engine import AutoReplyEngine
+
+# 觸發次數寫回數據存儲的間隔（秒）
+AUTO_REPLY_COUNTER_INTERVAL = 60
+
+
+def default_auto_replies():
+    """新伺服器的自動回覆設定"""
+    return {
+        'enabled': True,
+        'rules': []
+    }
+
 
 class AutoReply(commands.Cog):
     """自動回覆系統"""
@@ -12,160 +22,117 @@ class AutoReply(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.data_folder = './data'
+        self.engines = {}  # {guild_id: (規則物件 id, AutoReplyEngine)}
+        self.dirty_guilds = set()  # 觸發次數有變動、等待寫回的伺服器
+        self.flush_counters.start()
+        self.bot.message_pipeline.register('auto_reply', self.process_message, documents=('auto_reply',))
     
-    def get_auto_reply_file(self, guild_id):
-        """獲取自動回覆數據文件路徑"""
-        return os.path.join(self.data_folder, str(guild_id), 'auto_reply.json')
+    def cog_unload(self):
+        """停止背景任務並寫回觸發次數"""
+        self.bot.message_pipeline.unregister('auto_reply')
+        self.flush_counters.cancel()
+        self.save_counters()
     
     def load_auto_replies(self, guild_id):
         """載入自動回覆規則"""
-        file_path = self.get_auto_reply_file(guild_id)
-        
-        if not os.path.exists(file_path):
-            return {
-                'enabled': True,
-                'rules': []
-            }
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {
-                'enabled': True,
-                'rules': []
-            }
+        return self.bot.data_store.get(guild_id, 'auto_reply', default_auto_replies)
     
     def save_auto_replies(self, guild_id, data):
         """保存自動回覆規則"""
-        file_path = self.get_auto_reply_file(guild_id)
-        
-        # 確保目錄存在
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        self.bot.data_store.set(guild_id, 'auto_reply', data)
+        self.invalidate_engine(guild_id)
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """監聽消息並觸發自動回覆"""
-        # 忽略機器人自己的消息
-        if message.author.bot:
-            return
-        
-        # 忽略沒有 guild 的消息（私訊）
-        if not message.guild:
-            return
+    def invalidate_engine(self, guild_id):
+        """規則變更後清除已編譯的規則引擎"""
+        self.engines.pop(str(guild_id), None)
+    
+    def get_engine(self, guild_id, data):
+        """獲取伺服器已編譯的規則引擎（只在規則變更後重新建立）"""
+        guild_id = str(guild_id)
+        rules = data.get('rules', [])
+        cached = self.engines.get(guild_id)
+        # 規則列表被整份替換時也需要重新建立
+        if cached is None or cached[0] != id(rules):
+            cached = (id(rules), AutoReplyEngine(rules))
+            self.engines[guild_id] = cached
+        return cached[1]
+    
+    def save_counters(self):
+        """將累積的觸發次數寫回數據存儲"""
+        dirty, self.dirty_guilds = self.dirty_guilds, set()
+        for guild_id in dirty:
+            self.bot.data_store.mark_dirty(guild_id, 'auto_reply')
+    
+    @tasks.loop(seconds=AUTO_REPLY_COUNTER_INTERVAL)
+    async def flush_counters(self):
+        """定期寫回觸發次數"""
+        self.save_counters()
+    
+    async def process_message(self, ctx):
+        """訊息管線階段：觸發自動回覆"""
+        message = ctx.message
         
         # 載入自動回覆規則
-        data = self.load_auto_replies(message.guild.id)
+        data = ctx.config('auto_reply', default_auto_replies)
         
         # 檢查是否啟用
         if not data.get('enabled', True):
             return
         
-        rules = data.get('rules', [])
+        # 找出命中的規則（依規則順序）
+        matched_rules = self.get_engine(ctx.guild_id, data).match(
+            ctx.content,
+            ctx.channel_id,
+            ctx.role_ids,
+            ctx.content_lower
+        )
         
-        # 遍歷所有規則
-        for rule in rules:
-            # 檢查規則是否啟用
-            if not rule.get('enabled', True):
-                continue
+        for rule in matched_rules:
+            # 獲取回覆內容
+            reply_content = rule.get('reply', '')
             
-            # 檢查頻道限制
-            channel_ids = rule.get('channel_ids', [])
-            if channel_ids and str(message.channel.id) not in channel_ids:
-                continue
-            
-            # 檢查角色限制
-            role_ids = rule.get('role_ids', [])
-            if role_ids:
-                user_role_ids = [str(role.id) for role in message.author.roles]
-                if not any(role_id in user_role_ids for role_id in role_ids):
-                    continue
+            # 替換變量
+            reply_content = reply_content.replace('{user}', message.author.mention)
+            reply_content = reply_content.replace('{username}', message.author.name)
+            reply_content = reply_content.replace('{server}', message.guild.name)
+            reply_content = reply_content.replace('{channel}', message.channel.mention)
             
-            # 檢查匹配類型
-            match_type = rule.get('match_type', 'contains')
-            trigger = rule.get('trigger', '')
-            message_content = message.content
+            # 發送回覆
+            reply_type = rule.get('reply_type', 'message')
             
-            matched = False
-            
-            if match_type == 'exact':
-                # 完全匹配
-                matched = message_content == trigger
-            elif match_type == 'contains':
-                # 包含關鍵詞
-                if rule.get('case_sensitive', False):
-                    matched = trigger in message_content
-                else:
-                    matched = trigger.lower() in message_content.lower()
-            elif match_type == 'starts_with':
-                # 以...開頭
-                if rule.get('case_sensitive', False):
-                    matched = message_content.startswith(trigger)
+            try:
+                if reply_type == 'reply':
+                    # 回覆消息
+                    await message.reply(reply_content, mention_author=rule.get('mention_user', False))
+                elif reply_type == 'dm':
+                    # 私訊用戶
+                    try:
+                        await message.author.send(reply_content)
+                    except:
+                        pass  # 無法發送私訊時忽略
+                elif reply_type == 'react':
+                    # 添加反應
+                    try:
+                        await message.add_reaction(rule.get('reaction', '👍'))
+                    except:
+                        pass
                 else:
-                    matched = message_content.lower().startswith(trigger.lower())
-            elif match_type == 'ends_with':
-                # 以...結尾
-                if rule.get('case_sensitive', False):
-                    matched = message_content.endswith(trigger)
-                else:
-                    matched = message_content.lower().endswith(trigger.lower())
-            elif match_type == 'regex':
-                # 正則表達式
-                try:
-                    flags = 0 if rule.get('case_sensitive', False) else re.IGNORECASE
-                    matched = re.search(trigger, message_content, flags=flags) is not None
-                except:
-                    continue
-            
-            if matched:
-                # 獲取回覆內容
-                reply_content = rule.get('reply', '')
-                
-                # 替換變量
-                reply_content = reply_content.replace('{user}', message.author.mention)
-                reply_content = reply_content.replace('{username}', message.author.name)
-                reply_content = reply_content.replace('{server}', message.guild.name)
-                reply_content = reply_content.replace('{channel}', message.channel.mention)
-                
-                # 發送回覆
-                reply_type = rule.get('reply_type', 'message')
+                    # 發送正常消息
+                    await message.channel.send(reply_content)
                 
-                try:
-                    if reply_type == 'reply':
-                        # 回覆消息
-                        await message.reply(reply_content, mention_author=rule.get('mention_user', False))
-                    elif reply_type == 'dm':
-                        # 私訊用戶
-                        try:
-                            await message.author.send(reply_content)
-                        except:
-                            pass  # 無法發送私訊時忽略
-                    elif reply_type == 'react':
-                        # 添加反應
-                        try:
-                            await message.add_reaction(rule.get('reaction', '👍'))
-                        except:
-                            pass
-                    else:
-                        # 發送正常消息
-                        await message.channel.send(reply_content)
-                    
-                    # 記錄觸發次數
-                    rule['triggered_count'] = rule.get('triggered_count', 0) + 1
-                    rule['last_triggered'] = datetime.now().isoformat()
-                    self.save_auto_replies(message.guild.id, data)
-                    
-                    # 如果設定為只觸發一次，則停止
-                    if rule.get('trigger_once', False):
-                        break
+                # 記錄觸發次數
+                rule['triggered_count'] = rule.get('triggered_count', 0) + 1
+                rule['last_triggered'] = datetime.now().isoformat()
+                self.dirty_guilds.add(ctx.guild_id)
                 
-                except Exception as e:
-                    print(f"自動回覆錯誤: {e}")
-                    continue
-    
+                # 如果設定為只觸發一次，則停止
+                if rule.get('trigger_once', False):
+                    break
+            
+            except Exception as e:
+                print(f"自動回覆錯誤: {e}")
+                continue
+
     # Slash Commands
     auto_reply = app_commands.Group(name="自動回覆", description="自動回覆系統管理")
     
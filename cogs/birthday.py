@@ -1,9 +1,12 @@
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
-import json
+from discord.ext import commands
 import os
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+# 預設時區（與定時消息相同為 UTC+8）
+DEFAULT_UTC_OFFSET = 8
 
 class Birthday(commands.Cog):
     """生日提醒系統"""
@@ -13,57 +16,73 @@ class Birthday(commands.Cog):
         self.data_dir = "data"
         self.birthdays = {}
         self.settings = {}
+        # 生日索引 {(月, 日): {(guild_id, user_id)}}，每天只處理當天的壽星
+        self.index = {}
         os.makedirs(self.data_dir, exist_ok=True)
-        self.check_birthdays.start()
+        # 每個時區在當地午夜由排程服務發送生日祝福
+        self.bot.scheduler.register('birthday_announce', self.announce_birthdays)
     
     def cog_unload(self):
-        """停止背景任務"""
-        self.check_birthdays.cancel()
-    
-    def get_data_file(self, guild_id: str, file_type: str):
-        """獲取伺服器數據檔案路徑"""
-        guild_dir = os.path.join(self.data_dir, guild_id)
-        os.makedirs(guild_dir, exist_ok=True)
-        return os.path.join(guild_dir, f"{file_type}.json")
+        self.bot.scheduler.unregister('birthday_announce')
     
     def load_birthdays(self, guild_id: str):
         """載入生日數據"""
-        data_file = self.get_data_file(guild_id, "birthdays")
-        if os.path.exists(data_file):
-            with open(data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+        return self.bot.data_store.get(guild_id, 'birthdays')
     
     def save_birthdays(self, guild_id: str):
         """保存生日數據"""
-        data_file = self.get_data_file(guild_id, "birthdays")
-        with open(data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.birthdays.get(guild_id, {}), f, indent=2, ensure_ascii=False)
+        self.bot.data_store.set(guild_id, 'birthdays', self.birthdays.get(guild_id, {}))
     
     def load_settings(self, guild_id: str):
         """載入設定"""
-        data_file = self.get_data_file(guild_id, "birthday_settings")
-        if os.path.exists(data_file):
-            with open(data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {
+        return self.bot.data_store.get(guild_id, 'birthday_settings', lambda: {
             "enabled": False,
             "channel_id": None,
-            "message": "🎂 今天是 {user} 的生日！祝生日快樂！🎉"
-        }
+            "message": "🎂 今天是 {user} 的生日！祝生日快樂！🎉",
+            "utc_offset": DEFAULT_UTC_OFFSET
+        })
     
     def save_settings(self, guild_id: str):
         """保存設定"""
-        data_file = self.get_data_file(guild_id, "birthday_settings")
-        with open(data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.settings.get(guild_id, {}), f, indent=2, ensure_ascii=False)
+        self.bot.data_store.set(guild_id, 'birthday_settings', self.settings.get(guild_id, {}))
     
     def get_birthdays(self, guild_id: str):
-        """獲取生日數據"""
+        """獲取生日數據（首次載入時加入索引）"""
         if guild_id not in self.birthdays:
             self.birthdays[guild_id] = self.load_birthdays(guild_id)
+            for user_id, bd in self.birthdays[guild_id].items():
+                self.index_add(guild_id, user_id, bd)
         return self.birthdays[guild_id]
     
+    def index_add(self, guild_id: str, user_id: str, bd: dict):
+        self.index.setdefault((bd["month"], bd["day"]), set()).add((guild_id, user_id))
+    
+    def index_remove(self, guild_id: str, user_id: str, bd: dict):
+        key = (bd["month"], bd["day"])
+        entries = self.index.get(key)
+        if entries is not None:
+            entries.discard((guild_id, user_id))
+            if not entries:
+                del self.index[key]
+    
+    @staticmethod
+    def next_midnight(utc_offset: int) -> float:
+        """指定時區下一個午夜的 UNIX 時間戳"""
+        tz = timezone(timedelta(hours=utc_offset))
+        tomorrow = datetime.now(tz).date() + timedelta(days=1)
+        return datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=tz).timestamp()
+    
+    def ensure_announce_job(self, utc_offset: int):
+        """確保該時區已排程下一次午夜的生日祝福"""
+        for job in self.bot.scheduler.jobs(kind='birthday_announce'):
+            if job['payload']['utc_offset'] == utc_offset:
+                return
+        self.bot.scheduler.schedule(
+            'birthday_announce',
+            self.next_midnight(utc_offset),
+            {'utc_offset': utc_offset}
+        )
+    
     def get_settings(self, guild_id: str):
         """獲取設定"""
         if guild_id not in self.settings:
@@ -100,11 +119,14 @@ class Birthday(commands.Cog):
         user_id = str(interaction.user.id)
         
         birthdays = self.get_birthdays(guild_id)
+        if user_id in birthdays:
+            self.index_remove(guild_id, user_id, birthdays[user_id])
         birthdays[user_id] = {
             "month": month,
             "day": day,
             "username": interaction.user.name
         }
+        self.index_add(guild_id, user_id, birthdays[user_id])
         
         self.save_birthdays(guild_id)
         
@@ -190,16 +212,16 @@ class Birthday(commands.Cog):
             timestamp=discord.utils.utcnow()
         )
         
+        names = await self.bot.leaderboards.resolve_names(interaction.guild, [user_id for user_id, _ in month_birthdays])
+        
         for user_id, bd in month_birthdays:
-            try:
-                user = await self.bot.fetch_user(int(user_id))
-                embed.add_field(
-                    name=f"{bd['month']}/{bd['day']} - {user.name}",
-                    value=f"{user.mention}",
-                    inline=False
-                )
-            except:
+            if user_id not in names:
                 continue
+            embed.add_field(
+                name=f"{bd['month']}/{bd['day']} - {names[user_id]}",
+                value=f"<@{user_id}>",
+                inline=False
+            )
         
         await interaction.response.send_message(embed=embed)
     
@@ -215,7 +237,7 @@ class Birthday(commands.Cog):
             await interaction.response.send_message("❌ 你還沒有設定生日", ephemeral=True)
             return
         
-        del birthdays[user_id]
+        self.index_remove(guild_id, user_id, birthdays.pop(user_id))
         self.save_birthdays(guild_id)
         
         await interaction.response.send_message("✅ 已刪除你的生日", ephemeral=True)
@@ -231,6 +253,7 @@ class Birthday(commands.Cog):
         settings["channel_id"] = channel.id
         settings["enabled"] = True
         self.save_settings(guild_id)
+        self.ensure_announce_job(settings.get("utc_offset", DEFAULT_UTC_OFFSET))
         
         await interaction.response.send_message(
             f"✅ 生日提醒頻道已設定為 {channel.mention}",
@@ -247,6 +270,8 @@ class Birthday(commands.Cog):
         
         settings["enabled"] = enabled
         self.save_settings(guild_id)
+        if enabled:
+            self.ensure_announce_job(settings.get("utc_offset", DEFAULT_UTC_OFFSET))
         
         status = "開啟" if enabled else "關閉"
         await interaction.response.send_message(
@@ -254,61 +279,112 @@ class Birthday(commands.Cog):
             ephemeral=True
         )
     
-    @tasks.loop(hours=24)
-    async def check_birthdays(self):
-        """每天檢查生日"""
-        today = datetime.now()
+    @birthday_group.command(name="時區", description="設定生日祝福的時區（需要管理員權限）")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(utc_offset="與 UTC 的時差（小時），例如台灣為 8")
+    async def set_timezone(self, interaction: discord.Interaction, utc_offset: app_commands.Range[int, -12, 14]):
+        """設定時區，生日祝福會在當地午夜發送"""
+        guild_id = str(interaction.guild.id)
+        settings = self.get_settings(guild_id)
         
-        for guild in self.bot.guilds:
-            guild_id = str(guild.id)
+        settings["utc_offset"] = utc_offset
+        self.save_settings(guild_id)
+        if settings["enabled"]:
+            self.ensure_announce_job(utc_offset)
+        
+        await interaction.response.send_message(
+            f"✅ 生日祝福將在 UTC{utc_offset:+d} 的午夜發送",
+            ephemeral=True
+        )
+    
+    async def resolve_users(self, guild, user_ids):
+        """解析用戶 {user_id: 用戶}：先查成員快取，找不到的並行請求 API"""
+        users = {}
+        missing = []
+        for user_id in user_ids:
+            member = guild.get_member(int(user_id))
+            if member:
+                users[user_id] = member
+            else:
+                missing.append(user_id)
+        
+        async def fetch(user_id):
+            try:
+                return await guild.fetch_member(int(user_id))
+            except discord.NotFound:
+                # 已離開伺服器的用戶仍然祝福
+                return await self.bot.fetch_user(int(user_id))
+        
+        results = await asyncio.gather(*(fetch(uid) for uid in missing), return_exceptions=True)
+        for user_id, user in zip(missing, results):
+            if not isinstance(user, BaseException):
+                users[user_id] = user
+        return users
+    
+    async def announce_birthdays(self, job):
+        """排程工作：某時區到了午夜，祝福該時區伺服器今天的壽星"""
+        utc_offset = job['payload']['utc_offset']
+        tz = timezone(timedelta(hours=utc_offset))
+        
+        # 先排好明天的工作；以預定時間計算日期，重啟後補執行也不會弄錯日子
+        self.bot.scheduler.schedule('birthday_announce', self.next_midnight(utc_offset), {'utc_offset': utc_offset})
+        if datetime.now(timezone.utc).timestamp() - job['run_at'] > 86400:
+            return
+        today = datetime.fromtimestamp(job['run_at'] + 60, tz)
+        
+        # 依伺服器分組當天的壽星
+        by_guild = {}
+        for guild_id, user_id in self.index.get((today.month, today.day), ()):
+            by_guild.setdefault(guild_id, []).append(user_id)
+        
+        for guild_id, user_ids in by_guild.items():
             settings = self.get_settings(guild_id)
-            
             if not settings["enabled"] or not settings["channel_id"]:
                 continue
+            if settings.get("utc_offset", DEFAULT_UTC_OFFSET) != utc_offset:
+                continue
             
+            guild = self.bot.get_guild(int(guild_id))
+            if not guild:
+                continue
             channel = guild.get_channel(settings["channel_id"])
             if not channel:
                 continue
             
-            birthdays = self.get_birthdays(guild_id)
-            
-            # 檢查今天是否有人生日
-            for user_id, bd in birthdays.items():
-                if bd["month"] == today.month and bd["day"] == today.day:
-                    try:
-                        user = await self.bot.fetch_user(int(user_id))
-                        
-                        message = settings["message"].format(
-                            user=user.mention,
-                            server=guild.name
-                        )
-                        
-                        embed = discord.Embed(
-                            title="🎂 生日快樂！",
-                            description=message,
-                            color=discord.Color.purple()
-                        )
-                        embed.set_thumbnail(url=user.display_avatar.url)
-                        embed.timestamp = discord.utils.utcnow()
-                        
-                        await channel.send(embed=embed)
-                    except:
-                        continue
-    
-    @check_birthdays.before_loop
-    async def before_check_birthdays(self):
-        """等待機器人準備就緒"""
-        await self.bot.wait_until_ready()
+            users = await self.resolve_users(guild, user_ids)
+            for user in users.values():
+                try:
+                    message = settings["message"].format(
+                        user=user.mention,
+                        server=guild.name
+                    )
+                    
+                    embed = discord.Embed(
+                        title="🎂 生日快樂！",
+                        description=message,
+                        color=discord.Color.purple()
+                    )
+                    embed.set_thumbnail(url=user.display_avatar.url)
+                    embed.timestamp = discord.utils.utcnow()
+                    
+                    await channel.send(embed=embed)
+                except:
+                    continue
     
     @commands.Cog.listener()
     async def on_ready(self):
         print(f'📦 {self.__class__.__name__} cog已載入')
         # 載入所有伺服器的數據
+        offsets = set()
         for guild in self.bot.guilds:
             guild_id = str(guild.id)
-            self.birthdays[guild_id] = self.load_birthdays(guild_id)
-            self.settings[guild_id] = self.load_settings(guild_id)
-        print(f'🎂 已載入 {len(self.birthdays)} 個伺服器的生日數據')
+            self.get_birthdays(guild_id)
+            settings = self.get_settings(guild_id)
+            if settings["enabled"] and settings["channel_id"]:
+                offsets.add(settings.get("utc_offset", DEFAULT_UTC_OFFSET))
+        for utc_offset in offsets:
+            self.ensure_announce_job(utc_offset)
+        print(f'🎂 已載入 {len(self.birthdays)} 個伺服器的生日數據（索引 {len(self.index)} 個日期）')
 
 async def setup(bot):
     await bot.add_cog(Birthday(bot))
@@ -1,8 +1,6 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
-import os
 from typing import Optional
 
 class CustomCommands(commands.Cog):
@@ -11,26 +9,18 @@ class CustomCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.data_folder = './data'
+        self.bot.message_pipeline.register('custom_commands', self.process_message, documents=('custom_commands',))
     
-    def get_commands_file(self, guild_id: int) -> str:
-        """獲取伺服器的自定義命令檔案路徑"""
-        folder = os.path.join(self.data_folder, str(guild_id))
-        os.makedirs(folder, exist_ok=True)
-        return os.path.join(folder, 'custom_commands.json')
+    def cog_unload(self):
+        self.bot.message_pipeline.unregister('custom_commands')
     
     def load_commands(self, guild_id: int) -> dict:
         """載入自定義命令"""
-        file_path = self.get_commands_file(guild_id)
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+        return self.bot.data_store.get(guild_id, 'custom_commands')
     
     def save_commands(self, guild_id: int, commands: dict):
         """儲存自定義命令"""
-        file_path = self.get_commands_file(guild_id)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(commands, f, ensure_ascii=False, indent=2)
+        self.bot.data_store.set(guild_id, 'custom_commands', commands)
     
     custom_group = app_commands.Group(name="自定義", description="自定義命令管理")
     
@@ -182,36 +172,28 @@ class CustomCommands(commands.Cog):
         
         await interaction.response.send_message(embed=embed)
     
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        """監聽訊息以觸發自定義命令"""
-        # 忽略機器人自己的訊息
-        if message.author.bot:
-            return
-        
-        # 忽略沒有內容的訊息
-        if not message.content:
-            return
-        
-        # 檢查是否在伺服器中
-        if not message.guild:
-            return
+    async def process_message(self, ctx):
+        """訊息管線階段：觸發自定義命令"""
+        message = ctx.message
         
         # 檢查是否以 ! 開頭
-        if not message.content.startswith('!'):
+        if not ctx.content.startswith('!'):
             return
         
         # 提取命令名稱
-        command_name = message.content[1:].split()[0]
+        parts = ctx.content[1:].split()
+        if not parts:
+            return
+        command_name = parts[0]
         
         # 載入自定義命令
-        commands = self.load_commands(message.guild.id)
+        commands = ctx.config('custom_commands')
         
         # 檢查命令是否存在
         if command_name in commands:
             # 增加使用次數
             commands[command_name]['uses'] = commands[command_name].get('uses', 0) + 1
-            self.save_commands(message.guild.id, commands)
+            self.save_commands(ctx.guild_id, commands)
             
             # 發送回覆
             await message.channel.send(commands[command_name]['response'])
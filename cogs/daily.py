@@ -1,10 +1,10 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
 import os
 from datetime import datetime, timedelta
 import random
+from utils.economy import new_daily_entry
 
 class Daily(commands.Cog):
     """每日簽到系統"""
@@ -14,26 +14,18 @@ class Daily(commands.Cog):
         self.data_dir = "data"
         self.daily_data = {}
         os.makedirs(self.data_dir, exist_ok=True)
-    
-    def get_data_file(self, guild_id: str):
-        """獲取伺服器數據檔案路徑"""
-        guild_dir = os.path.join(self.data_dir, guild_id)
-        os.makedirs(guild_dir, exist_ok=True)
-        return os.path.join(guild_dir, "daily.json")
+        # 簽到積分排行榜
+        self.bot.leaderboards.register('daily', lambda guild_id: [
+            (user_id, data.get('total_points', 0)) for user_id, data in self.load_data(guild_id).items()
+        ])
     
     def load_data(self, guild_id: str):
         """載入簽到數據"""
-        data_file = self.get_data_file(guild_id)
-        if os.path.exists(data_file):
-            with open(data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+        return self.bot.data_store.get(guild_id, 'daily')
     
     def save_data(self, guild_id: str):
         """保存簽到數據"""
-        data_file = self.get_data_file(guild_id)
-        with open(data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.daily_data.get(guild_id, {}), f, indent=2, ensure_ascii=False)
+        self.bot.data_store.set(guild_id, 'daily', self.daily_data.get(guild_id, {}))
     
     def get_user_data(self, guild_id: str, user_id: str):
         """獲取用戶簽到數據"""
@@ -41,12 +33,7 @@ class Daily(commands.Cog):
             self.daily_data[guild_id] = self.load_data(guild_id)
         
         if user_id not in self.daily_data[guild_id]:
-            self.daily_data[guild_id][user_id] = {
-                "last_checkin": None,
-                "streak": 0,
-                "total_checkins": 0,
-                "total_points": 0
-            }
+            self.daily_data[guild_id][user_id] = new_daily_entry()
         
         return self.daily_data[guild_id][user_id]
     
@@ -113,6 +100,7 @@ class Daily(commands.Cog):
         data["total_points"] += total_points
         
         self.save_data(guild_id)
+        self.bot.leaderboards.update(guild_id, 'daily', user_id, data["total_points"])
         
         # 創建嵌入訊息
         embed = discord.Embed(
@@ -186,12 +174,9 @@ class Daily(commands.Cog):
             await interaction.response.send_message("❌ 目前沒有任何簽到記錄", ephemeral=True)
             return
         
-        # 排序用戶
-        sorted_users = sorted(
-            self.daily_data[guild_id].items(),
-            key=lambda x: x[1]["total_points"],
-            reverse=True
-        )[:10]
+        # 取前10名並解析名稱
+        top_users = self.bot.leaderboards.board(guild_id, 'daily').top(10)
+        names = await self.bot.leaderboards.resolve_names(interaction.guild, [user_id for user_id, _ in top_users])
         
         embed = discord.Embed(
             title=f"🏆 {interaction.guild.name} 簽到排行榜",
@@ -202,18 +187,17 @@ class Daily(commands.Cog):
         
         medals = ["🥇", "🥈", "🥉"]
         
-        for idx, (user_id, data) in enumerate(sorted_users, 1):
-            try:
-                user = await self.bot.fetch_user(int(user_id))
-                medal = medals[idx-1] if idx <= 3 else f"#{idx}"
-                
-                embed.add_field(
-                    name=f"{medal} {user.name}",
-                    value=f"積分: **{data['total_points']}** 💰\n連續: {data['streak']} 天 🔥\n簽到: {data['total_checkins']} 次",
-                    inline=False
-                )
-            except:
+        for idx, (user_id, _) in enumerate(top_users, 1):
+            if user_id not in names:
                 continue
+            data = self.daily_data[guild_id][user_id]
+            medal = medals[idx-1] if idx <= 3 else f"#{idx}"
+            
+            embed.add_field(
+                name=f"{medal} {names[user_id]}",
+                value=f"積分: **{data['total_points']}** 💰\n連續: {data['streak']} 天 🔥\n簽到: {data['total_checkins']} 次",
+                inline=False
+            )
         
         await interaction.response.send_message(embed=embed)
     
@@ -235,6 +219,7 @@ class Daily(commands.Cog):
         if user_id in self.daily_data[guild_id]:
             del self.daily_data[guild_id][user_id]
             self.save_data(guild_id)
+            self.bot.leaderboards.remove(guild_id, 'daily', user_id)
             await interaction.response.send_message(f"✅ 已重置 {user.mention} 的簽到數據", ephemeral=True)
         else:
             await interaction.response.send_message("❌ 該用戶沒有簽到數據", ephemeral=True)
@@ -3,7 +3,6 @@ from discord import app_commands
 from discord.ext import commands
 import os
 import sys
-import json
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -16,34 +15,10 @@ class Developer(commands.Cog):
         load_dotenv()
         dev_ids = os.getenv('DEV_ID', '')
         self.dev_ids = [int(id.strip()) for id in dev_ids.split(',') if id.strip()]
-        # 封锁数据文件路径
-        self.blocked_users_file = './data/blocked_users.json'
-        self._ensure_data_file()
-    
-    def _ensure_data_file(self):
-        """确保封锁数据文件存在"""
-        os.makedirs('./data', exist_ok=True)
-        if not os.path.exists(self.blocked_users_file):
-            with open(self.blocked_users_file, 'w', encoding='utf-8') as f:
-                json.dump({}, f, ensure_ascii=False, indent=4)
-    
-    def load_blocked_users(self):
-        """载入封锁用户列表"""
-        try:
-            with open(self.blocked_users_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-    
-    def save_blocked_users(self, data):
-        """保存封锁用户列表"""
-        with open(self.blocked_users_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
     
     def is_user_blocked(self, user_id: int) -> bool:
         """检查用户是否被封锁"""
-        blocked = self.load_blocked_users()
-        return str(user_id) in blocked
+        return user_id in self.bot.blocked_users
     
     def is_developer(self, user_id: int) -> bool:
         """检查用户是否为开发者"""
@@ -327,23 +302,21 @@ class Developer(commands.Cog):
             return
         
         # 检查是否已被封锁
-        blocked = self.load_blocked_users()
-        if str(uid) in blocked:
+        if uid in self.bot.blocked_users:
             await interaction.followup.send(
                 f"⚠️ 用戶 {user.name} (`{uid}`) 已經被封銮",
                 ephemeral=True
             )
             return
         
-        # 添加到封锁列表
-        blocked[str(uid)] = {
+        # 添加到封锁列表（立即写回）
+        await self.bot.blocked_users.block(uid, {
             "user_name": user.name,
             "reason": reason,
             "blocked_by": str(interaction.user),
             "blocked_by_id": interaction.user.id,
             "blocked_at": datetime.now().isoformat()
-        }
-        self.save_blocked_users(blocked)
+        })
         
         embed = discord.Embed(
             title="🚫 機器人層面封銮完成",
@@ -391,22 +364,15 @@ class Developer(commands.Cog):
             )
             return
         
-        # 检查是否被封锁
-        blocked = self.load_blocked_users()
-        if str(uid) not in blocked:
+        # 从封锁列表移除（立即写回）
+        block_info = await self.bot.blocked_users.unblock(uid)
+        if block_info is None:
             await interaction.followup.send(
                 f"⚠️ 用戶 {user.name} (`{uid}`) 未被封銮",
                 ephemeral=True
             )
             return
         
-        # 获取封锁信息
-        block_info = blocked[str(uid)]
-        
-        # 从封锁列表移除
-        del blocked[str(uid)]
-        self.save_blocked_users(blocked)
-        
         embed = discord.Embed(
             title="✅ 機器人層面解封完成",
             description="此用戶已恢復使用機器人功能的權限",
@@ -434,7 +400,7 @@ class Developer(commands.Cog):
             )
             return
         
-        blocked = self.load_blocked_users()
+        blocked = self.bot.blocked_users.items()
         
         if not blocked:
             await interaction.response.send_message(
@@ -449,7 +415,7 @@ class Developer(commands.Cog):
             color=discord.Color.red()
         )
         
-        for uid, info in list(blocked.items())[:10]:  # 最多显示10个
+        for uid, info in blocked[:10]:  # 最多显示10个
             blocked_time = datetime.fromisoformat(info.get('blocked_at', datetime.now().isoformat()))
             embed.add_field(
                 name=f"{info.get('user_name', 'Unknown')} (`{uid}`)",
@@ -471,9 +437,8 @@ class Developer(commands.Cog):
             print('⚠️  開發者模組已載入，但未設定 DEV_ID')
         
         # 显示封锁用户数量
-        blocked = self.load_blocked_users()
-        if blocked:
-            print(f'🚫 當前有 {len(blocked)} 名用戶被機器人層面封銮')
+        if len(self.bot.blocked_users):
+            print(f'🚫 當前有 {len(self.bot.blocked_users)} 名用戶被機器人層面封銮')
 
 async def setup(bot):
     await bot.add_cog(Developer(bot))
@@ -1,7 +1,6 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
 import os
 from datetime import datetime
 from dotenv import load_dotenv
@@ -71,33 +70,19 @@ class Feedback(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.data_file = './data/feedback.json'
-        self._ensure_data_file()
         
         # 載入開發者 ID
         load_dotenv()
         dev_ids = os.getenv('DEV_ID', '')
         self.dev_ids = [int(id.strip()) for id in dev_ids.split(',') if id.strip()]
     
-    def _ensure_data_file(self):
-        """確保數據文件存在"""
-        os.makedirs('./data', exist_ok=True)
-        if not os.path.exists(self.data_file):
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump({'feedbacks': [], 'counter': 0}, f, ensure_ascii=False, indent=4)
-    
     def load_data(self):
         """載入反饋數據"""
-        try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {'feedbacks': [], 'counter': 0}
+        return self.bot.data_store.get(None, 'feedback', lambda: {'feedbacks': [], 'counter': 0})
     
     def save_data(self, data):
         """保存反饋數據"""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        self.bot.data_store.set(None, 'feedback', data)
     
     def generate_feedback_id(self):
         """生成反饋 ID"""
@@ -3,8 +3,6 @@ from discord import app_commands
 from discord.ext import commands
 import random
 import asyncio
-import os
-import json
 from datetime import datetime
 
 class Games(commands.Cog):
@@ -13,24 +11,24 @@ class Games(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.active_games = {}  # 儲存進行中的遊戲
+        # 遊戲勝率排行榜（至少玩過5場才上榜）
+        self.bot.leaderboards.register('games', lambda guild_id: [
+            (user_id, self.win_rate(stats))
+            for user_id, stats in self.bot.data_store.get(guild_id, 'game_stats').items()
+            if stats['total_games'] >= 5
+        ])
+    
+    @staticmethod
+    def win_rate(stats: dict) -> float:
+        """計算勝率（百分比）"""
+        return (stats['total_wins'] / stats['total_games'] * 100) if stats['total_games'] > 0 else 0
     
     def save_game_stats(self, guild_id: int, user_id: int, game_type: str, won: bool):
         """儲存遊戲統計"""
-        guild_id_str = str(guild_id)
         user_id_str = str(user_id)
         
-        # 確保目錄存在
-        data_dir = os.path.join('data', guild_id_str)
-        os.makedirs(data_dir, exist_ok=True)
-        
-        file_path = os.path.join(data_dir, 'game_stats.json')
-        
         # 讀取現有數據
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        else:
-            data = {}
+        data = self.bot.data_store.get(guild_id, 'game_stats')
         
         # 初始化用戶數據
         if user_id_str not in data:
@@ -54,44 +52,21 @@ class Games(commands.Cog):
             data[user_id_str]['games'][game_type]['won'] += 1
         
         # 儲存數據
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        self.bot.data_store.mark_dirty(guild_id, 'game_stats')
+        if data[user_id_str]['total_games'] >= 5:
+            self.bot.leaderboards.update(guild_id, 'games', user_id_str, self.win_rate(data[user_id_str]))
     
-    def add_rewards(self, guild_id: int, user_id: int, won: bool):
+    async def add_rewards(self, guild_id: int, user_id: int, won: bool):
         """添加獎勵（經驗值和積分）"""
-        # 添加簽到積分
-        try:
-            daily_file = os.path.join('data', str(guild_id), 'daily.json')
-            if os.path.exists(daily_file):
-                with open(daily_file, 'r', encoding='utf-8') as f:
-                    daily_data = json.load(f)
-                
-                user_id_str = str(user_id)
-                if user_id_str in daily_data:
-                    points = 5 if won else 1  # 贏了+5，輸了+1
-                    daily_data[user_id_str]['total_points'] = daily_data[user_id_str].get('total_points', 0) + points
-                    
-                    with open(daily_file, 'w', encoding='utf-8') as f:
-                        json.dump(daily_data, f, ensure_ascii=False, indent=2)
-        except:
-            pass
-        
-        # 添加經驗值
+        # 贏了+10 XP、+5 積分，輸了+3 XP、+1 積分
         try:
-            levels_file = os.path.join('data', str(guild_id), 'levels.json')
-            if os.path.exists(levels_file):
-                with open(levels_file, 'r', encoding='utf-8') as f:
-                    levels_data = json.load(f)
-                
-                user_id_str = str(user_id)
-                if user_id_str in levels_data:
-                    xp = 10 if won else 3  # 贏了+10 XP，輸了+3 XP
-                    levels_data[user_id_str]['xp'] = levels_data[user_id_str].get('xp', 0) + xp
-                    
-                    with open(levels_file, 'w', encoding='utf-8') as f:
-                        json.dump(levels_data, f, ensure_ascii=False, indent=2)
-        except:
-            pass
+            return await self.bot.economy.grant(
+                guild_id, user_id,
+                xp=10 if won else 3,
+                points=5 if won else 1
+            )
+        except Exception as e:
+            print(f"❌ 發放遊戲獎勵失敗: {e}")
     
     # 創建遊戲指令群組
     game = app_commands.Group(name="遊戲", description="小遊戲系統")
@@ -189,7 +164,7 @@ class Games(commands.Cog):
             
             # 儲存統計和獎勵
             self.save_game_stats(interaction.guild.id, user_id, "猜數字", won)
-            self.add_rewards(interaction.guild.id, user_id, won)
+            await self.add_rewards(interaction.guild.id, user_id, won)
     
     @game.command(name="猜拳", description="和機器人猜拳（剪刀石頭布）")
     @app_commands.describe(choice="你的選擇")
@@ -241,7 +216,7 @@ class Games(commands.Cog):
         # 儲存統計和獎勵（平手不算）
         if choice != bot_choice:
             self.save_game_stats(interaction.guild.id, interaction.user.id, "猜拳", won)
-            self.add_rewards(interaction.guild.id, interaction.user.id, won)
+            await self.add_rewards(interaction.guild.id, interaction.user.id, won)
     
     @game.command(name="21點", description="21點撲克牌遊戲")
     async def blackjack(self, interaction: discord.Interaction):
@@ -399,21 +374,18 @@ class Games(commands.Cog):
         # 儲存統計和獎勵
         if game_over:
             self.save_game_stats(interaction.guild.id, user_id, "21點", won)
-            self.add_rewards(interaction.guild.id, user_id, won)
+            await self.add_rewards(interaction.guild.id, user_id, won)
     
     @game.command(name="統計", description="查看你的遊戲統計")
     async def game_stats(self, interaction: discord.Interaction, user: discord.Member = None):
         """查看遊戲統計"""
         target = user or interaction.user
         
-        file_path = os.path.join('data', str(interaction.guild.id), 'game_stats.json')
-        
-        if not os.path.exists(file_path):
+        if not self.bot.data_store.exists(interaction.guild.id, 'game_stats'):
             await interaction.response.send_message("❌ 還沒有遊戲統計數據", ephemeral=True)
             return
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = self.bot.data_store.get(interaction.guild.id, 'game_stats')
         
         user_id_str = str(target.id)
         
@@ -451,33 +423,26 @@ class Games(commands.Cog):
     @game.command(name="排行榜", description="查看遊戲勝率排行榜")
     async def game_leaderboard(self, interaction: discord.Interaction):
         """遊戲排行榜"""
-        file_path = os.path.join('data', str(interaction.guild.id), 'game_stats.json')
-        
-        if not os.path.exists(file_path):
+        if not self.bot.data_store.exists(interaction.guild.id, 'game_stats'):
             await interaction.response.send_message("❌ 還沒有遊戲統計數據", ephemeral=True)
             return
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = self.bot.data_store.get(interaction.guild.id, 'game_stats')
         
         if not data:
             await interaction.response.send_message("❌ 還沒有人玩過遊戲", ephemeral=True)
             return
         
-        # 計算勝率並排序（至少玩過5場）
-        leaderboard = []
-        for user_id, stats in data.items():
-            if stats['total_games'] >= 5:
-                win_rate = (stats['total_wins'] / stats['total_games'] * 100)
-                leaderboard.append({
-                    'user_id': user_id,
-                    'total_games': stats['total_games'],
-                    'total_wins': stats['total_wins'],
-                    'win_rate': win_rate
-                })
-        
-        leaderboard.sort(key=lambda x: x['win_rate'], reverse=True)
-        leaderboard = leaderboard[:10]  # 只取前10名
+        # 勝率排行（至少玩過5場），只取前10名
+        leaderboard = [
+            {
+                'user_id': user_id,
+                'total_games': data[user_id]['total_games'],
+                'total_wins': data[user_id]['total_wins'],
+                'win_rate': win_rate
+            }
+            for user_id, win_rate in self.bot.leaderboards.board(interaction.guild.id, 'games').top(10)
+        ]
         
         if not leaderboard:
             await interaction.response.send_message("❌ 還沒有達到 5 場遊戲的玩家", ephemeral=True)
@@ -491,13 +456,10 @@ class Games(commands.Cog):
         
         medals = ["🥇", "🥈", "🥉"]
         leaderboard_text = ""
+        names = await self.bot.leaderboards.resolve_names(interaction.guild, [p['user_id'] for p in leaderboard])
         
         for i, player in enumerate(leaderboard):
-            try:
-                user = await self.bot.fetch_user(int(player['user_id']))
-                name = user.display_name
-            except:
-                name = "未知用戶"
+            name = names.get(player['user_id'], "未知用戶")
             
             medal = medals[i] if i < 3 else f"**{i+1}.**"
             leaderboard_text += f"{medal} {name}\n"
@@ -1,10 +1,11 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
 import os
 from datetime import datetime, timedelta
 import random
+from utils.economy import new_level_entry
+from utils.xp_curve import DEFAULT_CURVE, XPCurve, get_curve
 
 class Leveling(commands.Cog):
     """等級系統"""
@@ -16,26 +17,22 @@ class Leveling(commands.Cog):
         self.levels = {}
         # 確保 data 目錄存在
         os.makedirs(self.data_dir, exist_ok=True)
+        # 等級排行榜（依總經驗排序）
+        self.bot.leaderboards.register('levels', lambda guild_id: [
+            (user_id, data.get('xp', 0)) for user_id, data in self.load_data(guild_id).items()
+        ])
+        self.bot.message_pipeline.register('leveling', self.process_message, documents=('levels', 'daily', 'level_curve'))
     
-    def get_data_file(self, guild_id: str):
-        """獲取伺服器數據檔案路徑"""
-        guild_dir = os.path.join(self.data_dir, guild_id)
-        os.makedirs(guild_dir, exist_ok=True)
-        return os.path.join(guild_dir, "levels.json")
+    def cog_unload(self):
+        self.bot.message_pipeline.unregister('leveling')
     
     def load_data(self, guild_id: str):
         """載入伺服器等級數據"""
-        data_file = self.get_data_file(guild_id)
-        if os.path.exists(data_file):
-            with open(data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+        return self.bot.data_store.get(guild_id, 'levels')
     
     def save_data(self, guild_id: str):
         """保存伺服器等級數據"""
-        data_file = self.get_data_file(guild_id)
-        with open(data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.levels.get(guild_id, {}), f, indent=2, ensure_ascii=False)
+        self.bot.data_store.set(guild_id, 'levels', self.levels.get(guild_id, {}))
     
     def get_user_data(self, guild_id: str, user_id: str):
         """获取用戶数据"""
@@ -43,30 +40,23 @@ class Leveling(commands.Cog):
             self.levels[guild_id] = self.load_data(guild_id)
         
         if user_id not in self.levels[guild_id]:
-            self.levels[guild_id][user_id] = {
-                "xp": 0,
-                "level": 1,
-                "messages": 0,
-                "last_message": None
-            }
+            self.levels[guild_id][user_id] = new_level_entry()
         
         return self.levels[guild_id][user_id]
     
-    def calculate_xp_for_level(self, level: int) -> int:
+    def get_curve(self, guild_id: str = None) -> XPCurve:
+        """獲取伺服器的經驗曲線（未指定伺服器時為預設曲線）"""
+        if guild_id is None:
+            return DEFAULT_CURVE
+        return get_curve(self.bot.data_store, guild_id)
+    
+    def calculate_xp_for_level(self, level: int, guild_id: str = None) -> int:
         """計算升到下一級所需經驗"""
-        return 100 + (level - 1) * 50
+        return self.get_curve(guild_id).xp_for_level(level)
     
-    def calculate_level(self, xp: int) -> int:
+    def calculate_level(self, xp: int, guild_id: str = None) -> int:
         """根據經驗計算等級"""
-        level = 1
-        xp_needed = 100
-        
-        while xp >= xp_needed:
-            xp -= xp_needed
-            level += 1
-            xp_needed = self.calculate_xp_for_level(level)
-        
-        return level
+        return self.get_curve(guild_id).level_for_xp(xp)
     
     # 創建指令组
     level_group = app_commands.Group(name="等級", description="等級系統")
@@ -86,16 +76,8 @@ class Leveling(commands.Cog):
         
         data = self.get_user_data(guild_id, user_id)
         
-        current_level = data["level"]
         current_xp = data["xp"]
-        xp_for_next = self.calculate_xp_for_level(current_level)
-        
-        # 計算当前等級已獲得的經驗
-        total_xp = 0
-        for lvl in range(1, current_level):
-            total_xp += self.calculate_xp_for_level(lvl)
-        
-        xp_in_level = current_xp - total_xp
+        current_level, xp_in_level, xp_for_next = self.get_curve(guild_id).progress(current_xp)
         
         # 創建進度條
         progress = int((xp_in_level / xp_for_next) * 20)
@@ -129,12 +111,9 @@ class Leveling(commands.Cog):
             await interaction.response.send_message("❌ 該伺服器还沒有等級数据", ephemeral=True)
             return
         
-        # 排序用戶
-        sorted_users = sorted(
-            self.levels[guild_id].items(),
-            key=lambda x: x[1]["xp"],
-            reverse=True
-        )[:10]  # 只顯示前10名
+        # 取前10名並解析名稱
+        top_users = self.bot.leaderboards.board(guild_id, 'levels').top(10)
+        names = await self.bot.leaderboards.resolve_names(interaction.guild, [user_id for user_id, _ in top_users])
         
         embed = discord.Embed(
             title=f"🏆 {interaction.guild.name} 等級排行榜",
@@ -145,18 +124,17 @@ class Leveling(commands.Cog):
         
         medals = ["🥇", "🥈", "🥉"]
         
-        for idx, (user_id, data) in enumerate(sorted_users, 1):
-            try:
-                user = await self.bot.fetch_user(int(user_id))
-                medal = medals[idx-1] if idx <= 3 else f"#{idx}"
-                
-                embed.add_field(
-                    name=f"{medal} {user.name}",
-                    value=f"等級: **{data['level']}** | 經驗: {data['xp']} XP\n訊息: {data['messages']}",
-                    inline=False
-                )
-            except:
+        for idx, (user_id, _) in enumerate(top_users, 1):
+            if user_id not in names:
                 continue
+            data = self.levels[guild_id][user_id]
+            medal = medals[idx-1] if idx <= 3 else f"#{idx}"
+            
+            embed.add_field(
+                name=f"{medal} {names[user_id]}",
+                value=f"等級: **{data['level']}** | 經驗: {data['xp']} XP\n訊息: {data['messages']}",
+                inline=False
+            )
         
         await interaction.response.send_message(embed=embed)
     
@@ -179,19 +157,42 @@ class Leveling(commands.Cog):
         if guild_id in self.levels and user_id in self.levels[guild_id]:
             del self.levels[guild_id][user_id]
             self.save_data(guild_id)
+            self.bot.leaderboards.remove(guild_id, 'levels', user_id)
             await interaction.response.send_message(f"✅ 已重置 {user.mention} 的等級", ephemeral=True)
         else:
             await interaction.response.send_message("❌ 該用戶沒有等級数据", ephemeral=True)
-    
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        """监听訊息以增加經驗"""
-        # 忽略機器人和私信
-        if message.author.bot or not message.guild:
-            return
-        
-        guild_id = str(message.guild.id)
-        user_id = str(message.author.id)
+
+    @level_group.command(name="經驗曲線", description="設定升級所需經驗（需要管理员权限）")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(
+        base="從等級 1 升到等級 2 所需經驗（預設 100）",
+        step="每升一級額外增加的經驗（預設 50）"
+    )
+    async def set_curve(self, interaction: discord.Interaction,
+                        base: app_commands.Range[int, 1, 100000],
+                        step: app_commands.Range[int, 0, 100000]):
+        """設定伺服器的經驗曲線並重新計算所有用戶的等級"""
+        guild_id = str(interaction.guild.id)
+        self.bot.data_store.set(guild_id, 'level_curve', XPCurve(base, step).to_dict())
+
+        if guild_id not in self.levels:
+            self.levels[guild_id] = self.load_data(guild_id)
+        curve = self.get_curve(guild_id)
+        for data in self.levels[guild_id].values():
+            data["level"] = curve.level_for_xp(data.get("xp", 0))
+        self.save_data(guild_id)
+
+        await interaction.response.send_message(
+            f"✅ 已更新經驗曲線：升到下一級需要 {base} + (等級 - 1) × {step} XP\n"
+            f"已重新計算 {len(self.levels[guild_id])} 位用戶的等級",
+            ephemeral=True
+        )
+
+    async def process_message(self, ctx):
+        """訊息管線階段：增加經驗"""
+        message = ctx.message
+        guild_id = ctx.guild_id
+        user_id = ctx.author_id
         
         # 冷却時間檢查（60秒内只能獲得一次經驗）
         cooldown_key = f"{guild_id}_{user_id}"
@@ -211,19 +212,15 @@ class Leveling(commands.Cog):
         
         # 随机增加15-25經驗
         xp_gain = random.randint(15, 25)
-        old_level = data["level"]
-        data["xp"] += xp_gain
-        
-        # 計算新等級
-        new_level = self.calculate_level(data["xp"])
-        data["level"] = new_level
         data["last_message"] = now.isoformat()
-        
-        # 保存数据
         self.save_data(guild_id)
         
+        # 經驗值統一由 economy 發放（計算新等級、更新排行榜）
+        result = await self.bot.economy.grant(guild_id, user_id, xp=xp_gain)
+        new_level = result.level
+        
         # 如果升級了，發送訊息
-        if new_level > old_level:
+        if result.leveled_up:
             embed = discord.Embed(
                 title="🎉 恭喜升級！",
                 description=f"{message.author.mention} 升到了 **等級 {new_level}**！",
@@ -235,14 +232,14 @@ class Leveling(commands.Cog):
                 await message.channel.send(embed=embed, delete_after=10)
             except:
                 pass
-    # 載入所有伺服器的數據
-        for guild in self.bot.guilds:
-            guild_id = str(guild.id)
-            self.levels[guild_id] = self.load_data(guild_id)
         
     @commands.Cog.listener()
     async def on_ready(self):
         print(f'📦 {self.__class__.__name__} cog已載入')
+        # 載入所有伺服器的數據
+        for guild in self.bot.guilds:
+            guild_id = str(guild.id)
+            self.levels[guild_id] = self.load_data(guild_id)
         print(f'📊 已載入 {len(self.levels)} 個伺服器的等級数据')
 
 async def setup(bot):
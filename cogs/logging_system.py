@@ -1,7 +1,75 @@
 import discord
 from discord.ext import commands
+from discord.utils import MISSING
+from collections import OrderedDict
+import functools
 import os
-import asyncio
+from utils.command_log import CommandLogSink
+
+# 日誌設定
+LOG_WEBHOOK_URL = os.getenv('LOG_WEBHOOK_URL', '')  # 設定後改用 webhook 發送日誌（可選）
+LOG_FILE = os.getenv('LOG_FILE', '')  # 本地 NDJSON 日誌文件路徑（可選）
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', 2))  # 日誌發送間隔（秒）
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 1000))  # 待發送日誌上限，超過時略過並計數
+
+_original_send_message = discord.InteractionResponse.send_message
+_original_edit_message = discord.InteractionResponse.edit_message
+_original_webhook_send = discord.Webhook.send
+# 延遲回應（defer + followup）的響應內容 {interaction token: 內容}
+_followup_responses = OrderedDict()
+
+
+def summarize_response(content=None, embed=None, embeds=None):
+    """從發送參數提取響應内容（與訊息內容的提取規則相同）"""
+    if content and content is not MISSING:
+        text = str(content)
+    else:
+        if not embed or embed is MISSING:
+            embed = embeds[0] if embeds and embeds is not MISSING else None
+        if embed:
+            text = embed.title or embed.description or "Embed訊息"
+        else:
+            text = "已響應"
+    # 限制長度，避免日誌过长
+    if len(text) > 100:
+        text = text[:97] + "..."
+    return text
+
+
+def _summarize_call(args, kwargs):
+    # content 是唯一可以用位置參數傳入的訊息參數
+    content = args[0] if args else kwargs.get('content')
+    return summarize_response(content, kwargs.get('embed'), kwargs.get('embeds'))
+
+
+def _record_interaction_response(response, args, kwargs):
+    response._parent.extras.setdefault('log_response', _summarize_call(args, kwargs))
+
+
+def _record_followup(webhook, args, kwargs):
+    # 指令的 followup webhook 使用 interaction token
+    if webhook.type is discord.WebhookType.application and webhook.token and webhook.token not in _followup_responses:
+        _followup_responses[webhook.token] = _summarize_call(args, kwargs)
+        while len(_followup_responses) > 256:
+            _followup_responses.popitem(last=False)
+
+
+def _recording(original, record):
+    """包裝 discord.py 的發送方法：先記下響應內容，參數原樣轉交原方法"""
+    @functools.wraps(original)
+    async def wrapper(self, *args, **kwargs):
+        try:
+            record(self, args, kwargs)
+        except Exception as e:
+            print(f"⚠️  記錄指令響應內容失敗: {e}")
+        return await original(self, *args, **kwargs)
+    return wrapper
+
+
+_send_message = _recording(_original_send_message, _record_interaction_response)
+_edit_message = _recording(_original_edit_message, _record_interaction_response)
+_webhook_send = _recording(_original_webhook_send, _record_followup)
+
 
 class LoggingSystem(commands.Cog):
     """日誌系統 - 記錄所有指令使用"""
@@ -9,84 +77,38 @@ class LoggingSystem(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.log_channel_id = os.getenv('LOG_CHANNEL_ID')
+        self.sink = CommandLogSink(
+            bot,
+            channel_id=self.log_channel_id,
+            webhook_url=LOG_WEBHOOK_URL,
+            file_path=LOG_FILE,
+            flush_interval=LOG_FLUSH_INTERVAL,
+            max_queue=LOG_QUEUE_SIZE
+        )
     
-    async def send_log(self, user_name: str, command_name: str, response: str):
-        """發送日誌到指定頻道"""
-        if not self.log_channel_id:
-            return
-        
-        try:
-            channel = self.bot.get_channel(int(self.log_channel_id))
-            if not channel:
-                print(f"⚠️  找不到日誌頻道 ID: {self.log_channel_id}")
-                return
-            
-            # 根據指令類型选择顏色
-            if "娛樂" in command_name:
-                color = discord.Color.purple()  # 紫色 - 娛樂
-                emoji = "🎮"
-            elif "管理" in command_name:
-                color = discord.Color.red()  # 红色 - 管理
-                emoji = "🔨"
-            elif "一般" in command_name:
-                color = discord.Color.blue()  # 蓝色 - 一般
-                emoji = "ℹ️"
-            else:
-                color = discord.Color.green()  # 绿色 - 其他
-                emoji = "📝"
-            
-            # 創建彩色Embed
-            embed = discord.Embed(
-                title=f"{emoji} 指令日誌",
-                color=color,
-                timestamp=discord.utils.utcnow()
-            )
-            embed.add_field(name="👤 用戶", value=f"`{user_name}`", inline=True)
-            embed.add_field(name="⚡ 指令", value=f"`{command_name}`", inline=True)
-            embed.add_field(name="💬 響應", value=response, inline=False)
-            embed.set_footer(text="指令執行記錄")
-            
-            # 發送日誌
-            await channel.send(embed=embed)
-        except (ValueError, AttributeError) as e:
-            print(f"❌ 日誌發送失败: {e}")
-        except Exception as e:
-            print(f"❌ 未知錯誤: {e}")
+    async def cog_load(self):
+        # 在發送回應時記下響應內容，不必再請求 original_response
+        discord.InteractionResponse.send_message = _send_message
+        discord.InteractionResponse.edit_message = _edit_message
+        discord.Webhook.send = _webhook_send
+        self.sink.start()
     
-    def _extract_response_content(self, message):
-        """从訊息对象提取響應内容"""
-        try:
-            # 优先获取文字内容
-            if message.content:
-                content = message.content
-            # 如果是embed訊息
-            elif message.embeds:
-                embed = message.embeds[0]
-                if embed.title:
-                    content = embed.title
-                elif embed.description:
-                    content = embed.description
-                else:
-                    content = "Embed訊息"
-            else:
-                content = "已響應"
-            
-            # 限制長度，避免日誌过长
-            if len(content) > 100:
-                content = content[:97] + "..."
-            
-            return content
-        except Exception as e:
-            print(f"❌ 提取響應内容失败: {e}")
-            return "已響應"
+    async def cog_unload(self):
+        # 只還原仍是本模組包裝的方法，不覆蓋其他地方之後的修改
+        if discord.InteractionResponse.send_message is _send_message:
+            discord.InteractionResponse.send_message = _original_send_message
+        if discord.InteractionResponse.edit_message is _edit_message:
+            discord.InteractionResponse.edit_message = _original_edit_message
+        if discord.Webhook.send is _webhook_send:
+            discord.Webhook.send = _original_webhook_send
+        await self.sink.close()
     
     @commands.Cog.listener()
     async def on_app_command_completion(self, interaction: discord.Interaction, command):
         """当slash command完成时触发"""
+        if not self.sink.enabled:
+            return
         try:
-            # 获取用戶名
-            user_name = str(interaction.user)
-            
             # 获取完整指令名（包括组名）
             command_name = command.name
             if hasattr(command, 'parent') and command.parent:
@@ -94,27 +116,26 @@ class LoggingSystem(commands.Cog):
             else:
                 command_name = f"/{command_name}"
             
-            # 等待一小段時間确保響應已發送
-            await asyncio.sleep(0.5)
+            # 響應内容在發送時已記下；延遲回應則取 followup 的內容
+            response = _followup_responses.pop(interaction.token, None)
+            response = interaction.extras.get('log_response', response) or "已執行指令"
             
-            # 尝试获取原始響應訊息
-            try:
-                original_message = await interaction.original_response()
-                response = self._extract_response_content(original_message)
-            except:
-                # 如果无法获取原始響應，使用預設文字
-                response = "已執行指令"
-            
-            # 記錄日誌
-            await self.send_log(user_name, command_name, response)
-                
+            # 加入日誌佇列（背景批次發送）
+            self.sink.put(
+                str(interaction.user),
+                command_name,
+                response,
+                interaction.guild.name if interaction.guild else None
+            )
         except Exception as e:
             print(f"❌ 記錄日誌时出錯: {e}")
     
     @commands.Cog.listener()
     async def on_ready(self):
         print(f'📦 {self.__class__.__name__} cog已載入')
-        if self.log_channel_id:
+        if LOG_WEBHOOK_URL:
+            print('📝 日誌透過 webhook 發送')
+        elif self.log_channel_id:
             print(f'📝 日誌頻道ID: {self.log_channel_id}')
         else:
             print('⚠️  未設定日誌頻道ID (LOG_CHANNEL_ID) - 日誌功能已禁用')
@@ -1,8 +1,6 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
-import os
 from datetime import datetime
 
 class Moderation(commands.Cog):
@@ -11,25 +9,13 @@ class Moderation(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
     
-    def get_data_path(self, guild_id):
-        """獲取數據路徑"""
-        path = f'./data/{guild_id}'
-        os.makedirs(path, exist_ok=True)
-        return path
-    
     def load_warnings(self, guild_id):
         """載入警告數據"""
-        file_path = f'{self.get_data_path(guild_id)}/warnings.json'
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+        return self.bot.data_store.get(guild_id, 'warnings')
     
     def save_warnings(self, guild_id, data):
         """保存警告數據"""
-        file_path = f'{self.get_data_path(guild_id)}/warnings.json'
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        self.bot.data_store.set(guild_id, 'warnings', data)
     
     async def check_auto_punishment(self, interaction: discord.Interaction, member: discord.Member, warn_count: int):
         """檢查並執行自動處罰"""
@@ -1,12 +1,17 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
-import os
 from datetime import datetime, timedelta
 import asyncio
 from typing import Optional
 
+# 投票訊息最短更新間隔（秒），期間的投票合併成一次編輯並顯示最新票數
+POLL_EDIT_INTERVAL = 3
+
+def poll_doc_name(poll_id: str) -> str:
+    """單個投票的數據文件名稱（位於伺服器目錄下）"""
+    return f'poll_{poll_id}'
+
 class PollButton(discord.ui.Button):
     """投票按鈕"""
     def __init__(self, option_index: int, option_text: str, emoji: str = None):
@@ -92,11 +97,14 @@ class PollView(discord.ui.View):
             await interaction.response.send_message("❌ 此投票已結束！", ephemeral=True)
             return
         
-        # 檢查用戶是否已投票
+        counts = current_data['counts']
+        
+        # 檢查用戶是否已投票（每次只增減受影響選項的票數）
         if user_id in current_data['votes']:
             if not self.multi_choice:
                 # 單選模式：改投
                 old_choice = current_data['votes'][user_id]
+                counts[old_choice] -= 1
                 if old_choice == option_index:
                     # 取消投票
                     del current_data['votes'][user_id]
@@ -104,6 +112,7 @@ class PollView(discord.ui.View):
                 else:
                     # 改投
                     current_data['votes'][user_id] = option_index
+                    counts[option_index] += 1
                     await interaction.response.send_message(
                         f"✅ 已改投為：**{current_data['options'][option_index]}**", 
                         ephemeral=True
@@ -115,6 +124,7 @@ class PollView(discord.ui.View):
                 
                 if option_index in current_data['votes'][user_id]:
                     current_data['votes'][user_id].remove(option_index)
+                    counts[option_index] -= 1
                     if not current_data['votes'][user_id]:
                         del current_data['votes'][user_id]
                     await interaction.response.send_message(
@@ -123,6 +133,7 @@ class PollView(discord.ui.View):
                     )
                 else:
                     current_data['votes'][user_id].append(option_index)
+                    counts[option_index] += 1
                     await interaction.response.send_message(
                         f"✅ 已添加選擇：**{current_data['options'][option_index]}**", 
                         ephemeral=True
@@ -133,6 +144,7 @@ class PollView(discord.ui.View):
                 current_data['votes'][user_id] = [option_index]
             else:
                 current_data['votes'][user_id] = option_index
+            counts[option_index] += 1
             
             await interaction.response.send_message(
                 f"✅ 已投票：**{current_data['options'][option_index]}**", 
@@ -142,8 +154,8 @@ class PollView(discord.ui.View):
         # 保存數據
         self.cog.save_poll(current_data)
         
-        # 更新顯示
-        await self.update_poll_message(interaction.message)
+        # 更新顯示（合併短時間內的多次投票）
+        self.cog.request_update(poll_id, interaction.message, self)
     
     async def show_results(self, interaction: discord.Interaction):
         """顯示投票結果"""
@@ -166,9 +178,7 @@ class PollView(discord.ui.View):
             await interaction.response.send_message("❌ 找不到投票數據", ephemeral=True)
             return
         
-        current_data['ended'] = True
-        current_data['end_time'] = datetime.now().isoformat()
-        self.cog.save_poll(current_data)
+        self.cog.mark_ended(current_data)
         
         # 禁用所有按鈕
         for item in self.children:
@@ -178,18 +188,6 @@ class PollView(discord.ui.View):
         embed = self.create_results_embed(current_data, ended=True)
         await interaction.response.edit_message(embed=embed, view=self)
     
-    async def update_poll_message(self, message):
-        """更新投票消息"""
-        poll_id = self.poll_data['id']
-        current_data = self.cog.get_poll(poll_id)
-        
-        if current_data:
-            embed = self.create_poll_embed(current_data)
-            try:
-                await message.edit(embed=embed)
-            except:
-                pass
-    
     def create_poll_embed(self, poll_data: dict) -> discord.Embed:
         """創建投票 Embed"""
         embed = discord.Embed(
@@ -231,6 +229,10 @@ class PollView(discord.ui.View):
         embed.add_field(name="設置", value=" | ".join(settings), inline=True)
         embed.add_field(name="總票數", value=f"**{total_votes}** 票", inline=True)
         
+        if poll_data.get('expires_at'):
+            expires_at = int(datetime.fromisoformat(poll_data['expires_at']).timestamp())
+            embed.add_field(name="截止時間", value=f"<t:{expires_at}:R>", inline=True)
+        
         embed.set_footer(text=f"創建者: {poll_data['creator_name']}")
         
         return embed
@@ -282,50 +284,152 @@ class PollView(discord.ui.View):
         return embed
     
     def calculate_votes(self, poll_data: dict) -> dict:
-        """計算投票結果"""
-        vote_counts = {i: 0 for i in range(len(poll_data['options']))}
-        
-        for user_id, vote in poll_data['votes'].items():
-            if isinstance(vote, list):
-                for v in vote:
-                    vote_counts[v] = vote_counts.get(v, 0) + 1
-            else:
-                vote_counts[vote] = vote_counts.get(vote, 0) + 1
-        
-        return vote_counts
+        """投票結果 {選項: 票數}（使用增量維護的票數）"""
+        if 'counts' not in poll_data:
+            poll_data['counts'] = count_votes(poll_data)
+        return dict(enumerate(poll_data['counts']))
+
+def count_votes(poll_data: dict) -> list:
+    """從所有投票重新計算各選項票數（舊數據或修復時使用）"""
+    counts = [0] * len(poll_data['options'])
+    for vote in poll_data['votes'].values():
+        for v in (vote if isinstance(vote, list) else [vote]):
+            counts[v] += 1
+    return counts
 
 class Polls(commands.Cog):
     """投票/問卷系統"""
     
     def __init__(self, bot):
         self.bot = bot
-        self.data_folder = './data'
-        self.polls_file = os.path.join(self.data_folder, 'polls.json')
+        self._edit_tasks = {}  # {poll_id: 等待中的訊息更新任務}
+        self._edit_targets = {}  # {poll_id: (要更新的訊息, 視圖)}
+        self._last_edit = {}  # {poll_id: 上次更新時間}
         self.load_polls()
+        # 限時投票到期由排程服務結束
+        self.bot.scheduler.register('poll_expiry', self.expire_poll)
+    
+    def cog_unload(self):
+        self.bot.scheduler.unregister('poll_expiry')
+        for task in self._edit_tasks.values():
+            task.cancel()
     
     def load_polls(self):
-        """載入投票數據"""
-        os.makedirs(self.data_folder, exist_ok=True)
-        
-        if os.path.exists(self.polls_file):
-            with open(self.polls_file, 'r', encoding='utf-8') as f:
-                self.polls = json.load(f)
-        else:
-            self.polls = {}
+        """載入進行中的投票
+        
+        每個投票存為伺服器目錄下的 `poll_<id>` 文件，全局文件 `polls_active`
+        只記錄進行中的投票 {poll_id: guild_id}。已結束的投票保留在各自的文件中
+        （歸檔），啟動時不會載入。
+        """
+        store = self.bot.data_store
+        self.active = store.get(None, 'polls_active')
+        if store.exists(None, 'polls'):
+            self.migrate_legacy_polls()
+        
+        self.polls = {}
+        for poll_id, guild_id in self.active.items():
+            poll_data = store.get(guild_id, poll_doc_name(poll_id))
+            if poll_data:
+                if 'counts' not in poll_data:
+                    poll_data['counts'] = count_votes(poll_data)
+                self.polls[poll_id] = poll_data
     
-    def save_polls(self):
-        """保存所有投票數據"""
-        with open(self.polls_file, 'w', encoding='utf-8') as f:
-            json.dump(self.polls, f, ensure_ascii=False, indent=2)
+    def migrate_legacy_polls(self):
+        """將舊版的單一 polls 文件拆分為每個投票一個文件"""
+        store = self.bot.data_store
+        legacy = store.get(None, 'polls')
+        if not legacy:
+            return
+        for poll_id, poll_data in legacy.items():
+            poll_data['counts'] = count_votes(poll_data)
+            store.set(poll_data['guild_id'], poll_doc_name(poll_id), poll_data)
+            if not poll_data.get('ended', False):
+                self.active[poll_id] = str(poll_data['guild_id'])
+        store.mark_dirty(None, 'polls_active')
+        store.set(None, 'polls', {})
+        print(f'🗳️ 已將 {len(legacy)} 個投票遷移為獨立文件')
     
     def get_poll(self, poll_id: str) -> dict:
-        """獲取投票數據"""
+        """獲取進行中的投票數據"""
         return self.polls.get(poll_id)
     
     def save_poll(self, poll_data: dict):
-        """保存單個投票數據"""
-        self.polls[poll_data['id']] = poll_data
-        self.save_polls()
+        """保存單個投票數據（只寫入該投票的文件）"""
+        poll_id = poll_data['id']
+        store = self.bot.data_store
+        store.set(poll_data['guild_id'], poll_doc_name(poll_id), poll_data)
+        if poll_data.get('ended', False):
+            # 歸檔：移出進行中的投票
+            self.polls.pop(poll_id, None)
+            if self.active.pop(poll_id, None) is not None:
+                store.mark_dirty(None, 'polls_active')
+        else:
+            self.polls[poll_id] = poll_data
+            if poll_id not in self.active:
+                self.active[poll_id] = str(poll_data['guild_id'])
+                store.mark_dirty(None, 'polls_active')
+    
+    def request_update(self, poll_id: str, message, view: PollView):
+        """要求更新投票訊息：每個投票最多每 POLL_EDIT_INTERVAL 秒編輯一次，顯示當時最新的票數"""
+        self._edit_targets[poll_id] = (message, view)
+        if poll_id not in self._edit_tasks:
+            self._edit_tasks[poll_id] = asyncio.create_task(self._edit_later(poll_id))
+    
+    async def _edit_later(self, poll_id: str):
+        loop = asyncio.get_running_loop()
+        delay = self._last_edit.get(poll_id, 0) + POLL_EDIT_INTERVAL - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # 之後的投票會建立新的更新任務
+        self._edit_tasks.pop(poll_id, None)
+        target = self._edit_targets.pop(poll_id, None)
+        poll_data = self.get_poll(poll_id)
+        if target is None or poll_data is None:
+            return
+        message, view = target
+        self._last_edit[poll_id] = loop.time()
+        embed = view.create_poll_embed(poll_data)
+        try:
+            await message.edit(embed=embed)
+        except:
+            pass
+    
+    def cancel_update(self, poll_id: str):
+        """取消等待中的訊息更新（投票結束時由結果訊息取代）"""
+        task = self._edit_tasks.pop(poll_id, None)
+        if task is not None:
+            task.cancel()
+        self._edit_targets.pop(poll_id, None)
+        self._last_edit.pop(poll_id, None)
+    
+    def mark_ended(self, poll_data: dict):
+        """將投票標記為已結束並歸檔，取消尚未執行的到期工作與訊息更新"""
+        poll_data['ended'] = True
+        poll_data['end_time'] = datetime.now().isoformat()
+        if poll_data.get('expiry_job'):
+            self.bot.scheduler.cancel(poll_data.pop('expiry_job'))
+        self.cancel_update(poll_data['id'])
+        self.save_poll(poll_data)
+    
+    async def expire_poll(self, job):
+        """排程工作：限時投票到期，結束投票並更新訊息"""
+        poll_data = self.get_poll(job['payload']['poll_id'])
+        if not poll_data or poll_data.get('ended', False):
+            return
+        
+        poll_data.pop('expiry_job', None)
+        self.mark_ended(poll_data)
+        
+        view = PollView(poll_data, self)
+        for item in view.children:
+            item.disabled = True
+        embed = view.create_results_embed(poll_data, ended=True)
+        
+        channel = self.bot.get_channel(poll_data['channel_id'])
+        if channel is None:
+            channel = await self.bot.fetch_channel(poll_data['channel_id'])
+        message = channel.get_partial_message(poll_data['message_id'])
+        await message.edit(embed=embed, view=view)
     
     # 創建指令組
     poll_group = app_commands.Group(name="投票", description="投票/問卷功能")
@@ -336,7 +440,8 @@ class Polls(commands.Cog):
         選項="選項，用逗號分隔（例如：選項1,選項2,選項3）",
         多選="是否允許多選（預設：否）",
         匿名="是否匿名投票（預設：否）",
-        說明="投票說明（可選）"
+        說明="投票說明（可選）",
+        時長="投票持續時間（分鐘，可選，到期自動結束）"
     )
     async def create_poll(
         self, 
@@ -345,7 +450,8 @@ class Polls(commands.Cog):
         選項: str,
         多選: bool = False,
         匿名: bool = False,
-        說明: Optional[str] = None
+        說明: Optional[str] = None,
+        時長: Optional[app_commands.Range[int, 1, 43200]] = None
     ):
         """創建投票"""
         # 解析選項
@@ -374,8 +480,11 @@ class Polls(commands.Cog):
             'channel_id': interaction.channel.id,
             'created_at': datetime.now().isoformat(),
             'votes': {},
+            'counts': [0] * len(options),
             'ended': False
         }
+        if 時長:
+            poll_data['expires_at'] = (datetime.now() + timedelta(minutes=時長)).isoformat()
         
         # 創建視圖
         view = PollView(poll_data, self)
@@ -388,6 +497,16 @@ class Polls(commands.Cog):
         message = await interaction.original_response()
         poll_data['message_id'] = message.id
         
+        # 限時投票：排程到期時自動結束
+        if 時長:
+            poll_data['expiry_job'] = self.bot.scheduler.schedule(
+                'poll_expiry',
+                datetime.fromisoformat(poll_data['expires_at']).timestamp(),
+                {'poll_id': poll_id},
+                user_id=interaction.user.id,
+                guild_id=interaction.guild.id
+            )
+        
         # 保存投票
         self.save_poll(poll_data)
     
@@ -1,10 +1,27 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import json
-import os
+import asyncio
 from datetime import timedelta
-import re
+from utils.word_matcher import BannedWordMatcher
+
+# 違禁詞達到此數量時在執行緒中建立匹配器（5 萬個詞約需 0.5 秒），不阻塞事件循環
+MATCHER_THREAD_THRESHOLD = 1000
+
+
+def default_security_data():
+    """新伺服器的安全設定"""
+    return {
+        "enabled": True,
+        "banned_words": [],
+        "timeout_duration": 60,  # 秒
+        "action_type": "timeout",  # timeout, delete, warn
+        "whitelist_roles": [],  # 白名單角色 ID
+        "whitelist_channels": [],  # 白名單頻道 ID
+        "case_sensitive": False,  # 是否區分大小寫
+        "match_type": "contains"  # contains, exact, regex
+    }
+
 
 class SecuritySystem(commands.Cog):
     """反垃圾/安全系統"""
@@ -12,100 +29,118 @@ class SecuritySystem(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.data_folder = "./data"
+        self.matchers = {}  # {guild_id: (設定物件 id, BannedWordMatcher)}
+        self._builds = {}  # 執行緒中建立中的匹配器 {guild_id: (設定物件 id, future)}
+        self._build_tasks = set()
+        # 違禁詞檢查為訊息管線的第一個階段
+        self.bot.message_pipeline.register('security', self.process_message, documents=('security',))
+    
+    def cog_unload(self):
+        self.bot.message_pipeline.unregister('security')
         
     def get_security_data(self, guild_id):
         """獲取安全設定數據"""
-        filepath = f"{self.data_folder}/{guild_id}/security.json"
-        if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {
-            "enabled": True,
-            "banned_words": [],
-            "timeout_duration": 60,  # 秒
-            "action_type": "timeout",  # timeout, delete, warn
-            "whitelist_roles": [],  # 白名單角色 ID
-            "whitelist_channels": [],  # 白名單頻道 ID
-            "case_sensitive": False,  # 是否區分大小寫
-            "match_type": "contains"  # contains, exact, regex
-        }
+        return self.bot.data_store.get(guild_id, 'security', default_security_data)
     
     def save_security_data(self, guild_id, data):
         """保存安全設定數據"""
-        folder = f"{self.data_folder}/{guild_id}"
-        os.makedirs(folder, exist_ok=True)
-        
-        filepath = f"{folder}/security.json"
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        self.bot.data_store.set(guild_id, 'security', data)
     
-    def check_banned_word(self, content, banned_words, case_sensitive=False, match_type="contains"):
-        """檢查是否包含違禁詞"""
-        if not case_sensitive:
-            content = content.lower()
-        
-        for word in banned_words:
-            check_word = word if case_sensitive else word.lower()
-            
-            if match_type == "exact":
-                # 完全匹配
-                if content == check_word:
-                    return True, word
-            elif match_type == "contains":
-                # 包含匹配
-                if check_word in content:
-                    return True, word
-            elif match_type == "regex":
-                # 正則匹配
-                try:
-                    pattern = re.compile(check_word, re.IGNORECASE if not case_sensitive else 0)
-                    if pattern.search(content):
-                        return True, word
-                except re.error:
-                    continue
-        
-        return False, None
+    def invalidate_matcher(self, guild_id):
+        """違禁詞或匹配設定變更後，清除已編譯的匹配器
+
+        違禁詞很多時立即在背景重新建立，不等到下一則訊息。
+        """
+        guild_id = str(guild_id)
+        self.matchers.pop(guild_id, None)
+        self._builds.pop(guild_id, None)
+        data = self.get_security_data(guild_id)
+        if len(data.get("banned_words", [])) >= MATCHER_THREAD_THRESHOLD:
+            task = asyncio.create_task(self.prepare_matcher(guild_id, data))
+            self._build_tasks.add(task)
+            task.add_done_callback(self._build_tasks.discard)
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """監聽消息，檢查違禁詞"""
-        # 忽略機器人消息
-        if message.author.bot:
-            return
-        
-        # 忽略私訊
-        if not message.guild:
-            return
+    def get_matcher(self, guild_id, data):
+        """獲取伺服器已編譯的違禁詞匹配器（只在設定變更後重新建立）"""
+        guild_id = str(guild_id)
+        cached = self.matchers.get(guild_id)
+        # 設定文件被整份替換時也需要重新建立
+        if cached is None or cached[0] != id(data):
+            matcher = BannedWordMatcher(
+                data.get("banned_words", []),
+                data.get("case_sensitive", False),
+                data.get("match_type", "contains")
+            )
+            cached = (id(data), matcher)
+            self.matchers[guild_id] = cached
+        return cached[1]
+    
+    async def prepare_matcher(self, guild_id, data):
+        """獲取匹配器；違禁詞很多時在執行緒中建立，建立期間的訊息共用同一次建立"""
+        guild_id = str(guild_id)
+        cached = self.matchers.get(guild_id)
+        if cached is not None and cached[0] == id(data):
+            return cached[1]
+        words = data.get("banned_words", [])
+        if len(words) < MATCHER_THREAD_THRESHOLD:
+            return self.get_matcher(guild_id, data)
+        
+        build = self._builds.get(guild_id)
+        if build is None or build[0] != id(data):
+            future = asyncio.get_running_loop().run_in_executor(
+                None,
+                BannedWordMatcher,
+                list(words),  # 複製一份，建立期間指令修改列表不影響執行緒
+                data.get("case_sensitive", False),
+                data.get("match_type", "contains")
+            )
+            build = self._builds[guild_id] = (id(data), future)
+        
+        try:
+            matcher = await build[1]
+        finally:
+            # 建立期間設定又被變更時，invalidate_matcher 已移除這次建立，結果不快取
+            current = self._builds.get(guild_id) is build
+            if current:
+                del self._builds[guild_id]
+        if current:
+            self.matchers[guild_id] = (id(data), matcher)
+        return matcher
+    
+    async def check_banned_word(self, guild_id, data, content, content_lower=None):
+        """檢查是否包含違禁詞，回傳 (是否命中, 命中的違禁詞)"""
+        matcher = await self.prepare_matcher(guild_id, data)
+        matched_word = matcher.find(content, content_lower)
+        return matched_word is not None, matched_word
+    
+    async def process_message(self, ctx):
+        """訊息管線階段：檢查違禁詞，訊息被刪除時回傳 True 停止後續階段"""
+        message = ctx.message
         
         # 獲取安全設定
-        data = self.get_security_data(message.guild.id)
+        data = ctx.config('security', default_security_data)
         
         # 檢查系統是否啟用
         if not data.get("enabled", True):
-            return
+            return False
         
         # 檢查白名單角色
         if data.get("whitelist_roles"):
-            user_role_ids = [role.id for role in message.author.roles]
-            if any(role_id in user_role_ids for role_id in data["whitelist_roles"]):
-                return
+            if any(str(role_id) in ctx.role_ids for role_id in data["whitelist_roles"]):
+                return False
         
         # 檢查白名單頻道
         if data.get("whitelist_channels"):
             if message.channel.id in data["whitelist_channels"]:
-                return
+                return False
         
         # 檢查違禁詞
         banned_words = data.get("banned_words", [])
         if not banned_words:
-            return
+            return False
         
-        has_banned, matched_word = self.check_banned_word(
-            message.content,
-            banned_words,
-            data.get("case_sensitive", False),
-            data.get("match_type", "contains")
-        )
+        has_banned, matched_word = await self.check_banned_word(ctx.guild_id, data, ctx.content, ctx.content_lower)
+        deleted = False
         
         if has_banned:
             action_type = data.get("action_type", "timeout")
@@ -114,6 +149,7 @@ class SecuritySystem(commands.Cog):
                 # 刪除消息
                 if action_type in ["timeout", "delete", "warn"]:
                     await message.delete()
+                    deleted = True
                 
                 # Timeout 用戶
                 if action_type == "timeout":
@@ -150,6 +186,8 @@ class SecuritySystem(commands.Cog):
                 print(f"[安全系統] 權限不足，無法處罰 {message.author}")
             except Exception as e:
                 print(f"[安全系統] 錯誤: {e}")
+        
+        return deleted
     
     # 斜線指令組
     security_group = app_commands.Group(name="安全", description="安全系統管理")
@@ -170,6 +208,7 @@ class SecuritySystem(commands.Cog):
         
         data["banned_words"].append(詞彙)
         self.save_security_data(interaction.guild_id, data)
+        self.invalidate_matcher(interaction.guild_id)
         
         await interaction.response.send_message(f"✅ 已添加違禁詞：`{詞彙}`", ephemeral=True)
     
@@ -186,6 +225,7 @@ class SecuritySystem(commands.Cog):
         
         data["banned_words"].remove(詞彙)
         self.save_security_data(interaction.guild_id, data)
+        self.invalidate_matcher(interaction.guild_id)
         
         await interaction.response.send_message(f"✅ 已移除違禁詞：`{詞彙}`", ephemeral=True)
     
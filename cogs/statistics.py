@@ -1,10 +1,72 @@
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 import os
-import json
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import Counter, defaultdict
+
+# 統計數據寫回數據存儲的間隔（秒）
+STATS_PERSIST_INTERVAL = int(os.getenv('STATS_PERSIST_INTERVAL', 60))
+
+
+class GuildStats:
+    """單一伺服器的即時統計計數器
+    
+    訊息事件只更新記憶體中的計數器，不再每則訊息都重建整份統計 JSON；
+    由背景任務定期轉換回原本的 statistics.json 格式寫入數據存儲。
+    """
+    
+    def __init__(self, data: dict):
+        self.total_messages = data.get('total_messages', 0)
+        self.daily_messages = Counter(data.get('daily_messages', {}))
+        self.channel_messages = Counter()
+        self.channel_names = {}
+        for channel_id, info in data.get('channel_stats', {}).items():
+            self.channel_messages[channel_id] = info.get('messages', 0)
+            self.channel_names[channel_id] = info.get('name', '')
+        self.user_messages = Counter()
+        self.usernames = {}
+        self.user_channels = defaultdict(Counter)
+        for user_id, info in data.get('user_stats', {}).items():
+            self.user_messages[user_id] = info.get('messages', 0)
+            self.usernames[user_id] = info.get('username', '')
+            self.user_channels[user_id].update(info.get('channels', {}))
+        hourly = data.get('hourly_activity', {})
+        self.hourly_activity = [hourly.get(str(i), 0) for i in range(24)]
+        self.last_updated = data.get('last_updated', datetime.now().isoformat())
+    
+    def record(self, channel_id: str, channel_name: str, user_id: str, username: str, now: datetime):
+        """記錄一則訊息"""
+        self.total_messages += 1
+        self.daily_messages[now.strftime('%Y-%m-%d')] += 1
+        self.channel_messages[channel_id] += 1
+        self.channel_names[channel_id] = channel_name
+        self.user_messages[user_id] += 1
+        self.usernames[user_id] = username
+        self.user_channels[user_id][channel_id] += 1
+        self.hourly_activity[now.hour] += 1
+    
+    def to_dict(self) -> dict:
+        """轉換為 statistics.json 的格式"""
+        return {
+            'total_messages': self.total_messages,
+            'daily_messages': dict(self.daily_messages),
+            'channel_stats': {
+                channel_id: {'name': self.channel_names.get(channel_id, ''), 'messages': count}
+                for channel_id, count in self.channel_messages.items()
+            },
+            'user_stats': {
+                user_id: {
+                    'username': self.usernames.get(user_id, ''),
+                    'messages': count,
+                    'channels': dict(self.user_channels[user_id])
+                }
+                for user_id, count in self.user_messages.items()
+            },
+            'hourly_activity': {str(i): count for i, count in enumerate(self.hourly_activity)},
+            'last_updated': self.last_updated
+        }
+
 
 class Statistics(commands.Cog):
     """統計分析系統"""
@@ -12,101 +74,63 @@ class Statistics(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.message_cache = defaultdict(list)  # 臨時緩存，用於活躍度分析
+        self.guild_stats = {}  # {guild_id: GuildStats}
+        self.dirty_guilds = set()
+        # 訊息數排行榜
+        self.bot.leaderboards.register('messages', lambda guild_id: self.get_guild_stats(guild_id).user_messages.items())
+        self.persist_stats.start()
+        self.bot.message_pipeline.register('statistics', self.process_message, documents=('statistics',))
     
-    def get_stats_file(self, guild_id: int):
-        """獲取統計文件路徑"""
-        guild_id_str = str(guild_id)
-        data_dir = os.path.join('data', guild_id_str)
-        os.makedirs(data_dir, exist_ok=True)
-        return os.path.join(data_dir, 'statistics.json')
+    def cog_unload(self):
+        """停止背景任務並寫回所有統計數據"""
+        self.bot.message_pipeline.unregister('statistics')
+        self.persist_stats.cancel()
+        self.persist_all()
     
     def load_stats(self, guild_id: int):
         """載入統計數據"""
-        file_path = self.get_stats_file(guild_id)
-        
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        
-        return {
+        return self.bot.data_store.get(guild_id, 'statistics', lambda: {
             'total_messages': 0,
             'daily_messages': {},
             'channel_stats': {},
             'user_stats': {},
             'hourly_activity': {str(i): 0 for i in range(24)},
             'last_updated': datetime.now().isoformat()
-        }
+        })
     
-    def save_stats(self, guild_id: int, data: dict):
-        """儲存統計數據"""
-        file_path = self.get_stats_file(guild_id)
-        data['last_updated'] = datetime.now().isoformat()
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+    def get_guild_stats(self, guild_id: int) -> GuildStats:
+        """獲取伺服器的即時統計（第一次使用時從數據存儲載入）"""
+        guild_id = str(guild_id)
+        if guild_id not in self.guild_stats:
+            self.guild_stats[guild_id] = GuildStats(self.load_stats(guild_id))
+        return self.guild_stats[guild_id]
     
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        """監聽消息事件，記錄統計"""
-        # 忽略機器人訊息和私訊
-        if message.author.bot or not message.guild:
-            return
-        
-        guild_id = message.guild.id
-        channel_id = str(message.channel.id)
-        user_id = str(message.author.id)
-        
-        # 載入統計數據
-        stats = self.load_stats(guild_id)
-        
-        # 獲取當前日期和小時
-        now = datetime.now()
-        today = now.strftime('%Y-%m-%d')
-        hour = str(now.hour)
-        
-        # 更新總訊息數
-        stats['total_messages'] = stats.get('total_messages', 0) + 1
-        
-        # 更新每日訊息
-        if 'daily_messages' not in stats:
-            stats['daily_messages'] = {}
-        stats['daily_messages'][today] = stats['daily_messages'].get(today, 0) + 1
-        
-        # 更新頻道統計
-        if 'channel_stats' not in stats:
-            stats['channel_stats'] = {}
-        if channel_id not in stats['channel_stats']:
-            stats['channel_stats'][channel_id] = {
-                'name': message.channel.name,
-                'messages': 0
-            }
-        stats['channel_stats'][channel_id]['messages'] += 1
-        stats['channel_stats'][channel_id]['name'] = message.channel.name  # 更新頻道名稱
-        
-        # 更新用戶統計
-        if 'user_stats' not in stats:
-            stats['user_stats'] = {}
-        if user_id not in stats['user_stats']:
-            stats['user_stats'][user_id] = {
-                'username': str(message.author),
-                'messages': 0,
-                'channels': {}
-            }
-        stats['user_stats'][user_id]['messages'] += 1
-        stats['user_stats'][user_id]['username'] = str(message.author)  # 更新用戶名
-        
-        # 更新用戶在各頻道的統計
-        if channel_id not in stats['user_stats'][user_id]['channels']:
-            stats['user_stats'][user_id]['channels'][channel_id] = 0
-        stats['user_stats'][user_id]['channels'][channel_id] += 1
-        
-        # 更新每小時活躍度
-        if 'hourly_activity' not in stats:
-            stats['hourly_activity'] = {str(i): 0 for i in range(24)}
-        stats['hourly_activity'][hour] = stats['hourly_activity'].get(hour, 0) + 1
-        
-        # 儲存統計數據
-        self.save_stats(guild_id, stats)
+    def persist_all(self):
+        """將有變動的統計寫回數據存儲"""
+        dirty, self.dirty_guilds = self.dirty_guilds, set()
+        for guild_id in dirty:
+            stats = self.guild_stats[guild_id]
+            stats.last_updated = datetime.now().isoformat()
+            self.bot.data_store.set(guild_id, 'statistics', stats.to_dict())
+    
+    @tasks.loop(seconds=STATS_PERSIST_INTERVAL)
+    async def persist_stats(self):
+        """定期寫回統計數據"""
+        self.persist_all()
+    
+    async def process_message(self, ctx):
+        """訊息管線階段：記錄統計"""
+        message = ctx.message
+        stats = self.get_guild_stats(ctx.guild_id)
+        stats.record(
+            ctx.channel_id,
+            message.channel.name,
+            ctx.author_id,
+            str(message.author),
+            datetime.now()
+        )
+        self.dirty_guilds.add(ctx.guild_id)
+        self.bot.leaderboards.update(ctx.guild_id, 'messages', ctx.author_id, stats.user_messages[ctx.author_id])
     
     # 創建統計指令群組
     stats_group = app_commands.Group(name="統計", description="統計分析系統")
@@ -114,10 +138,10 @@ class Statistics(commands.Cog):
     @stats_group.command(name="活躍度", description="查看伺服器活躍度統計")
     async def activity(self, interaction: discord.Interaction):
         """查看活躍度統計"""
-        stats = self.load_stats(interaction.guild.id)
+        stats = self.get_guild_stats(interaction.guild.id)
         
         # 計算最近7天的訊息數
-        daily_msgs = stats.get('daily_messages', {})
+        daily_msgs = stats.daily_messages
         today = datetime.now()
         last_7_days = []
         
@@ -134,7 +158,7 @@ class Statistics(commands.Cog):
         )
         
         # 總訊息數
-        total = stats.get('total_messages', 0)
+        total = stats.total_messages
         embed.add_field(
             name="總訊息數",
             value=f"**{total:,}** 條",
@@ -161,8 +185,9 @@ class Statistics(commands.Cog):
         
         # 最近7天趨勢
         trend_text = ""
+        week_max = max(c for _, c in last_7_days)
         for date, count in last_7_days:
-            bar_length = int(count / max(c for _, c in last_7_days) * 20) if max(c for _, c in last_7_days) > 0 else 0
+            bar_length = int(count / week_max * 20) if week_max > 0 else 0
             bar = "█" * bar_length + "░" * (20 - bar_length)
             trend_text += f"`{date}` {bar} **{count}**\n"
         
@@ -173,10 +198,10 @@ class Statistics(commands.Cog):
         )
         
         # 活躍時段
-        hourly = stats.get('hourly_activity', {})
-        if hourly:
-            max_hour = max(hourly.items(), key=lambda x: x[1])
-            min_hour = min(hourly.items(), key=lambda x: x[1])
+        hourly = stats.hourly_activity
+        if any(hourly):
+            max_hour = max(enumerate(hourly), key=lambda x: x[1])
+            min_hour = min(enumerate(hourly), key=lambda x: x[1])
             
             embed.add_field(
                 name="🌟 最活躍時段",
@@ -196,19 +221,14 @@ class Statistics(commands.Cog):
     @stats_group.command(name="熱門頻道", description="查看最熱門的頻道")
     async def top_channels(self, interaction: discord.Interaction):
         """查看熱門頻道"""
-        stats = self.load_stats(interaction.guild.id)
-        channel_stats = stats.get('channel_stats', {})
+        stats = self.get_guild_stats(interaction.guild.id)
         
-        if not channel_stats:
+        if not stats.channel_messages:
             await interaction.response.send_message("❌ 還沒有頻道統計數據", ephemeral=True)
             return
         
         # 排序頻道
-        sorted_channels = sorted(
-            channel_stats.items(),
-            key=lambda x: x[1]['messages'],
-            reverse=True
-        )[:10]  # 取前10名
+        sorted_channels = stats.channel_messages.most_common(10)  # 取前10名
         
         embed = discord.Embed(
             title="🔥 熱門頻道排行榜 (前10名)",
@@ -219,24 +239,25 @@ class Statistics(commands.Cog):
         medals = ["🥇", "🥈", "🥉"]
         leaderboard_text = ""
         
-        total_messages = sum(data['messages'] for _, data in channel_stats.items())
+        total_messages = sum(stats.channel_messages.values())
         
-        for i, (channel_id, data) in enumerate(sorted_channels):
+        for i, (channel_id, messages) in enumerate(sorted_channels):
             medal = medals[i] if i < 3 else f"**{i+1}.**"
-            percentage = (data['messages'] / total_messages * 100) if total_messages > 0 else 0
+            percentage = (messages / total_messages * 100) if total_messages > 0 else 0
+            channel_name = stats.channel_names.get(channel_id, '')
             
             # 嘗試獲取頻道
             try:
                 channel = interaction.guild.get_channel(int(channel_id))
-                channel_mention = channel.mention if channel else f"#{data['name']}"
+                channel_mention = channel.mention if channel else f"#{channel_name}"
             except:
-                channel_mention = f"#{data['name']}"
+                channel_mention = f"#{channel_name}"
             
             bar_length = int(percentage / 5)  # 每5%一個方塊
             bar = "█" * bar_length + "░" * (20 - bar_length)
             
             leaderboard_text += f"{medal} {channel_mention}\n"
-            leaderboard_text += f"`{bar}` **{data['messages']:,}** 條 ({percentage:.1f}%)\n\n"
+            leaderboard_text += f"`{bar}` **{messages:,}** 條 ({percentage:.1f}%)\n\n"
         
         embed.description = leaderboard_text
         embed.set_footer(text="統計數據更新於")
@@ -247,25 +268,21 @@ class Statistics(commands.Cog):
     async def my_stats(self, interaction: discord.Interaction, user: discord.Member = None):
         """查看個人統計"""
         target = user or interaction.user
-        stats = self.load_stats(interaction.guild.id)
-        user_stats = stats.get('user_stats', {})
+        stats = self.get_guild_stats(interaction.guild.id)
         
         user_id_str = str(target.id)
         
-        if user_id_str not in user_stats:
+        if user_id_str not in stats.user_messages:
             await interaction.response.send_message(f"❌ {target.mention} 還沒有統計數據", ephemeral=True)
             return
         
-        user_data = user_stats[user_id_str]
-        total_messages = user_data.get('messages', 0)
+        total_messages = stats.user_messages[user_id_str]
         
         # 計算排名
-        all_users = [(uid, data['messages']) for uid, data in user_stats.items()]
-        all_users.sort(key=lambda x: x[1], reverse=True)
-        rank = next((i + 1 for i, (uid, _) in enumerate(all_users) if uid == user_id_str), 0)
+        rank = self.bot.leaderboards.rank(interaction.guild.id, 'messages', user_id_str)
         
         # 計算佔比
-        server_total = stats.get('total_messages', 0)
+        server_total = stats.total_messages
         percentage = (total_messages / server_total * 100) if server_total > 0 else 0
         
         embed = discord.Embed(
@@ -276,13 +293,13 @@ class Statistics(commands.Cog):
         embed.set_thumbnail(url=target.display_avatar.url)
         
         embed.add_field(name="總訊息數", value=f"**{total_messages:,}** 條", inline=True)
-        embed.add_field(name="伺服器排名", value=f"**#{rank}** / {len(all_users)}", inline=True)
+        embed.add_field(name="伺服器排名", value=f"**#{rank}** / {len(stats.user_messages)}", inline=True)
         embed.add_field(name="佔比", value=f"**{percentage:.2f}%**", inline=True)
         
         # 最常使用的頻道
-        user_channels = user_data.get('channels', {})
+        user_channels = stats.user_channels.get(user_id_str)
         if user_channels:
-            sorted_channels = sorted(user_channels.items(), key=lambda x: x[1], reverse=True)[:5]
+            sorted_channels = user_channels.most_common(5)
             
             channels_text = ""
             for channel_id, count in sorted_channels:
@@ -308,19 +325,15 @@ class Statistics(commands.Cog):
     @stats_group.command(name="活躍排行", description="查看最活躍用戶排行榜")
     async def active_users(self, interaction: discord.Interaction):
         """活躍用戶排行榜"""
-        stats = self.load_stats(interaction.guild.id)
-        user_stats = stats.get('user_stats', {})
+        stats = self.get_guild_stats(interaction.guild.id)
         
-        if not user_stats:
+        if not stats.user_messages:
             await interaction.response.send_message("❌ 還沒有用戶統計數據", ephemeral=True)
             return
         
-        # 排序用戶
-        sorted_users = sorted(
-            user_stats.items(),
-            key=lambda x: x[1]['messages'],
-            reverse=True
-        )[:10]  # 取前10名
+        # 取前10名並解析名稱
+        sorted_users = self.bot.leaderboards.board(interaction.guild.id, 'messages').top(10)
+        names = await self.bot.leaderboards.resolve_names(interaction.guild, [user_id for user_id, _ in sorted_users])
         
         embed = discord.Embed(
             title="👥 活躍用戶排行榜 (前10名)",
@@ -331,24 +344,19 @@ class Statistics(commands.Cog):
         medals = ["🥇", "🥈", "🥉"]
         leaderboard_text = ""
         
-        total_messages = stats.get('total_messages', 0)
+        total_messages = stats.total_messages
         
-        for i, (user_id, data) in enumerate(sorted_users):
+        for i, (user_id, messages) in enumerate(sorted_users):
             medal = medals[i] if i < 3 else f"**{i+1}.**"
-            percentage = (data['messages'] / total_messages * 100) if total_messages > 0 else 0
+            percentage = (messages / total_messages * 100) if total_messages > 0 else 0
             
-            # 嘗試獲取用戶
-            try:
-                user = await self.bot.fetch_user(int(user_id))
-                username = user.display_name
-            except:
-                username = data.get('username', '未知用戶')
+            username = names.get(user_id) or stats.usernames.get(user_id) or '未知用戶'
             
             bar_length = int(percentage / 5)  # 每5%一個方塊
             bar = "█" * bar_length + "░" * (20 - bar_length)
             
             leaderboard_text += f"{medal} {username}\n"
-            leaderboard_text += f"`{bar}` **{data['messages']:,}** 條 ({percentage:.1f}%)\n\n"
+            leaderboard_text += f"`{bar}` **{messages:,}** 條 ({percentage:.1f}%)\n\n"
         
         embed.description = leaderboard_text
         embed.set_footer(text="統計數據更新於")
@@ -358,10 +366,9 @@ class Statistics(commands.Cog):
     @stats_group.command(name="時段分析", description="查看24小時活躍度分析")
     async def hourly_analysis(self, interaction: discord.Interaction):
         """24小時活躍度分析"""
-        stats = self.load_stats(interaction.guild.id)
-        hourly = stats.get('hourly_activity', {})
+        hourly = self.get_guild_stats(interaction.guild.id).hourly_activity
         
-        if not hourly or sum(hourly.values()) == 0:
+        if sum(hourly) == 0:
             await interaction.response.send_message("❌ 還沒有時段統計數據", ephemeral=True)
             return
         
@@ -371,7 +378,7 @@ class Statistics(commands.Cog):
             timestamp=datetime.now()
         )
         
-        max_count = max(hourly.values()) if hourly.values() else 1
+        max_count = max(hourly)
         
         # 分三個時段顯示（0-7, 8-15, 16-23）
         periods = [
@@ -383,8 +390,7 @@ class Statistics(commands.Cog):
         for period_name, hours in periods:
             period_text = ""
             for hour in hours:
-                hour_str = str(hour)
-                count = hourly.get(hour_str, 0)
+                count = hourly[hour]
                 bar_length = int(count / max_count * 15) if max_count > 0 else 0
                 bar = "█" * bar_length + "░" * (15 - bar_length)
                 period_text += f"`{hour:02d}:00` {bar} **{count:,}**\n"
@@ -392,9 +398,9 @@ class Statistics(commands.Cog):
             embed.add_field(name=period_name, value=period_text, inline=False)
         
         # 統計最忙和最閒的時段
-        sorted_hours = sorted(hourly.items(), key=lambda x: int(x[1]), reverse=True)
-        busiest = sorted_hours[0] if sorted_hours else ("0", 0)
-        quietest = sorted_hours[-1] if sorted_hours else ("0", 0)
+        sorted_hours = sorted(enumerate(hourly), key=lambda x: x[1], reverse=True)
+        busiest = sorted_hours[0]
+        quietest = sorted_hours[-1]
         
         summary = f"📈 最忙：**{busiest[0]}:00** ({busiest[1]:,} 條)\n"
         summary += f"📉 最閒：**{quietest[0]}:00** ({quietest[1]:,} 條)"
@@ -1,46 +1,186 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
-import os
+import time
 import asyncio
+from collections import deque
 from typing import Optional
 
+# 臨時頻道清空後多久刪除（秒）
+CLEANUP_DELAY = 60
+# 預備頻道池設定
+POOL_CHANNEL_NAME = '⏳ 預備頻道'  # 預備頻道在分配前的名稱（對成員隱藏）
+POOL_RATE_WINDOW = 600  # 計算加入頻率的時間窗口（秒）
+POOL_JOINS_PER_CHANNEL = 3  # 時間窗口內每多少次加入多預備一個頻道
+POOL_REFILL_DELAY = 1.0  # 補充預備頻道時每次建立之間的間隔（秒）
+
 class TempVoice(commands.Cog):
     """臨時語音頻道系統"""
     
     def __init__(self, bot):
         self.bot = bot
         self.data_folder = './data'
-        # 追蹤臨時頻道 {channel_id: owner_id}
+        # 追蹤臨時頻道 {channel_id: owner_id}（持久化於各伺服器的 temp_voice_channels）
         self.temp_channels = {}
+        # 伺服器配置快取 {guild_id: config}
+        self.configs = {}
+        self._swept = False
+        # 預備頻道池 {guild_id: [channel_id]}（持久化於各伺服器的 temp_voice_pool）
+        self.pools = {}
+        self._recent_joins = {}  # {guild_id: deque[加入時間]}
+        self._refill_tasks = {}  # {guild_id: 補充任務}
+        self.pool_stats = {}  # {guild_id: {'hits': 命中次數, 'misses': 未命中次數}}
+        # 等待刪除的空頻道 {channel_id: 排程工作 ID}（重啟後從排程服務還原）
+        self.cleanup_jobs = {
+            int(job['payload']['channel_id']): job['id']
+            for job in self.bot.scheduler.jobs(kind='temp_voice_cleanup')
+        }
+        self.bot.scheduler.register('temp_voice_cleanup', self.cleanup_channel)
     
-    def get_config_file(self, guild_id: int) -> str:
-        """獲取伺服器的臨時語音配置檔案路徑"""
-        folder = os.path.join(self.data_folder, str(guild_id))
-        os.makedirs(folder, exist_ok=True)
-        return os.path.join(folder, 'temp_voice.json')
+    def cog_unload(self):
+        self.bot.scheduler.unregister('temp_voice_cleanup')
+        for task in self._refill_tasks.values():
+            task.cancel()
     
     def load_config(self, guild_id: int) -> dict:
         """載入臨時語音配置"""
-        file_path = self.get_config_file(guild_id)
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {
+        return self.bot.data_store.get(guild_id, 'temp_voice', lambda: {
             'enabled': False,
             'trigger_channel_id': None,
             'category_id': None,
             'channel_name_format': '{username} 的頻道',
             'user_limit': 0,
-            'default_bitrate': 64000
-        }
+            'default_bitrate': 64000,
+            'pool_size': 0
+        })
+    
+    def get_config(self, guild_id: int) -> dict:
+        """獲取臨時語音配置（快取）"""
+        config = self.configs.get(guild_id)
+        if config is None:
+            config = self.configs[guild_id] = self.load_config(guild_id)
+        return config
+    
+    def invalidate_config(self, guild_id):
+        """清除配置快取（網頁後台修改配置後呼叫）"""
+        self.configs.pop(int(guild_id), None)
     
     def save_config(self, guild_id: int, config: dict):
         """儲存臨時語音配置"""
-        file_path = self.get_config_file(guild_id)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        self.configs[guild_id] = config
+        self.bot.data_store.set(guild_id, 'temp_voice', config)
+    
+    def track(self, guild_id: int, channel_id: int, owner_id: int):
+        """記錄臨時頻道及其擁有者"""
+        self.temp_channels[channel_id] = owner_id
+        owners = self.bot.data_store.get(guild_id, 'temp_voice_channels')
+        owners[str(channel_id)] = owner_id
+        self.bot.data_store.mark_dirty(guild_id, 'temp_voice_channels')
+    
+    def untrack(self, guild_id: int, channel_id: int):
+        """移除臨時頻道記錄並取消等待中的刪除"""
+        self.temp_channels.pop(channel_id, None)
+        job_id = self.cleanup_jobs.pop(channel_id, None)
+        if job_id:
+            self.bot.scheduler.cancel(job_id)
+        owners = self.bot.data_store.get(guild_id, 'temp_voice_channels')
+        if owners.pop(str(channel_id), None) is not None:
+            self.bot.data_store.mark_dirty(guild_id, 'temp_voice_channels')
+    
+    def schedule_cleanup(self, guild_id: int, channel_id: int):
+        """空頻道在 CLEANUP_DELAY 秒後刪除（已排程時不重複）"""
+        if channel_id not in self.cleanup_jobs:
+            self.cleanup_jobs[channel_id] = self.bot.scheduler.schedule(
+                'temp_voice_cleanup',
+                time.time() + CLEANUP_DELAY,
+                {'channel_id': channel_id},
+                guild_id=guild_id
+            )
+    
+    def get_pool(self, guild_id: int) -> list:
+        """獲取伺服器的預備頻道列表"""
+        pool = self.pools.get(guild_id)
+        if pool is None:
+            pool = self.pools[guild_id] = self.bot.data_store.get(guild_id, 'temp_voice_pool', list)
+        return pool
+    
+    def save_pool(self, guild_id: int):
+        self.bot.data_store.set(guild_id, 'temp_voice_pool', self.get_pool(guild_id))
+    
+    def pool_target(self, guild_id: int, max_size: int) -> int:
+        """依最近的加入頻率決定預備頻道數量（1 ~ max_size）"""
+        joins = self._recent_joins.get(guild_id)
+        recent = len(joins) if joins else 0
+        return min(max_size, 1 + recent // POOL_JOINS_PER_CHANNEL)
+    
+    def record_join(self, guild_id: int):
+        """記錄一次觸發頻道的加入"""
+        now = time.monotonic()
+        joins = self._recent_joins.setdefault(guild_id, deque())
+        joins.append(now)
+        while joins and joins[0] < now - POOL_RATE_WINDOW:
+            joins.popleft()
+    
+    def take_pool_channel(self, guild: discord.Guild):
+        """從預備池取出一個仍存在的頻道，沒有時回傳 None"""
+        pool = self.get_pool(guild.id)
+        while pool:
+            channel = guild.get_channel(pool.pop(0))
+            self.save_pool(guild.id)
+            if channel is not None:
+                return channel
+        return None
+    
+    def request_refill(self, guild: discord.Guild):
+        """在背景補充預備頻道（每個伺服器同時只有一個補充任務）"""
+        task = self._refill_tasks.get(guild.id)
+        if task is None or task.done():
+            self._refill_tasks[guild.id] = asyncio.create_task(self.refill_pool(guild))
+    
+    async def refill_pool(self, guild: discord.Guild):
+        """建立隱藏的預備頻道，直到達到目標數量"""
+        while True:
+            config = self.get_config(guild.id)
+            max_size = config.get('pool_size', 0)
+            pool = self.get_pool(guild.id)
+            if not config['enabled'] or max_size <= 0 or len(pool) >= self.pool_target(guild.id, max_size):
+                return
+            
+            category = guild.get_channel(config['category_id']) if config['category_id'] else None
+            overwrites = {
+                guild.default_role: discord.PermissionOverwrite(view_channel=False),
+                guild.me: discord.PermissionOverwrite(view_channel=True, connect=True, manage_channels=True, move_members=True)
+            }
+            try:
+                channel = await guild.create_voice_channel(
+                    name=POOL_CHANNEL_NAME,
+                    category=category,
+                    overwrites=overwrites,
+                    bitrate=config['default_bitrate'],
+                    user_limit=config['user_limit']
+                )
+            except Exception as e:
+                print(f'❌ 建立預備頻道失敗: {e}')
+                return
+            pool.append(channel.id)
+            self.save_pool(guild.id)
+            await asyncio.sleep(POOL_REFILL_DELAY)
+    
+    async def drain_pool(self, guild: discord.Guild):
+        """刪除所有預備頻道（停用系統或關閉預備池時）"""
+        task = self._refill_tasks.pop(guild.id, None)
+        if task is not None:
+            task.cancel()
+        pool = self.get_pool(guild.id)
+        channel_ids, pool[:] = list(pool), []
+        self.save_pool(guild.id)
+        for channel_id in channel_ids:
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                try:
+                    await channel.delete()
+                except Exception as e:
+                    print(f'❌ 刪除預備頻道失敗: {e}')
     
     voice_group = app_commands.Group(name="臨時語音", description="臨時語音頻道管理")
     
@@ -60,7 +200,7 @@ class TempVoice(commands.Cog):
     ):
         """設定臨時語音頻道系統"""
         guild_id = interaction.guild.id
-        config = self.load_config(guild_id)
+        config = self.get_config(guild_id)
         
         config['enabled'] = True
         config['trigger_channel_id'] = 觸發頻道.id
@@ -101,17 +241,18 @@ class TempVoice(commands.Cog):
     async def disable(self, interaction: discord.Interaction):
         """停用臨時語音頻道系統"""
         guild_id = interaction.guild.id
-        config = self.load_config(guild_id)
+        config = self.get_config(guild_id)
         config['enabled'] = False
         self.save_config(guild_id, config)
         
         await interaction.response.send_message("✅ 臨時語音系統已停用")
+        await self.drain_pool(interaction.guild)
     
     @voice_group.command(name="狀態", description="查看臨時語音系統狀態")
     async def status(self, interaction: discord.Interaction):
         """查看臨時語音系統狀態"""
         guild_id = interaction.guild.id
-        config = self.load_config(guild_id)
+        config = self.get_config(guild_id)
         
         embed = discord.Embed(
             title="🎤 臨時語音系統狀態",
@@ -152,8 +293,42 @@ class TempVoice(commands.Cog):
             inline=False
         )
         
+        if config.get('pool_size', 0) > 0:
+            stats = self.pool_stats.get(guild_id, {'hits': 0, 'misses': 0})
+            total = stats['hits'] + stats['misses']
+            hit_rate = f"{stats['hits'] / total * 100:.0f}%" if total else "-"
+            embed.add_field(
+                name="預備頻道池",
+                value=(
+                    f"預備中：{len(self.get_pool(guild_id))} 個（上限 {config['pool_size']}，"
+                    f"目前目標 {self.pool_target(guild_id, config['pool_size'])}）\n"
+                    f"命中：{stats['hits']} 次 | 未命中：{stats['misses']} 次 | 命中率：{hit_rate}"
+                ),
+                inline=False
+            )
+        
         await interaction.response.send_message(embed=embed)
     
+    @voice_group.command(name="預備池", description="設定預先建立的隱藏頻道數量上限，加快建立臨時頻道")
+    @app_commands.describe(數量="預備頻道上限（0 為停用，實際數量依加入頻率調整）")
+    @app_commands.checks.has_permissions(manage_channels=True)
+    async def pool(self, interaction: discord.Interaction, 數量: app_commands.Range[int, 0, 10]):
+        """設定預備頻道池"""
+        guild_id = interaction.guild.id
+        config = self.get_config(guild_id)
+        config['pool_size'] = 數量
+        self.save_config(guild_id, config)
+        
+        if 數量 == 0:
+            await interaction.response.send_message("✅ 已停用預備頻道池")
+            await self.drain_pool(interaction.guild)
+            return
+        
+        await interaction.response.send_message(
+            f"✅ 預備頻道池上限設為 {數量} 個，將依加入頻率在背景建立"
+        )
+        self.request_refill(interaction.guild)
+    
     @voice_group.command(name="限制人數", description="設定你的臨時頻道人數限制")
     @app_commands.describe(人數="最大人數（0為無限制）")
     async def limit(self, interaction: discord.Interaction, 人數: int):
@@ -226,8 +401,22 @@ class TempVoice(commands.Cog):
         after: discord.VoiceState
     ):
         """處理語音狀態變化"""
+        # 靜音、拒聽等狀態變化沒有換頻道，直接返回
+        if before.channel == after.channel:
+            return
+        
         guild_id = member.guild.id
-        config = self.load_config(guild_id)
+        
+        # 有人重新加入等待刪除的頻道 - 取消刪除
+        if after.channel and after.channel.id in self.cleanup_jobs:
+            self.bot.scheduler.cancel(self.cleanup_jobs.pop(after.channel.id))
+        
+        # 用戶離開頻道 - 如果臨時頻道沒有人了，排程1分鐘後刪除（系統停用後仍會清理）
+        if before.channel and before.channel.id in self.temp_channels:
+            if len(before.channel.members) == 0:
+                self.schedule_cleanup(guild_id, before.channel.id)
+        
+        config = self.get_config(guild_id)
         
         # 如果系統未啟用，直接返回
         if not config['enabled']:
@@ -243,16 +432,26 @@ class TempVoice(commands.Cog):
             # 創建頻道名稱
             channel_name = config['channel_name_format'].replace('{username}', member.display_name)
             
+            # 優先使用預備頻道：先移動用戶，再改名並公開，用戶等待的只有一次 API 請求
+            use_pool = config.get('pool_size', 0) > 0
+            temp_channel = self.take_pool_channel(member.guild) if use_pool else None
+            from_pool = temp_channel is not None
+            if use_pool:
+                self.record_join(guild_id)
+                stats = self.pool_stats.setdefault(guild_id, {'hits': 0, 'misses': 0})
+                stats['hits' if from_pool else 'misses'] += 1
+            
             # 創建臨時頻道
-            temp_channel = await member.guild.create_voice_channel(
-                name=channel_name,
-                category=category,
-                bitrate=config['default_bitrate'],
-                user_limit=config['user_limit']
-            )
+            if not from_pool:
+                temp_channel = await member.guild.create_voice_channel(
+                    name=channel_name,
+                    category=category,
+                    bitrate=config['default_bitrate'],
+                    user_limit=config['user_limit']
+                )
             
             # 記錄臨時頻道
-            self.temp_channels[temp_channel.id] = member.id
+            self.track(guild_id, temp_channel.id, member.id)
             
             # 移動用戶到新頻道
             try:
@@ -260,32 +459,85 @@ class TempVoice(commands.Cog):
             except:
                 # 如果移動失敗，刪除頻道
                 await temp_channel.delete()
-                del self.temp_channels[temp_channel.id]
-        
-        # 用戶離開頻道 - 檢查是否需要刪除臨時頻道
-        if before.channel and before.channel.id in self.temp_channels:
-            # 如果頻道沒有人了，等待1分鐘後刪除
-            if len(before.channel.members) == 0:
-                channel_id = before.channel.id
-                # 等待60秒
-                await asyncio.sleep(60)
-                
-                # 再次檢查頻道是否存在且仍然為空
-                channel = member.guild.get_channel(channel_id)
-                if channel and len(channel.members) == 0 and channel_id in self.temp_channels:
+                self.untrack(guild_id, temp_channel.id)
+            else:
+                if from_pool:
                     try:
-                        await channel.delete()
-                        del self.temp_channels[channel_id]
-                        print(f'🗑️ 已刪除空的臨時頻道: {channel.name}')
+                        if category is not None:
+                            await temp_channel.edit(name=channel_name, sync_permissions=True)
+                        else:
+                            await temp_channel.edit(name=channel_name, overwrites={})
                     except Exception as e:
-                        print(f'❌ 刪除臨時頻道失敗: {e}')
-                        # 如果刪除失敗，從追蹤列表中移除
-                        if channel_id in self.temp_channels:
-                            del self.temp_channels[channel_id]
+                        print(f'❌ 設定預備頻道失敗: {e}')
+            
+            if use_pool:
+                self.request_refill(member.guild)
+    
+    async def cleanup_channel(self, job):
+        """排程工作：刪除仍然為空的臨時頻道"""
+        channel_id = int(job['payload']['channel_id'])
+        guild_id = int(job['guild_id'])
+        self.cleanup_jobs.pop(channel_id, None)
+        
+        # 再次檢查頻道是否存在且仍然為空
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            self.untrack(guild_id, channel_id)
+            return
+        if len(channel.members) > 0:
+            return
+        
+        try:
+            await channel.delete()
+            print(f'🗑️ 已刪除空的臨時頻道: {channel.name}')
+        except Exception as e:
+            print(f'❌ 刪除臨時頻道失敗: {e}')
+        # 無論刪除是否成功，都從追蹤列表中移除
+        self.untrack(guild_id, channel_id)
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        """臨時頻道被手動刪除時移除記錄"""
+        if channel.id in self.temp_channels:
+            self.untrack(channel.guild.id, channel.id)
+        pool = self.pools.get(channel.guild.id)
+        if pool and channel.id in pool:
+            pool.remove(channel.id)
+            self.save_pool(channel.guild.id)
+    
+    def sweep(self):
+        """啟動時核對持久化的臨時頻道：已不存在的移除記錄，空的排程刪除"""
+        restored = removed = 0
+        for guild in self.bot.guilds:
+            owners = self.bot.data_store.get(guild.id, 'temp_voice_channels')
+            for channel_id, owner_id in list(owners.items()):
+                channel = guild.get_channel(int(channel_id))
+                if channel is None:
+                    self.untrack(guild.id, int(channel_id))
+                    removed += 1
+                    continue
+                self.temp_channels[channel.id] = owner_id
+                restored += 1
+                if len(channel.members) == 0:
+                    self.schedule_cleanup(guild.id, channel.id)
+            
+            # 預備頻道：移除已不存在的，再依設定補充
+            pool = self.get_pool(guild.id)
+            alive = [channel_id for channel_id in pool if guild.get_channel(channel_id) is not None]
+            if len(alive) != len(pool):
+                pool[:] = alive
+                self.save_pool(guild.id)
+            if self.get_config(guild.id).get('pool_size', 0) > 0:
+                self.request_refill(guild)
+        if restored or removed:
+            print(f'🎤 已恢復 {restored} 個臨時語音頻道，移除 {removed} 個已不存在的記錄')
     
     @commands.Cog.listener()
     async def on_ready(self):
         print(f'📦 {self.__class__.__name__} cog已載入')
+        if not self._swept:
+            self._swept = True
+            self.sweep()
 
 async def setup(bot):
     await bot.add_cog(TempVoice(bot))
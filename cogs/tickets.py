@@ -1,10 +1,32 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
 import os
+import gzip
 from datetime import datetime
 import asyncio
+from utils.fileio import atomic_write
+from utils.buffered_writer import BufferedAppendWriter
+from utils import transcripts
+
+# 聊天記錄緩衝寫入設定
+TRANSCRIPT_FLUSH_INTERVAL = 2  # 每隔多少秒寫入一次（秒）
+TRANSCRIPT_FLUSH_BYTES = 64 * 1024  # 單一客服單緩衝達到此大小時立即寫入
+
+
+def default_ticket_data():
+    """新伺服器的客服單設定"""
+    return {
+        'enabled': False,
+        'category_id': None,
+        'support_role_id': None,
+        'log_channel_id': None,
+        'panel_channel_id': None,
+        'panel_message_id': None,
+        'tickets': {},
+        'ticket_count': 0
+    }
+
 
 class Tickets(commands.Cog):
     """客服單系統"""
@@ -12,234 +34,159 @@ class Tickets(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.tickets = {}  # {guild_id: ticket_data}
-        
-    def get_data_path(self, guild_id):
-        """獲取數據文件路徑"""
-        return f'./data/{guild_id}/tickets.json'
+        self.open_channels = {}  # {channel_id: (guild_id, ticket_id)}，只包含開啟中的客服單
+        self.transcript_writer = BufferedAppendWriter(TRANSCRIPT_FLUSH_INTERVAL, TRANSCRIPT_FLUSH_BYTES)
+        self.transcript_targets = {}  # {(guild_id, ticket_id): (聊天記錄路徑, 是否為舊版 HTML)}
+        self.closing_transcripts = set()  # 已追加結尾記錄、等待寫入完成的 (guild_id, ticket_id)
+        self.bot.message_pipeline.register('tickets', self.process_message, documents=('tickets',))
+    
+    async def cog_load(self):
+        self.transcript_writer.start()
+    
+    async def cog_unload(self):
+        """停止訊息處理並寫入所有緩衝中的聊天記錄"""
+        self.bot.message_pipeline.unregister('tickets')
+        await self.transcript_writer.close()
     
     def load_data(self, guild_id):
         """載入客服單數據"""
-        path = self.get_data_path(guild_id)
-        if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {
-            'enabled': False,
-            'category_id': None,
-            'support_role_id': None,
-            'log_channel_id': None,
-            'panel_channel_id': None,
-            'panel_message_id': None,
-            'tickets': {},
-            'ticket_count': 0
-        }
+        return self.bot.data_store.get(guild_id, 'tickets', default_ticket_data)
     
     def save_data(self, guild_id, data):
         """保存客服單數據"""
-        path = self.get_data_path(guild_id)
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        self.bot.data_store.set(guild_id, 'tickets', data)
+    
+    def index_guild(self, guild_id, data):
+        """重建伺服器開啟中客服單的頻道索引"""
+        guild_id = str(guild_id)
+        for channel_id in [cid for cid, (gid, _) in self.open_channels.items() if gid == guild_id]:
+            del self.open_channels[channel_id]
+        for ticket_id, ticket in data.get('tickets', {}).items():
+            if ticket.get('status') == 'open' and ticket.get('channel_id'):
+                self.open_channels[str(ticket['channel_id'])] = (guild_id, ticket_id)
+    
+    def get_open_ticket(self, channel_id):
+        """根據頻道獲取開啟中的客服單，回傳 (guild_id, ticket_id) 或 None"""
+        return self.open_channels.get(str(channel_id))
+    
+    def load_user_index(self):
+        """載入用戶客服單索引 {user_id: [[guild_id, ticket_id], ...]}（全域文件，依創建順序）"""
+        return self.bot.data_store.get(None, 'ticket_user_index')
+    
+    async def migrate_user_index(self):
+        """用戶索引不存在時（舊版數據），從所有伺服器的客服單數據建立一次
+
+        包含機器人已離開的伺服器；之後只由 add_user_ticket 增量更新。
+        """
+        store = self.bot.data_store
+        if store.exists(None, 'ticket_user_index'):
+            return
+        entries = []
+        for guild_id in store.list_guilds():
+            if not store.exists(guild_id, 'tickets'):
+                continue
+            data = await store.load(guild_id, 'tickets')
+            for ticket_id, ticket in data.get('tickets', {}).items():
+                entries.append((ticket.get('created_at') or '', guild_id, ticket_id, str(ticket['user_id'])))
+        # 依創建時間排序，與之後增量加入的順序一致
+        index = {}
+        for _, guild_id, ticket_id, user_id in sorted(entries):
+            index.setdefault(user_id, []).append([guild_id, ticket_id])
+        store.set(None, 'ticket_user_index', index)
+        print(f'    - 已建立用戶客服單索引（{len(entries)} 個客服單）')
+    
+    def add_user_ticket(self, user_id, guild_id, ticket_id):
+        """將新客服單加入用戶索引"""
+        index = self.load_user_index()
+        index.setdefault(str(user_id), []).append([str(guild_id), ticket_id])
+        self.bot.data_store.mark_dirty(None, 'ticket_user_index')
+    
+    def get_user_tickets(self, user_id):
+        """獲取用戶所有客服單 [(guild_id, ticket_id)]（依創建順序）"""
+        return [tuple(entry) for entry in self.load_user_index().get(str(user_id), [])]
     
     def get_transcript_path(self, guild_id, ticket_id, channel_name):
-        """獲取聊天記錄HTML文件路徑"""
-        return f'./data/{guild_id}/ticket/{channel_name}-{ticket_id}.html'
+        """獲取聊天記錄文件路徑（壓縮的 NDJSON）"""
+        return transcripts.transcript_path(guild_id, ticket_id, channel_name)
     
-    def init_transcript(self, guild_id, ticket_id, channel_name, user):
-        """初始化聊天記錄HTML文件"""
+    def get_transcript_target(self, guild_id, ticket_id, channel_name):
+        """獲取聊天記錄的寫入目標 (路徑, 是否為舊版 HTML)，沒有聊天記錄時回傳 None
+        
+        新版改用 NDJSON 之前開啟的客服單繼續追加到原本的 HTML 文件，直到關閉。
+        """
+        key = (str(guild_id), ticket_id)
+        target = self.transcript_targets.get(key)
+        if target is None:
+            path = transcripts.transcript_path(guild_id, ticket_id, channel_name)
+            legacy = transcripts.legacy_transcript_path(guild_id, ticket_id, channel_name)
+            if os.path.exists(path):
+                target = (path, False)
+            elif os.path.exists(legacy):
+                target = (legacy, True)
+            else:
+                return None
+            self.transcript_targets[key] = target
+        return target
+    
+    async def init_transcript(self, guild_id, ticket_id, channel_name, user):
+        """初始化聊天記錄文件（在聊天記錄的寫入執行緒中建立，之後追加的消息排在檔頭之後）"""
         path = self.get_transcript_path(guild_id, ticket_id, channel_name)
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        
-        html_header = f'''<!DOCTYPE html>
-<html lang="zh-TW">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>客服單 #{ticket_id} - {channel_name}</title>
-    <style>
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-        body {{
-            font-family: 'Segoe UI', 'Microsoft JhengHei', sans-serif;
-            background: #36393f;
-            color: #dcddde;
-            padding: 20px;
-        }}
-        .container {{
-            max-width: 1200px;
-            margin: 0 auto;
-            background: #2f3136;
-            border-radius: 8px;
-            padding: 20px;
-        }}
-        .header {{
-            border-bottom: 2px solid #202225;
-            padding-bottom: 15px;
-            margin-bottom: 20px;
-        }}
-        .header h1 {{
-            color: #ffffff;
-            font-size: 24px;
-            margin-bottom: 5px;
-        }}
-        .header .info {{
-            color: #b9bbbe;
-            font-size: 14px;
-        }}
-        .message {{
-            display: flex;
-            padding: 10px 0;
-            border-bottom: 1px solid #2d2d2d;
-        }}
-        .message:hover {{
-            background: #32353b;
-        }}
-        .avatar {{
-            width: 40px;
-            height: 40px;
-            border-radius: 50%;
-            margin-right: 15px;
-            flex-shrink: 0;
-        }}
-        .message-content {{
-            flex: 1;
-        }}
-        .message-header {{
-            display: flex;
-            align-items: baseline;
-            margin-bottom: 5px;
-        }}
-        .username {{
-            font-weight: 600;
-            color: #ffffff;
-            margin-right: 8px;
-        }}
-        .timestamp {{
-            font-size: 12px;
-            color: #72767d;
-        }}
-        .text {{
-            color: #dcddde;
-            line-height: 1.5;
-            word-wrap: break-word;
-        }}
-        .embed {{
-            background: #2f3136;
-            border-left: 4px solid #5865f2;
-            padding: 10px;
-            margin-top: 5px;
-            border-radius: 4px;
-        }}
-        .attachment {{
-            margin-top: 5px;
-            max-width: 400px;
-        }}
-        .attachment img {{
-            max-width: 100%;
-            border-radius: 4px;
-        }}
-        .system-message {{
-            background: #2d2d2d;
-            padding: 8px 12px;
-            border-left: 4px solid #faa61a;
-            margin: 10px 0;
-            border-radius: 4px;
-            font-size: 14px;
-            color: #b9bbbe;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🎫 客服單 #{ticket_id}</h1>
-            <div class="info">
-                <strong>頻道名稱：</strong>{channel_name}<br>
-                <strong>創建者：</strong>{user.name}#{user.discriminator}<br>
-                <strong>創建時間：</strong>{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-            </div>
-        </div>
-        <div class="messages">
-'''
-        
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(html_header)
+        header = transcripts.encode_record(transcripts.header_record(ticket_id, channel_name, user))
+        key = (str(guild_id), ticket_id)
+        self.transcript_targets[key] = (path, False)
+        try:
+            await self.transcript_writer.run(atomic_write, path, gzip.compress(header.encode('utf-8')))
+        except Exception as e:
+            self.transcript_targets.pop(key, None)
+            print(f"❌ 建立客服單 #{ticket_id} 的聊天記錄失敗: {e}")
     
     def append_to_transcript(self, guild_id, ticket_id, channel_name, message):
         """追加消息到聊天記錄"""
-        path = self.get_transcript_path(guild_id, ticket_id, channel_name)
-        
-        if not os.path.exists(path):
+        if (str(guild_id), ticket_id) in self.closing_transcripts:
             return
-        
-        # 獲取用戶頭像
-        avatar_url = message.author.display_avatar.url if message.author.display_avatar else "https://cdn.discordapp.com/embed/avatars/0.png"
-        
-        # 格式化時間
-        timestamp = message.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        
-        # 處理消息內容
-        content = message.content.replace('<', '&lt;').replace('>', '&gt;')
-        
-        message_html = f'''
-            <div class="message">
-                <img src="{avatar_url}" alt="Avatar" class="avatar">
-                <div class="message-content">
-                    <div class="message-header">
-                        <span class="username">{message.author.name}</span>
-                        <span class="timestamp">{timestamp}</span>
-                    </div>
-'''
-        
-        if content:
-            message_html += f'                    <div class="text">{content}</div>\n'
-        
-        # 處理附件
-        for attachment in message.attachments:
-            if attachment.content_type and attachment.content_type.startswith('image/'):
-                message_html += f'                    <div class="attachment"><img src="{attachment.url}" alt="附件"></div>\n'
-            else:
-                message_html += f'                    <div class="attachment"><a href="{attachment.url}">{attachment.filename}</a></div>\n'
-        
-        # 處理嵌入
-        for embed in message.embeds:
-            message_html += '                    <div class="embed">\n'
-            if embed.title:
-                message_html += f'                        <strong>{embed.title}</strong><br>\n'
-            if embed.description:
-                message_html += f'                        {embed.description}<br>\n'
-            message_html += '                    </div>\n'
-        
-        message_html += '''
-                </div>
-            </div>
-'''
-        
-        with open(path, 'a', encoding='utf-8') as f:
-            f.write(message_html)
-    
-    def finalize_transcript(self, guild_id, ticket_id, channel_name):
-        """完成聊天記錄HTML文件"""
-        path = self.get_transcript_path(guild_id, ticket_id, channel_name)
-        
-        if not os.path.exists(path):
+        target = self.get_transcript_target(guild_id, ticket_id, channel_name)
+        if target is None:
             return
         
-        html_footer = f'''
-        </div>
-        <div class="system-message">
-            ✅ 客服單已於 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 關閉
-        </div>
-    </div>
-</body>
-</html>
-'''
+        path, legacy = target
+        record = transcripts.message_record(message)
+        if legacy:
+            self.transcript_writer.append(path, transcripts.render_message(record))
+        else:
+            self.transcript_writer.append(path, transcripts.encode_record(record))
+    
+    async def flush_transcript(self, guild_id, ticket_id, channel_name):
+        """把緩衝中的消息寫入聊天記錄（網頁後台讀取開啟中的客服單前呼叫）"""
+        target = self.get_transcript_target(guild_id, ticket_id, channel_name)
+        if target is not None:
+            await self.transcript_writer.flush(target[0])
+    
+    async def finalize_transcript(self, guild_id, ticket_id, channel_name):
+        """完成聊天記錄（寫入失敗時拋出錯誤，內容保留在緩衝中，可再次呼叫重試）"""
+        target = self.get_transcript_target(guild_id, ticket_id, channel_name)
+        if target is None:
+            return
         
-        with open(path, 'a', encoding='utf-8') as f:
-            f.write(html_footer)
+        key = (str(guild_id), ticket_id)
+        path, legacy = target
+        # 重試時結尾記錄已在緩衝中，不重複追加；之後的消息也不再寫入
+        if key not in self.closing_transcripts:
+            record = transcripts.closed_record()
+            if legacy:
+                self.transcript_writer.append(path, transcripts.render_footer(record))
+            else:
+                self.transcript_writer.append(path, transcripts.encode_record(record))
+            self.closing_transcripts.add(key)
+        await self.transcript_writer.flush(path)
+        self.closing_transcripts.discard(key)
+        self.transcript_targets.pop(key, None)
+        
+        if not legacy:
+            # 聊天記錄已完整寫入，重新壓縮失敗只影響文件大小
+            try:
+                await self.transcript_writer.compact(path)
+            except Exception as e:
+                print(f"⚠️  重新壓縮聊天記錄失敗 {path}: {e}")
     
     # 客服單群組
     ticket_group = app_commands.Group(name="客服單", description="客服單系統管理")
@@ -346,17 +293,8 @@ class Tickets(commands.Cog):
     @app_commands.describe(用戶="要添加的用戶")
     async def add_user(self, interaction: discord.Interaction, 用戶: discord.Member):
         """添加用戶到客服單"""
-        guild_id = str(interaction.guild.id)
-        data = self.tickets.get(guild_id, self.load_data(guild_id))
-        
         # 檢查是否在客服單頻道中
-        ticket_id = None
-        for tid, ticket in data['tickets'].items():
-            if str(ticket.get('channel_id')) == str(interaction.channel.id):
-                ticket_id = tid
-                break
-        
-        if not ticket_id:
+        if not self.get_open_ticket(interaction.channel.id):
             await interaction.response.send_message("❌ 這不是一個客服單頻道", ephemeral=True)
             return
         
@@ -368,17 +306,8 @@ class Tickets(commands.Cog):
     @app_commands.describe(用戶="要移除的用戶")
     async def remove_user(self, interaction: discord.Interaction, 用戶: discord.Member):
         """從客服單移除用戶"""
-        guild_id = str(interaction.guild.id)
-        data = self.tickets.get(guild_id, self.load_data(guild_id))
-        
         # 檢查是否在客服單頻道中
-        ticket_id = None
-        for tid, ticket in data['tickets'].items():
-            if str(ticket.get('channel_id')) == str(interaction.channel.id):
-                ticket_id = tid
-                break
-        
-        if not ticket_id:
+        if not self.get_open_ticket(interaction.channel.id):
             await interaction.response.send_message("❌ 這不是一個客服單頻道", ephemeral=True)
             return
         
@@ -429,8 +358,9 @@ class Tickets(commands.Cog):
             return
         
         # 檢查用戶是否已有開啟的客服單
-        for ticket in data['tickets'].values():
-            if ticket['user_id'] == str(interaction.user.id) and ticket['status'] == 'open':
+        for ticket_guild_id, ticket_id in self.get_user_tickets(interaction.user.id):
+            ticket = data['tickets'].get(ticket_id) if ticket_guild_id == guild_id else None
+            if ticket and ticket['status'] == 'open':
                 channel = interaction.guild.get_channel(int(ticket['channel_id']))
                 if channel:
                     await interaction.response.send_message(
@@ -485,9 +415,11 @@ class Tickets(commands.Cog):
         
         self.tickets[guild_id] = data
         self.save_data(guild_id, data)
+        self.open_channels[str(channel.id)] = (guild_id, ticket_id)
+        self.add_user_ticket(interaction.user.id, guild_id, ticket_id)
         
-        # 初始化聊天記錄HTML
-        self.init_transcript(guild_id, ticket_id, f"客服單-{ticket_id}", interaction.user)
+        # 初始化聊天記錄
+        await self.init_transcript(guild_id, ticket_id, f"客服單-{ticket_id}", interaction.user)
         
         # 發送歡迎訊息（帶關閉按鈕）
         embed = discord.Embed(
@@ -535,7 +467,9 @@ class Tickets(commands.Cog):
         for guild in self.bot.guilds:
             guild_id = str(guild.id)
             self.tickets[guild_id] = self.load_data(guild_id)
-        print(f'    - 已載入 {len(self.tickets)} 個伺服器的客服單數據')
+            self.index_guild(guild_id, self.tickets[guild_id])
+        await self.migrate_user_index()
+        print(f'    - 已載入 {len(self.tickets)} 個伺服器的客服單數據（{len(self.open_channels)} 個開啟中）')
         
         # 重新註冊持久化視圖
         self.bot.add_view(TicketPanelView(self))
@@ -548,31 +482,28 @@ class Tickets(commands.Cog):
                         close_view = CloseTicketView(self, ticket_id, ticket['user_id'])
                         self.bot.add_view(close_view)
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """監聽消息並保存到聊天記錄"""
-        # 忽略機器人消息和非公會消息
-        if message.author.bot or not message.guild:
-            return
-        
-        guild_id = str(message.guild.id)
-        channel_id = str(message.channel.id)
+    async def process_message(self, ctx):
+        """訊息管線階段：保存客服單頻道中的消息到聊天記錄"""
+        message = ctx.message
+        guild_id = ctx.guild_id
+        channel_id = ctx.channel_id
         
         # 檢查是否在客服單頻道中
-        data = self.tickets.get(guild_id)
-        if not data:
+        entry = self.open_channels.get(channel_id)
+        if not entry or entry[0] != guild_id:
             return
         
-        for ticket_id, ticket in data['tickets'].items():
-            if ticket['channel_id'] == channel_id and ticket['status'] == 'open':
-                # 保存消息到HTML
-                self.append_to_transcript(
-                    guild_id,
-                    ticket_id,
-                    ticket.get('channel_name', f"客服單-{ticket_id}"),
-                    message
-                )
-                break
+        ticket_id = entry[1]
+        ticket = ctx.config('tickets', default_ticket_data)['tickets'].get(ticket_id)
+        if not ticket:
+            return
+        # 保存消息到聊天記錄
+        self.append_to_transcript(
+            guild_id,
+            ticket_id,
+            ticket.get('channel_name', f"客服單-{ticket_id}"),
+            message
+        )
 
 class CloseReasonModal(discord.ui.Modal, title='關閉客服單'):
     """關閉原因輸入框"""
@@ -600,8 +531,19 @@ class CloseReasonModal(discord.ui.Modal, title='關閉客服單'):
         
         ticket = data['tickets'][self.ticket_id]
         
+        # 寫入聊天記錄需要時間，先回應互動避免逾時
+        await interaction.response.defer()
+        
         # 完成聊天記錄
-        self.cog.finalize_transcript(guild_id, self.ticket_id, ticket.get('channel_name', f"客服單-{self.ticket_id}"))
+        try:
+            await self.cog.finalize_transcript(guild_id, self.ticket_id, ticket.get('channel_name', f"客服單-{self.ticket_id}"))
+        except Exception as e:
+            print(f"❌ 完成客服單 #{self.ticket_id} 的聊天記錄失敗: {e}")
+            await interaction.followup.send("❌ 保存聊天記錄失敗，客服單未關閉，請稍後再試", ephemeral=True)
+            return
+        
+        # 聊天記錄完成後才移出頻道索引，之後的消息不再寫入
+        self.cog.open_channels.pop(str(ticket.get('channel_id')), None)
         
         # 更新客服單狀態
         ticket['status'] = 'closed'
@@ -622,7 +564,7 @@ class CloseReasonModal(discord.ui.Modal, title='關閉客服單'):
         embed.add_field(name="關閉者", value=interaction.user.mention)
         embed.add_field(name="原因", value=str(self.reason.value))
         
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
         
         # 記錄到日誌頻道
         if data['log_channel_id']:
@@ -6,6 +6,7 @@ import os
 import sys
 import hashlib
 from datetime import datetime
+from utils.fileio import atomic_write
 
 class Updater(commands.Cog):
     """自動更新檢查系統"""
@@ -133,12 +134,8 @@ class Updater(commands.Cog):
                     if resp.status == 200:
                         content = await resp.read()
                         
-                        # 確保目錄存在
-                        os.makedirs(os.path.dirname(filepath) if os.path.dirname(filepath) else '.', exist_ok=True)
-                        
-                        # 寫入文件
-                        with open(filepath, 'wb') as f:
-                            f.write(content)
+                        # 原子寫入文件，避免重啟時留下寫到一半的程式碼
+                        atomic_write(filepath, content)
                         
                         return True
                     else:
@@ -202,8 +199,7 @@ class Updater(commands.Cog):
         
         # 更新本地版本號
         try:
-            with open('./version.txt', 'w', encoding='utf-8') as f:
-                f.write(f"versions = {remote_version}")
+            atomic_write('./version.txt', f"versions = {remote_version}")
             print(f"\n   🎊 更新完成！版本已升級至 {remote_version}")
             print("   🔄 正在自動重啟機器人以應用更新...")
             print("─" * 62)
@@ -211,6 +207,9 @@ class Updater(commands.Cog):
             # 等待一小段時間讓訊息顯示
             await asyncio.sleep(2)
             
+            # 關閉機器人（停止排程、網頁伺服器並寫入所有待保存的數據）後重啟
+            await self.bot.close()
+
             # 自動重啟機器人 (支援 Linux/Windows)
             os.execv(sys.executable, [sys.executable] + sys.argv)
         except Exception as e:
@@ -2,15 +2,50 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import urllib.parse
-from datetime import datetime, timedelta
-import re
-import asyncio
+from datetime import datetime, timedelta, timezone
+from utils.calculator import Calculator
+
+# 可由用戶自行查看/取消的排程工作類型
+USER_JOB_KINDS = {
+    'reminder': '🔔 提醒',
+    'countdown': '⏰ 倒數計時',
+    'scheduled_message': '📢 定時消息',
+}
 
 class Utilities(commands.Cog):
     """實用工具指令"""
     
     def __init__(self, bot):
         self.bot = bot
+        # 計算器（語法樹檢查，含次方的運算在背景進程執行並限時）
+        self.calculator_engine = Calculator()
+        # 延遲工作交給排程服務（持久化，重啟後繼續）
+        self.bot.scheduler.register('reminder', self.run_reminder)
+        self.bot.scheduler.register('countdown', self.run_countdown)
+        self.bot.scheduler.register('scheduled_message', self.run_scheduled_message)
+    
+    async def cog_load(self):
+        # 預先在執行緒中啟動計算器的背景進程，第一次 /計算 不必等待
+        await self.calculator_engine.start()
+    
+    async def cog_unload(self):
+        for kind in USER_JOB_KINDS:
+            self.bot.scheduler.unregister(kind)
+        await self.calculator_engine.close()
+    
+    async def get_user(self, user_id):
+        """從快取獲取用戶，不存在時才請求 API"""
+        user = self.bot.get_user(int(user_id))
+        if user is None:
+            user = await self.bot.fetch_user(int(user_id))
+        return user
+    
+    async def get_channel(self, channel_id):
+        """從快取獲取頻道，不存在時才請求 API"""
+        channel = self.bot.get_channel(int(channel_id))
+        if channel is None:
+            channel = await self.bot.fetch_channel(int(channel_id))
+        return channel
     
     # 創建指令组
     util_group = app_commands.Group(name="工具", description="實用工具")
@@ -36,17 +71,14 @@ class Utilities(commands.Cog):
         await interaction.response.send_message(embed=embed)
     
     @util_group.command(name="計算器", description="簡單計算器")
-    @app_commands.describe(expression="数学表達式，例如: 2+2 或 10*5")
+    @app_commands.describe(expression="数学表達式，例如: 2+2、10*5 或 2**10")
     async def calculator(self, interaction: discord.Interaction, expression: str):
         """計算数学表達式"""
         try:
-            # 只允許安全的字符
-            if not re.match(r'^[0-9+\-*/().\s]+$', expression):
-                await interaction.response.send_message("❌ 表達式包含非法字符！只允許數字和運算符", ephemeral=True)
-                return
-            
-            # 計算結果
-            result = eval(expression)
+            # 解析為語法樹計算，不使用 eval
+            result = str(await self.calculator_engine.calculate(expression))
+            if len(result) > 1000:
+                result = f"{result[:1000]}…（共 {len(result)} 位）"
             
             embed = discord.Embed(
                 title="🧮 計算器",
@@ -83,6 +115,27 @@ class Utilities(commands.Cog):
         embed.timestamp = end_time
         
         await interaction.response.send_message(embed=embed)
+        
+        # 結束時在頻道通知
+        self.bot.scheduler.schedule(
+            'countdown',
+            end_time.replace(tzinfo=timezone.utc).timestamp(),
+            {'channel_id': interaction.channel_id, 'reason': reason, 'minutes': minutes},
+            user_id=interaction.user.id,
+            guild_id=interaction.guild_id
+        )
+    
+    async def run_countdown(self, job):
+        """排程工作：倒數計時結束"""
+        payload = job['payload']
+        channel = await self.get_channel(payload['channel_id'])
+        embed = discord.Embed(
+            title="⏰ 倒數計時結束",
+            description=f"**{payload['reason']}**",
+            color=discord.Color.orange()
+        )
+        embed.set_footer(text=f"{payload['minutes']} 分鐘的倒數計時已結束")
+        await channel.send(f"<@{job['user_id']}>", embed=embed)
     
     @util_group.command(name="提醒我", description="設定一個提醒")
     @app_commands.describe(
@@ -95,7 +148,15 @@ class Utilities(commands.Cog):
             await interaction.response.send_message("❌ 時間必須在1-1440分鐘之間（最多24小時）", ephemeral=True)
             return
         
-        remind_time = datetime.utcnow() + timedelta(minutes=duration)
+        remind_time = datetime.now(timezone.utc) + timedelta(minutes=duration)
+        
+        job_id = self.bot.scheduler.schedule(
+            'reminder',
+            remind_time.timestamp(),
+            {'channel_id': interaction.channel_id, 'message': message, 'duration': duration},
+            user_id=interaction.user.id,
+            guild_id=interaction.guild_id
+        )
         
         embed = discord.Embed(
             title="⏰ 提醒已設定",
@@ -103,25 +164,72 @@ class Utilities(commands.Cog):
             color=discord.Color.green()
         )
         embed.add_field(name="提醒内容", value=message, inline=False)
+        embed.set_footer(text=f"提醒編號: {job_id}（可用 /工具 取消排程 取消）")
         
         await interaction.response.send_message(embed=embed, ephemeral=True)
-        
-        # 等待指定時間
-        await discord.utils.sleep_until(remind_time)
-        
-        # 發送提醒
+    
+    async def run_reminder(self, job):
+        """排程工作：發送提醒"""
+        payload = job['payload']
         remind_embed = discord.Embed(
             title="🔔 提醒",
-            description=message,
+            description=payload['message'],
             color=discord.Color.gold()
         )
-        remind_embed.set_footer(text=f"你在 {duration} 分鐘前設定了这個提醒")
+        remind_embed.set_footer(text=f"你在 {payload['duration']} 分鐘前設定了这個提醒")
         
         try:
-            await interaction.user.send(embed=remind_embed)
+            user = await self.get_user(job['user_id'])
+            await user.send(embed=remind_embed)
         except:
             # 如果无法私信，就在頻道提醒
-            await interaction.channel.send(f"{interaction.user.mention}", embed=remind_embed)
+            channel = await self.get_channel(payload['channel_id'])
+            await channel.send(f"<@{job['user_id']}>", embed=remind_embed)
+    
+    @util_group.command(name="我的排程", description="查看你設定的提醒、倒數計時與定時消息")
+    async def list_jobs(self, interaction: discord.Interaction):
+        """列出用戶的排程工作"""
+        jobs = [
+            job for job in self.bot.scheduler.jobs(user_id=interaction.user.id)
+            if job['kind'] in USER_JOB_KINDS
+        ]
+        
+        if not jobs:
+            await interaction.response.send_message("📭 你目前沒有待執行的排程", ephemeral=True)
+            return
+        
+        embed = discord.Embed(
+            title="🗓️ 我的排程",
+            color=discord.Color.blue()
+        )
+        for job in jobs[:25]:
+            payload = job['payload']
+            text = payload.get('message') or payload.get('reason') or ''
+            embed.add_field(
+                name=f"{USER_JOB_KINDS[job['kind']]} · `{job['id']}`",
+                value=f"<t:{int(job['run_at'])}:R>\n{text[:100]}",
+                inline=False
+            )
+        if len(jobs) > 25:
+            embed.set_footer(text=f"僅顯示最近的 25 項，共 {len(jobs)} 項")
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
+    @util_group.command(name="取消排程", description="取消你設定的提醒、倒數計時或定時消息")
+    @app_commands.describe(job_id="排程編號（可用 /工具 我的排程 查看）")
+    async def cancel_job(self, interaction: discord.Interaction, job_id: str):
+        """取消用戶的排程工作"""
+        job = self.bot.scheduler.get(job_id.strip())
+        if (job is None or job['kind'] not in USER_JOB_KINDS
+                or job['user_id'] != str(interaction.user.id)):
+            await interaction.response.send_message("❌ 找不到該排程", ephemeral=True)
+            return
+        
+        self.bot.scheduler.cancel(job['id'])
+        await interaction.response.send_message(
+            f"✅ 已取消{USER_JOB_KINDS[job['kind']]} `{job['id']}`",
+            ephemeral=True
+        )
     
     @util_group.command(name="縮短文字", description="縮短长文字")
     @app_commands.describe(
@@ -248,22 +356,21 @@ class Utilities(commands.Cog):
                 value=f"`{message[:100]}{'...' if len(message) > 100 else ''}`",
                 inline=False
             )
-            success_embed.set_footer(text=f"設定者: {interaction.user.name}")
-            
-            await interaction.followup.send(embed=success_embed, ephemeral=True)
-            
-            # 等待到指定時間
-            await asyncio.sleep(time_diff.total_seconds())
-            
-            # 發送訊息
-            send_embed = discord.Embed(
-                description=message,
-                color=discord.Color.blue(),
-                timestamp=datetime.utcnow()
+            # 交給排程服務，重啟後仍會發送
+            job_id = self.bot.scheduler.schedule(
+                'scheduled_message',
+                (now_utc + time_diff).replace(tzinfo=timezone.utc).timestamp(),
+                {
+                    'channel_id': target_channel.id,
+                    'message': message,
+                    'author_name': interaction.user.name
+                },
+                user_id=interaction.user.id,
+                guild_id=interaction.guild_id
             )
-            send_embed.set_footer(text=f"由 {interaction.user.name} 排程發送")
+            success_embed.set_footer(text=f"設定者: {interaction.user.name} | 排程編號: {job_id}")
             
-            await target_channel.send(embed=send_embed)
+            await interaction.followup.send(embed=success_embed, ephemeral=True)
             
         except ValueError:
             await interaction.followup.send(
@@ -273,19 +380,37 @@ class Utilities(commands.Cog):
                 f"🕐 時區: UTC+8",
                 ephemeral=True
             )
+    
+    async def run_scheduled_message(self, job):
+        """排程工作：發送定時消息"""
+        payload = job['payload']
+        try:
+            target_channel = await self.get_channel(payload['channel_id'])
+            
+            send_embed = discord.Embed(
+                description=payload['message'],
+                color=discord.Color.blue(),
+                timestamp=datetime.utcnow()
+            )
+            send_embed.set_footer(text=f"由 {payload['author_name']} 排程發送")
+            
+            await target_channel.send(embed=send_embed)
+            
         except discord.Forbidden:
             try:
-                await interaction.user.send(
-                    f"❌ 定時消息發送失敗：我沒有在 {target_channel.mention} 頻道發送訊息的權限。"
+                user = await self.get_user(job['user_id'])
+                await user.send(
+                    f"❌ 定時消息發送失敗：我沒有在 <#{payload['channel_id']}> 頻道發送訊息的權限。"
                 )
             except:
                 pass
         except Exception as e:
             print(f"定時消息錯誤: {e}")
             try:
-                await interaction.user.send(
+                user = await self.get_user(job['user_id'])
+                await user.send(
                     f"❌ 定時消息執行失敗：{str(e)}\n"
-                    f"可能原因：機器人重啟、頻道被刪除或權限變更。"
+                    f"可能原因：頻道被刪除或權限變更。"
                 )
             except:
                 pass
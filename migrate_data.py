@@ -0,0 +1,38 @@
+"""
+數據遷移工具
+將 ./data 目錄中的 JSON 文件一次性匯入 SQLite 數據庫（DATA_BACKEND=sqlite 時使用）
+"""
+
+import argparse
+import os
+from dotenv import load_dotenv
+
+from utils.storage import migrate_json_to_sqlite
+
+# 加載環境變數
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='將 JSON 數據文件匯入 SQLite 數據庫')
+    parser.add_argument('--data-dir', default='data', help='JSON 數據目錄（預設: data）')
+    parser.add_argument('--db', default=os.getenv('DATA_SQLITE_PATH', 'data/bot.db'), help='SQLite 數據庫路徑')
+    parser.add_argument('--overwrite', action='store_true', help='覆蓋數據庫中已存在的記錄')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.data_dir):
+        print(f"❌ 找不到數據目錄: {args.data_dir}")
+        return
+
+    print(f"📦 正在將 {args.data_dir} 匯入 {args.db} ...")
+    imported, skipped, failed = migrate_json_to_sqlite(args.data_dir, args.db, overwrite=args.overwrite)
+
+    print(f"✅ 已匯入 {imported} 個文件")
+    if skipped:
+        print(f"⏭️  略過 {skipped} 個已存在的文件（使用 --overwrite 覆蓋）")
+    for path, error in failed:
+        print(f"❌ 匯入失敗 {path}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+测试脚本：验证网页后台的 Discord 伺服器列表快取
+使用本地 aiohttp 伺服器模拟 Discord API，检查连线池、TTL 快取与并发请求合并
+"""
+import asyncio
+import os
+import sys
+sys.path.insert(0, '.')
+
+from aiohttp import web
+
+from web.server import WebServer
+
+GUILD_ID = '111111111111111111'
+
+
+class DummyGuild:
+    def __init__(self, guild_id):
+        self.id = int(guild_id)
+
+
+class DummyBot:
+    """模拟机器人对象"""
+    guilds = [DummyGuild(GUILD_ID)]
+
+    def get_guild(self, guild_id):
+        return next((g for g in self.guilds if g.id == guild_id), None)
+
+
+class DiscordStub:
+    """模拟 Discord 的 /users/@me/guilds"""
+
+    def __init__(self):
+        self.calls = 0
+        self.status = 200
+        self.app = web.Application()
+        self.app.router.add_get('/api/users/@me/guilds', self.user_guilds)
+
+    async def user_guilds(self, request):
+        self.calls += 1
+        await asyncio.sleep(0.05)  # 模拟网络延迟，让并发请求重叠
+        if self.status != 200:
+            return web.json_response({'message': 'rate limited'}, status=self.status)
+        token = request.headers.get('Authorization', '')
+        permissions = 0x8 if token.endswith('admin') else 0
+        return web.json_response([{'id': GUILD_ID, 'name': 'Test', 'permissions': str(permissions)}])
+
+
+def check(name, condition):
+    print(f"{'✅' if condition else '❌'} {name}")
+    return condition
+
+
+async def main():
+    stub = DiscordStub()
+    runner = web.AppRunner(stub.app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    os.environ['DISCORD_API_BASE'] = f'http://127.0.0.1:{port}/api'
+    os.environ['WEB_GUILDS_CACHE_TTL'] = '0.5'
+    server = WebServer(DummyBot(), port=8080)
+
+    results = []
+    try:
+        # 并发的相同请求只应向 Discord 发出一次
+        allowed = await asyncio.gather(*[
+            server.check_guild_permission('1', GUILD_ID, 'token-admin') for _ in range(20)
+        ])
+        results.append(check('20 个并发权限检查全部通过', all(allowed)))
+        results.append(check('并发请求只调用 Discord 一次', stub.calls == 1))
+
+        # TTL 内直接使用快取
+        await server.check_guild_permission('1', GUILD_ID, 'token-admin')
+        await server.get_user_guilds('token-admin')
+        results.append(check('TTL 内不再调用 Discord', stub.calls == 1))
+
+        # 不同 token 分开快取
+        denied = await server.check_guild_permission('2', GUILD_ID, 'token-member')
+        results.append(check('无管理权限的用户被拒绝', denied is False))
+        results.append(check('不同 token 各自请求', stub.calls == 2))
+
+        # 过期后重新请求；Discord 限速时沿用过期的快取
+        await asyncio.sleep(0.6)
+        stub.status = 429
+        stale = await server.check_guild_permission('1', GUILD_ID, 'token-admin')
+        results.append(check('TTL 过期后重新请求', stub.calls == 3))
+        results.append(check('请求失败时沿用过期快取', stale is True))
+
+        # 没有快取时请求失败视为无权限
+        results.append(check('无快取且请求失败时拒绝', await server.check_guild_permission('3', GUILD_ID, 'token-new') is False))
+
+        # 同一个连线池
+        session = server.http_session
+        await server.get_user_guilds('token-other')
+        results.append(check('重复使用同一个 ClientSession', server.http_session is session))
+    finally:
+        await server.stop()
+        await runner.cleanup()
+
+    print("\n" + "=" * 60)
+    print(f"{sum(results)}/{len(results)} 项通过")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,96 @@
+"""
+测试脚本：验证经验曲线的公式计算与原本逐级累加的结果一致
+随机产生经验值与曲线参数，与等级系统原本的循环算法逐一比对
+"""
+import random
+import sys
+sys.path.insert(0, '.')
+
+from utils.xp_curve import DEFAULT_CURVE, XPCurve, get_curve
+
+
+def legacy_level(xp, base=100, step=50):
+    """等级系统原本的算法：逐级扣除升级所需经验"""
+    level = 1
+    xp_needed = base
+    while xp >= xp_needed:
+        xp -= xp_needed
+        level += 1
+        xp_needed = base + (level - 1) * step
+    return level
+
+
+def legacy_progress(xp, base=100, step=50):
+    """原本查看等级时的进度计算"""
+    level = legacy_level(xp, base, step)
+    total = sum(base + (lvl - 1) * step for lvl in range(1, level))
+    return level, xp - total, base + (level - 1) * step
+
+
+class DummyStore:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def get(self, guild_id, name, default=None):
+        return self.docs.get((str(guild_id), name), {})
+
+
+def check(name, condition):
+    print(f"{'✅' if condition else '❌'} {name}")
+    return condition
+
+
+def first_mismatch(curve, values):
+    for xp in values:
+        expected = legacy_progress(xp, curve.base, curve.step)
+        if curve.progress(xp) != expected:
+            return xp, curve.progress(xp), expected
+    return None
+
+
+def main():
+    rng = random.Random(20240501)
+    results = []
+
+    # 预设曲线：小经验值逐一比对，每个等级的边界前后各比对一次
+    values = list(range(0, 20000))
+    values += [DEFAULT_CURVE.total_xp_for_level(lvl) + d for lvl in range(1, 600) for d in (-1, 0, 1)]
+    values += [rng.randrange(0, 10_000_000) for _ in range(2000)]
+    mismatch = first_mismatch(DEFAULT_CURVE, [v for v in values if v >= 0])
+    results.append(check('预设曲线与原本循环结果一致', mismatch is None))
+    if mismatch:
+        print(f"   xp={mismatch[0]} 得到 {mismatch[1]}，应为 {mismatch[2]}")
+
+    # 随机曲线参数（包含每级不增加的线性曲线）
+    bad = None
+    for _ in range(300):
+        curve = XPCurve(rng.randint(1, 1000), rng.choice([0, 1, 2, 7, rng.randint(0, 500)]))
+        samples = [rng.randrange(0, 2_000_000) for _ in range(50)]
+        samples += [curve.total_xp_for_level(lvl) + d for lvl in rng.sample(range(1, 300), 10) for d in (-1, 0)]
+        bad = first_mismatch(curve, [v for v in samples if v >= 0])
+        if bad:
+            print(f"   base={curve.base} step={curve.step} xp={bad[0]} 得到 {bad[1]}，应为 {bad[2]}")
+            break
+    results.append(check('随机曲线与原本循环结果一致', bad is None))
+
+    # 极大经验值：与累计经验公式互相验证（原本的循环太慢，不逐级比对）
+    ok = True
+    for xp in [10 ** 12, 10 ** 15 + 7, 2 ** 62]:
+        level = DEFAULT_CURVE.level_for_xp(xp)
+        ok &= DEFAULT_CURVE.total_xp_for_level(level) <= xp < DEFAULT_CURVE.total_xp_for_level(level + 1)
+    results.append(check('极大经验值的等级落在正确区间', ok))
+
+    results.append(check('负数经验视为等级 1', DEFAULT_CURVE.level_for_xp(-5) == 1))
+
+    # 伺服器自订曲线
+    store = DummyStore({('1', 'level_curve'): {'base': 200, 'step': 0}})
+    results.append(check('读取伺服器自订曲线', get_curve(store, 1).progress(450) == (3, 50, 200)))
+    results.append(check('未设定时使用预设曲线', get_curve(store, 2) is DEFAULT_CURVE))
+
+    print("\n" + "=" * 60)
+    print(f"{sum(results)}/{len(results)} 项通过")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,120 @@
+import re
+
+from utils.word_matcher import AhoCorasick
+
+
+class PrefixTrie:
+    """前綴樹：找出所有是文字前綴的觸發詞"""
+
+    def __init__(self, words):
+        self._root = {}
+        for value, word in words:
+            node = self._root
+            for char in word:
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append(value)  # None 鍵存放在此結束的附帶值
+
+    def match(self, text):
+        """回傳所有為 text 前綴的觸發詞的附帶值"""
+        found = []
+        node = self._root
+        found.extend(node.get(None, ()))
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            found.extend(node.get(None, ()))
+        return found
+
+
+class AutoReplyEngine:
+    """預先編譯的自動回覆規則引擎
+
+    規則變更時建立一次：
+    - exact：字典查詢
+    - starts_with / ends_with：前綴樹（結尾使用反轉字串的前綴樹）
+    - contains：Aho-Corasick 自動機
+    - regex：預先編譯的正則表達式
+    大小寫不敏感的規則與原始訊息的小寫版本比對，因此每則訊息只轉換一次大小寫。
+    頻道與角色限制只對命中的規則檢查。
+    """
+
+    def __init__(self, rules):
+        self.rules = [rule for rule in rules if rule.get('enabled', True)]
+        self._channels = {}  # {規則索引: frozenset(頻道 ID)}
+        self._roles = {}  # {規則索引: frozenset(角色 ID)}
+
+        exact = {}
+        prefix = {True: [], False: []}  # {區分大小寫: [(索引, 觸發詞)]}
+        suffix = {True: [], False: []}
+        contains = {True: [], False: []}
+        self._always = []  # 空白觸發詞的 contains / starts_with / ends_with 規則永遠命中
+        self._regex = []  # [(索引, 已編譯規則)]
+
+        for i, rule in enumerate(self.rules):
+            if rule.get('channel_ids'):
+                self._channels[i] = frozenset(rule['channel_ids'])
+            if rule.get('role_ids'):
+                self._roles[i] = frozenset(rule['role_ids'])
+
+            match_type = rule.get('match_type', 'contains')
+            trigger = rule.get('trigger', '')
+            case_sensitive = bool(rule.get('case_sensitive', False))
+            key = trigger if case_sensitive else trigger.lower()
+
+            if match_type == 'exact':
+                # 完全匹配一律區分大小寫
+                exact.setdefault(trigger, []).append(i)
+            elif match_type == 'regex':
+                try:
+                    flags = 0 if case_sensitive else re.IGNORECASE
+                    self._regex.append((i, re.compile(trigger, flags)))
+                except re.error:
+                    continue
+            elif match_type in ('contains', 'starts_with', 'ends_with'):
+                if not trigger:
+                    self._always.append(i)
+                elif match_type == 'contains':
+                    contains[case_sensitive].append((i, key))
+                elif match_type == 'starts_with':
+                    prefix[case_sensitive].append((i, key))
+                else:
+                    suffix[case_sensitive].append((i, key[::-1]))
+
+        self._exact = exact
+        self._prefix = {cs: PrefixTrie(words) for cs, words in prefix.items() if words}
+        self._suffix = {cs: PrefixTrie(words) for cs, words in suffix.items() if words}
+        self._contains = {cs: AhoCorasick(words) for cs, words in contains.items() if words}
+
+    def match(self, content, channel_id, role_ids, content_lower=None):
+        """回傳命中的規則（依原本的規則順序）
+
+        channel_id 為字串頻道 ID，role_ids 為用戶角色 ID 字串的集合，
+        content_lower 為呼叫端已轉換好的小寫內容（可選）。
+        """
+        texts = {True: content}
+        if self._prefix or self._suffix or self._contains:
+            texts[False] = content.lower() if content_lower is None else content_lower
+
+        matched = set(self._always)
+        matched.update(self._exact.get(content, ()))
+        for cs, trie in self._prefix.items():
+            matched.update(trie.match(texts[cs]))
+        for cs, trie in self._suffix.items():
+            matched.update(trie.match(texts[cs][::-1]))
+        for cs, automaton in self._contains.items():
+            matched.update(automaton.search_all(texts[cs]))
+        for i, pattern in self._regex:
+            if pattern.search(content):
+                matched.add(i)
+
+        result = []
+        for i in sorted(matched):
+            channels = self._channels.get(i)
+            if channels and channel_id not in channels:
+                continue
+            roles = self._roles.get(i)
+            if roles and roles.isdisjoint(role_ids):
+                continue
+            result.append(self.rules[i])
+        return result
@@ -0,0 +1,43 @@
+class BlockList:
+    """機器人層面的全局封鎖名單
+
+    名單在啟動時從數據存儲載入一次並常駐記憶體（{user_id: 封鎖資訊}），
+    每個互動的封鎖檢查只是一次字典查詢。封鎖與解封會立即寫回存儲後端
+    （JSON 為原子寫入，SQLite 為單一交易）。
+    """
+
+    name = 'blocked_users'
+
+    def __init__(self, data_store):
+        self.data_store = data_store
+        self._users = data_store.get(None, self.name)
+
+    def __contains__(self, user_id):
+        return str(user_id) in self._users
+
+    def __len__(self):
+        return len(self._users)
+
+    def get(self, user_id):
+        """獲取用戶的封鎖資訊，未被封鎖時回傳 None"""
+        return self._users.get(str(user_id))
+
+    def items(self):
+        """所有被封鎖的用戶 [(user_id, 封鎖資訊)]"""
+        return list(self._users.items())
+
+    async def block(self, user_id, info):
+        """封鎖用戶並寫回"""
+        self._users[str(user_id)] = info
+        await self._persist()
+
+    async def unblock(self, user_id):
+        """解封用戶並寫回，回傳原本的封鎖資訊（未被封鎖時為 None）"""
+        info = self._users.pop(str(user_id), None)
+        if info is not None:
+            await self._persist()
+        return info
+
+    async def _persist(self):
+        self.data_store.mark_dirty(None, self.name)
+        await self.data_store.flush()
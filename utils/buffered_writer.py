@@ -0,0 +1,114 @@
+import asyncio
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.fileio import recompress_gzip
+
+
+class BufferedAppendWriter:
+    """緩衝的追加寫入器
+
+    每個文件各自累積待寫入的內容，達到 flush_bytes 或每隔 flush_interval 秒
+    才一次追加到文件。寫入在單一背景執行緒中依提交順序執行，
+    因此同一個文件的內容順序不變，事件循環也不會被磁碟 I/O 阻塞。
+    副檔名為 `.gz` 的文件每次寫入追加一個 gzip 成員，讀取時可直接以 gzip 解壓整個文件；
+    文件完成後以 compact() 重新壓縮為單一成員。
+    寫入失敗的內容會放回緩衝最前面，下次再試，flush() 會拋出該次寫入的錯誤。
+    """
+
+    def __init__(self, flush_interval=2.0, flush_bytes=64 * 1024):
+        self.flush_interval = flush_interval  # 背景寫入間隔（秒）
+        self.flush_bytes = flush_bytes  # 單一文件緩衝達到此大小時立即寫入
+        self._buffers = {}  # {path: [待寫入的字串]}
+        self._sizes = {}  # {path: 緩衝大小}
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='append-writer')
+
+    def append(self, path, text):
+        """加入待寫入的內容"""
+        self._buffers.setdefault(path, []).append(text)
+        size = self._sizes.get(path, 0) + len(text)
+        self._sizes[path] = size
+        if size >= self.flush_bytes:
+            self._submit(path)
+
+    def pending(self, path):
+        """文件是否還有尚未寫入的內容"""
+        return path in self._buffers
+
+    def _submit(self, path):
+        """把文件的緩衝交給寫入執行緒（不等待完成）"""
+        chunks = self._buffers.pop(path, None)
+        self._sizes.pop(path, None)
+        if not chunks:
+            return None
+        text = ''.join(chunks)
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._write, path, text)
+        future.add_done_callback(lambda f: self._requeue(path, text, f))
+        return future
+
+    def _requeue(self, path, text, future):
+        """寫入失敗時把內容放回緩衝最前面（在事件循環中執行）"""
+        if future.cancelled() or future.exception() is None:
+            return
+        print(f"❌ 追加寫入文件失敗 {path}: {future.exception()}")
+        self._buffers.setdefault(path, []).insert(0, text)
+        self._sizes[path] = self._sizes.get(path, 0) + len(text)
+
+    @staticmethod
+    def _write(path, text):
+        if path.endswith('.gz'):
+            with open(path, 'ab') as f:
+                f.write(gzip.compress(text.encode('utf-8')))
+        else:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(text)
+
+    async def run(self, func, *args):
+        """在寫入執行緒中執行 func（排在先前提交的寫入之後，之後的追加也排在它之後）"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def flush(self, path=None):
+        """寫入指定文件（或所有文件）的緩衝，寫入失敗時拋出錯誤（內容保留在緩衝中）"""
+        loop = asyncio.get_running_loop()
+        # 寫入執行緒依序處理，先等先前提交的寫入完成，失敗的內容已放回緩衝，與新內容一起重試
+        await loop.run_in_executor(self._executor, lambda: None)
+        paths = [path] if path is not None else list(self._buffers)
+        futures = [future for future in map(self._submit, paths) if future is not None]
+        if futures:
+            await asyncio.gather(*futures)
+
+    async def compact(self, path):
+        """寫入緩衝後把 `.gz` 文件重新壓縮為單一 gzip 成員（文件不再追加時呼叫）"""
+        await self.flush(path)
+        await self.run(recompress_gzip, path)
+
+    async def _flush_loop(self):
+        """背景寫入任務"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                print(f"❌ 背景追加寫入時發生錯誤: {e}")
+
+    def start(self):
+        """啟動背景寫入任務"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """停止背景任務並寫入所有緩衝"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"❌ 關閉時追加寫入失敗，未寫入的內容已遺失: {e}")
+        finally:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,187 @@
+import ast
+import asyncio
+import math
+import multiprocessing
+import operator
+
+# 計算限制
+MAX_EXPRESSION_LENGTH = 200  # 表達式最大長度
+MAX_NODES = 100  # 語法樹最大節點數
+MAX_INT_BITS = 4096  # 整數運算結果的最大位元數（約 1233 位數）
+MAX_EXPONENT = 10000  # 次方的指數上限
+EVAL_TIMEOUT = 2.0  # 背景進程計算的時間上限（秒）
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+class CalculatorError(ValueError):
+    """表達式不合法或超出計算限制"""
+
+
+def parse(expression: str) -> ast.Expression:
+    """解析並檢查表達式，只允許數字、四則運算、取餘與次方"""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise CalculatorError(f"表達式過長（最多 {MAX_EXPRESSION_LENGTH} 個字符）")
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except (SyntaxError, ValueError):
+        raise CalculatorError("表達式格式錯誤")
+
+    count = 0
+    for node in ast.walk(tree):
+        count += 1
+        if count > MAX_NODES:
+            raise CalculatorError(f"表達式過於複雜（最多 {MAX_NODES} 個節點）")
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise CalculatorError("只允許數字")
+        elif isinstance(node, ast.BinOp):
+            if type(node.op) not in _BINARY_OPS:
+                raise CalculatorError("不支援的運算符")
+        elif isinstance(node, ast.UnaryOp):
+            if type(node.op) not in _UNARY_OPS:
+                raise CalculatorError("不支援的運算符")
+        elif not isinstance(node, (ast.Expression, ast.operator, ast.unaryop)):
+            raise CalculatorError("表達式包含非法內容！只允許數字和運算符")
+    return tree
+
+
+def _check(value):
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise CalculatorError("計算結果過大")
+    if isinstance(value, float) and not math.isfinite(value):
+        raise CalculatorError("計算結果過大")
+    return value
+
+
+def _power(base, exponent):
+    if abs(exponent) > MAX_EXPONENT:
+        raise CalculatorError(f"指數過大（最多 {MAX_EXPONENT}）")
+    # 先估算整數次方結果的位元數，超過上限就不計算
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        if (base.bit_length() - 1) * exponent > MAX_INT_BITS:
+            raise CalculatorError("計算結果過大")
+    return base ** exponent
+
+
+def _eval(node):
+    if isinstance(node, ast.Expression):
+        return _eval(node.body)
+    if isinstance(node, ast.Constant):
+        return _check(node.value)
+    if isinstance(node, ast.UnaryOp):
+        return _UNARY_OPS[type(node.op)](_eval(node.operand))
+    left = _eval(node.left)
+    right = _eval(node.right)
+    if isinstance(node.op, ast.Pow):
+        result = _power(left, right)
+    else:
+        result = _BINARY_OPS[type(node.op)](left, right)
+    if isinstance(result, complex):
+        raise CalculatorError("結果不是實數")
+    return _check(result)
+
+
+def evaluate(expression):
+    """計算表達式（同步，可在背景進程執行）"""
+    tree = expression if isinstance(expression, ast.Expression) else parse(expression)
+    try:
+        return _eval(tree)
+    except ZeroDivisionError:
+        raise CalculatorError("不能除以零")
+    except OverflowError:
+        raise CalculatorError("計算結果過大")
+
+
+def _evaluate_in_worker(expression):
+    """背景進程的入口，錯誤以字串回傳，避免例外在進程間序列化"""
+    try:
+        return True, evaluate(expression)
+    except CalculatorError as e:
+        return False, str(e)
+
+
+class Calculator:
+    """不阻塞事件循環的計算器
+
+    表達式先在事件循環中解析成語法樹並檢查（長度、節點數、只允許數字與運算符）。
+    沒有次方的表達式運算量有上限，直接計算；含次方的交給背景進程，
+    超過 EVAL_TIMEOUT 秒便終止該進程，gateway 心跳不會被用戶輸入卡住。
+    進程池由 start() 在執行緒中建立（spawn 啟動進程需要匯入主模組，耗時較長），
+    建立與終止都不在事件循環中執行。
+    """
+
+    def __init__(self, timeout=EVAL_TIMEOUT):
+        self.timeout = timeout
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+        self._restart = None  # 超時後重新建立進程池的任務
+
+    @staticmethod
+    def _create_pool():
+        return multiprocessing.get_context('spawn').Pool(processes=1)
+
+    async def start(self):
+        """在執行緒中建立背景進程池（已建立時直接回傳）"""
+        async with self._pool_lock:
+            if self._pool is None:
+                self._pool = await asyncio.get_running_loop().run_in_executor(None, self._create_pool)
+            return self._pool
+
+    async def close(self):
+        """在執行緒中終止背景進程池"""
+        if self._restart is not None:
+            self._restart.cancel()
+            self._restart = None
+        async with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            await asyncio.get_running_loop().run_in_executor(None, pool.terminate)
+
+    async def calculate(self, expression: str):
+        tree = parse(expression)
+        if not any(isinstance(node, ast.Pow) for node in ast.walk(tree)):
+            return evaluate(tree)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(result):
+            if not future.done():
+                future.set_result(result)
+
+        def reject(error):
+            if not future.done():
+                future.set_exception(error)
+
+        pool = await self.start()
+        pool.apply_async(
+            _evaluate_in_worker, (expression,),
+            callback=lambda result: loop.call_soon_threadsafe(resolve, result),
+            error_callback=lambda error: loop.call_soon_threadsafe(reject, error)
+        )
+        try:
+            ok, value = await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # 終止卡住的進程，並在背景建立新的進程池
+            async with self._pool_lock:
+                if self._pool is pool:
+                    self._pool = None
+            await loop.run_in_executor(None, pool.terminate)
+            self._restart = asyncio.create_task(self.start())
+            raise CalculatorError("計算超時")
+        if not ok:
+            raise CalculatorError(value)
+        return value
@@ -0,0 +1,170 @@
+import asyncio
+import json
+from collections import Counter
+from datetime import datetime
+
+import discord
+
+from utils.buffered_writer import BufferedAppendWriter
+
+# Discord 單則訊息最多 10 個 embed
+EMBEDS_PER_MESSAGE = 10
+
+
+class CommandLogSink:
+    """批次發送的指令日誌
+
+    指令完成時只把一筆記錄放進佇列（不等待、不請求 API）。背景任務每隔
+    flush_interval 秒，或佇列累積滿一則訊息的量時，把最多 10 筆記錄合併成
+    一則訊息發送到日誌頻道（或 webhook）。佇列已滿時新記錄會被略過並依指令計數，
+    下一次發送時附上一個「已略過」的彙總 embed。
+    可另外設定本地 NDJSON 文件，每筆記錄都會完整寫入。
+    """
+
+    def __init__(self, bot, channel_id=None, webhook_url=None, file_path=None,
+                 flush_interval=2.0, max_queue=1000):
+        self.bot = bot
+        self.channel_id = int(channel_id) if channel_id else None
+        self.webhook_url = webhook_url or None
+        self.file_path = file_path or None
+        self.flush_interval = flush_interval  # 發送間隔（秒）
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._file_writer = BufferedAppendWriter(flush_interval) if self.file_path else None
+        self._webhook = None
+        self._task = None
+        self.sent = 0  # 已發送的記錄數
+        self.messages = 0  # 已發送的訊息數
+        self.dropped = 0  # 因佇列已滿而略過的記錄數
+        self._dropped_commands = Counter()  # 尚未回報的略過記錄 {指令: 次數}
+
+    @property
+    def enabled(self):
+        return bool(self.channel_id or self.webhook_url or self.file_path)
+
+    def put(self, user_name, command_name, response, guild_name=None):
+        """加入一筆日誌記錄（不會阻塞）"""
+        entry = {
+            'time': datetime.now().isoformat(),
+            'user': user_name,
+            'command': command_name,
+            'response': response,
+            'guild': guild_name,
+        }
+        if self._file_writer is not None:
+            self._file_writer.append(self.file_path, json.dumps(entry, ensure_ascii=False) + '\n')
+        if not (self.channel_id or self.webhook_url):
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self._dropped_commands[command_name] += 1
+
+    @staticmethod
+    def build_embed(entry):
+        """依指令類型建立彩色 Embed"""
+        command_name = entry['command']
+        if "娛樂" in command_name:
+            color = discord.Color.purple()  # 紫色 - 娛樂
+            emoji = "🎮"
+        elif "管理" in command_name:
+            color = discord.Color.red()  # 红色 - 管理
+            emoji = "🔨"
+        elif "一般" in command_name:
+            color = discord.Color.blue()  # 蓝色 - 一般
+            emoji = "ℹ️"
+        else:
+            color = discord.Color.green()  # 绿色 - 其他
+            emoji = "📝"
+
+        embed = discord.Embed(
+            title=f"{emoji} 指令日誌",
+            color=color,
+            timestamp=datetime.fromisoformat(entry['time']).astimezone()
+        )
+        embed.add_field(name="👤 用戶", value=f"`{entry['user']}`", inline=True)
+        embed.add_field(name="⚡ 指令", value=f"`{command_name}`", inline=True)
+        embed.add_field(name="💬 響應", value=entry['response'] or "已響應", inline=False)
+        embed.set_footer(text="指令執行記錄")
+        return embed
+
+    def _dropped_embed(self):
+        """彙總佇列已滿時略過的記錄"""
+        total = sum(self._dropped_commands.values())
+        lines = [f"`{name}` × {count}" for name, count in self._dropped_commands.most_common(10)]
+        self._dropped_commands.clear()
+        return discord.Embed(
+            title="⚠️ 日誌過多，已略過部分記錄",
+            description=f"共略過 **{total}** 筆\n" + "\n".join(lines),
+            color=discord.Color.orange(),
+            timestamp=discord.utils.utcnow()
+        )
+
+    async def _get_target(self):
+        if self.webhook_url:
+            if self._webhook is None:
+                self._webhook = discord.Webhook.from_url(self.webhook_url, client=self.bot)
+            return self._webhook
+        channel = self.bot.get_channel(self.channel_id)
+        if channel is None:
+            print(f"⚠️  找不到日誌頻道 ID: {self.channel_id}")
+        return channel
+
+    async def _send_batch(self):
+        """發送一則訊息（最多 10 個 embed）"""
+        embeds = []
+        if self._dropped_commands:
+            embeds.append(self._dropped_embed())
+        while len(embeds) < EMBEDS_PER_MESSAGE and not self._queue.empty():
+            embeds.append(self.build_embed(self._queue.get_nowait()))
+        if not embeds:
+            return
+
+        target = await self._get_target()
+        if target is None:
+            return
+        try:
+            await target.send(embeds=embeds)
+            self.sent += len(embeds)
+            self.messages += 1
+        except Exception as e:
+            print(f"❌ 日誌發送失败: {e}")
+
+    async def flush(self):
+        """發送佇列中所有記錄"""
+        while not self._queue.empty() or self._dropped_commands:
+            await self._send_batch()
+        if self._file_writer is not None:
+            await self._file_writer.flush()
+
+    async def _flush_loop(self):
+        """背景發送任務：湊滿一則訊息或等待 flush_interval 秒後發送"""
+        await self.bot.wait_until_ready()
+        while True:
+            if self._queue.qsize() < EMBEDS_PER_MESSAGE:
+                await asyncio.sleep(self.flush_interval)
+            try:
+                await self._send_batch()
+            except Exception as e:
+                print(f"❌ 發送日誌時發生錯誤: {e}")
+
+    def start(self):
+        """啟動背景發送任務"""
+        if self._file_writer is not None:
+            self._file_writer.start()
+        if (self.channel_id or self.webhook_url) and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """停止背景任務並發送剩餘的記錄"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            if not self.bot.is_closed():
+                await self.flush()
+        if self._file_writer is not None:
+            await self._file_writer.close()
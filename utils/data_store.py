@@ -0,0 +1,191 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.storage import JsonBackend, StorageWriteError
+
+
+class GuildDataStore:
+    """共享數據存儲
+
+    所有 cog 與網頁後台共用的記憶體文件快取。文件在第一次讀取時從存儲後端
+    （預設為 `data/<guild_id>/<name>.json` 的 JSON 文件，或 SQLite 數據庫）載入，
+    修改後只標記為「髒」，由背景任務依時間間隔或髒文件數量批次寫回，
+    避免在事件循環中對每則訊息都重寫整個文件。
+
+    傳入 metrics 時會記錄每次讀取與批次寫入的耗時。
+    """
+
+    def __init__(self, data_dir='data', flush_interval=5.0, flush_threshold=50, backend=None, metrics=None):
+        self.data_dir = data_dir
+        self.backend = backend or JsonBackend(data_dir)
+        self.flush_interval = flush_interval  # 背景寫入間隔（秒）
+        self.flush_threshold = flush_threshold  # 髒文件達到此數量時立即寫入
+        self.metrics = metrics
+        self._docs = {}  # {(guild_id, name): data}
+        self._dirty = set()
+        self._absent = set()  # 已確認不存在於後端、尚未建立的文件
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        # 單一寫入執行緒：保證寫入順序，SQLite 連線也只在此執行緒寫入
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='data-store')
+
+    @staticmethod
+    def _key(guild_id, name):
+        return (str(guild_id) if guild_id is not None else None, name)
+
+    def _read(self, guild_id, name):
+        """從存儲後端讀取文件，不存在或損壞時回傳 None（可在寫入執行緒中執行）"""
+        try:
+            return self.backend.load(guild_id, name)
+        except Exception as e:
+            print(f"⚠️  讀取數據文件失敗 {guild_id}/{name}: {e}")
+            return None
+
+    def _observe_load(self, start, count=1):
+        if self.metrics is not None:
+            self.metrics.storage.observe(('load',), time.perf_counter() - start)
+            self.metrics.storage_documents.inc(('load',), count)
+
+    def _load(self, guild_id, name, default):
+        """從存儲後端讀取文件，不存在或損壞時使用預設值"""
+        start = time.perf_counter()
+        data = self._read(guild_id, name)
+        self._observe_load(start)
+        if data is not None:
+            return data
+        return default() if default else {}
+
+    def exists(self, guild_id, name):
+        """檢查文件是否已存在（已寫入或等待寫入）"""
+        guild_id, name = self._key(guild_id, name)
+        return (guild_id, name) in self._dirty or self.backend.exists(guild_id, name)
+
+    def list_names(self, guild_id):
+        """列出伺服器所有的數據文件名稱（包含尚未寫入的文件）"""
+        gid = str(guild_id)
+        names = {name for key_gid, name in self._docs if key_gid == gid}
+        names.update(self.backend.list_names(gid))
+        return sorted(names)
+
+    def list_guilds(self):
+        """列出所有有數據文件的伺服器 ID（包含尚未寫入的文件，也包含機器人已離開的伺服器）"""
+        guilds = {key_gid for key_gid, _ in self._docs if key_gid is not None}
+        guilds.update(self.backend.list_guilds())
+        return sorted(guilds)
+
+    def get(self, guild_id, name, default=None):
+        """獲取文件（回傳快取中的同一個物件，修改後請呼叫 mark_dirty）
+
+        default 為建立預設內容的函式，文件不存在時使用。
+        """
+        key = self._key(guild_id, name)
+        if key not in self._docs:
+            if key in self._absent:
+                self._absent.discard(key)
+                self._docs[key] = default() if default else {}
+            else:
+                self._docs[key] = self._load(key[0], name, default)
+        return self._docs[key]
+
+    async def load(self, guild_id, name, default=None):
+        """get 的異步版本：文件不在快取中時於寫入執行緒讀取，不阻塞事件循環
+
+        與寫入共用同一個執行緒，讀取一定排在先前的寫入之後。
+        """
+        key = self._key(guild_id, name)
+        if key not in self._docs:
+            await self.preload(key[0], (name,))
+        return self.get(guild_id, name, default)
+
+    async def preload(self, guild_id, names):
+        """在寫入執行緒中一次讀取多個尚未快取的文件（已快取的直接略過）"""
+        gid = self._key(guild_id, None)[0]
+        missing = [name for name in names if (gid, name) not in self._docs and (gid, name) not in self._absent]
+        if not missing:
+            return
+        start = time.perf_counter()
+        loaded = await asyncio.get_running_loop().run_in_executor(
+            self._executor, lambda: [self._read(gid, name) for name in missing]
+        )
+        self._observe_load(start, len(missing))
+        for name, data in zip(missing, loaded):
+            key = (gid, name)
+            # 等待期間可能已被其他協程載入或替換
+            if key in self._docs:
+                continue
+            if data is None:
+                # 不存在的文件由下次 get 以該處的預設值建立，不再查詢後端
+                self._absent.add(key)
+            else:
+                self._docs[key] = data
+
+    def set(self, guild_id, name, data):
+        """替換整個文件並標記為待寫入"""
+        self._docs[self._key(guild_id, name)] = data
+        self.mark_dirty(guild_id, name)
+
+    def mark_dirty(self, guild_id, name):
+        """標記文件已修改，等待背景寫入"""
+        self._dirty.add(self._key(guild_id, name))
+        if len(self._dirty) >= self.flush_threshold:
+            self._wakeup.set()
+
+    async def flush(self):
+        """立即將所有待寫入的文件寫回存儲後端"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            # 在事件循環中序列化，確保寫入的是一致的快照
+            payloads = [
+                (guild_id, name, json.dumps(self._docs.get((guild_id, name)), ensure_ascii=False, indent=2))
+                for guild_id, name in dirty
+            ]
+            start = time.perf_counter()
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self.backend.write, payloads)
+                if self.metrics is not None:
+                    self.metrics.storage.observe(('write',), time.perf_counter() - start)
+                    self.metrics.storage_documents.inc(('write',), len(payloads))
+            except StorageWriteError as e:
+                # 只有寫入失敗的文件保留髒標記，下次再試
+                self._dirty.update(e.failed)
+                print(f"❌ 寫入數據失敗（{self.backend.name}）: {e}")
+            except Exception as e:
+                # 整批寫入失敗（例如 SQLite 交易回滾）時全部保留髒標記，下次再試
+                self._dirty.update(dirty)
+                print(f"❌ 寫入數據失敗（{self.backend.name}）: {e}")
+
+    async def _flush_loop(self):
+        """背景寫入任務"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                # shield：任務被取消時仍讓進行中的寫入完成
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                print(f"❌ 背景寫入數據時發生錯誤: {e}")
+
+    def start(self):
+        """啟動背景寫入任務"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """停止背景任務並強制寫入所有數據"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        self.backend.close()
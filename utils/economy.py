@@ -0,0 +1,111 @@
+import asyncio
+from collections import namedtuple
+
+from utils.xp_curve import get_curve
+
+
+class GrantResult(namedtuple('GrantResult', 'xp level old_level points')):
+    """發放後的用戶狀態：總經驗、等級、發放前等級、總積分"""
+
+    @property
+    def leveled_up(self):
+        return self.level > self.old_level
+
+
+def new_level_entry():
+    """等級數據中的新用戶"""
+    return {"xp": 0, "level": 1, "messages": 0, "last_message": None}
+
+
+def new_daily_entry():
+    """簽到數據中的新用戶"""
+    return {"last_checkin": None, "streak": 0, "total_checkins": 0, "total_points": 0}
+
+
+class Economy:
+    """經驗值與積分發放服務
+
+    所有經驗值（`levels`）與簽到積分（`daily`）的增加都經過 grant，
+    同一個伺服器的發放以 asyncio 鎖串行處理；同一輪事件中排隊的發放合併為一批，
+    每批只標記一次文件修改、每位用戶只更新一次排行榜。
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._locks = {}  # {guild_id: asyncio.Lock}
+        self._pending = {}  # {guild_id: [(user_id, xp, points, future)]}
+
+    def _lock(self, guild_id):
+        lock = self._locks.get(guild_id)
+        if lock is None:
+            lock = self._locks[guild_id] = asyncio.Lock()
+        return lock
+
+    async def grant(self, guild_id, user_id, xp=0, points=0):
+        """發放經驗值與積分，回傳 GrantResult"""
+        guild_id = str(guild_id)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(guild_id, []).append((str(user_id), int(xp), int(points), future))
+
+        async with self._lock(guild_id):
+            # 先讓出一次事件循環，讓同時結束的遊戲併入同一批
+            await asyncio.sleep(0)
+            batch = self._pending.pop(guild_id, None)
+            if batch:
+                self._apply(guild_id, batch)
+
+        return await future
+
+    def _apply(self, guild_id, batch):
+        """在持有伺服器鎖的情況下套用一批發放"""
+        store = self.bot.data_store
+        try:
+            levels = store.get(guild_id, 'levels')
+            daily = store.get(guild_id, 'daily')
+            curve = get_curve(store, guild_id)
+            results = []
+            xp_users, point_users = set(), set()
+
+            for user_id, xp, points, _ in batch:
+                level_data = levels.get(user_id)
+                if xp:
+                    if level_data is None:
+                        level_data = levels[user_id] = new_level_entry()
+                    old_level = level_data.get('level', 1)
+                    level_data['xp'] = level_data.get('xp', 0) + xp
+                    level_data['level'] = curve.level_for_xp(level_data['xp'])
+                    xp_users.add(user_id)
+                else:
+                    old_level = level_data.get('level', 1) if level_data else 1
+
+                daily_data = daily.get(user_id)
+                if points:
+                    if daily_data is None:
+                        daily_data = daily[user_id] = new_daily_entry()
+                    daily_data['total_points'] = daily_data.get('total_points', 0) + points
+                    point_users.add(user_id)
+
+                results.append(GrantResult(
+                    xp=level_data.get('xp', 0) if level_data else 0,
+                    level=level_data.get('level', 1) if level_data else 1,
+                    old_level=old_level,
+                    points=daily_data.get('total_points', 0) if daily_data else 0
+                ))
+
+            if xp_users:
+                store.mark_dirty(guild_id, 'levels')
+                for user_id in xp_users:
+                    self.bot.leaderboards.update(guild_id, 'levels', user_id, levels[user_id]['xp'])
+            if point_users:
+                store.mark_dirty(guild_id, 'daily')
+                for user_id in point_users:
+                    self.bot.leaderboards.update(guild_id, 'daily', user_id, daily[user_id]['total_points'])
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (*_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
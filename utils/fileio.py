@@ -0,0 +1,81 @@
+import gzip
+import os
+import shutil
+import stat
+import tempfile
+
+
+def _rotate_backups(path, backups):
+    """輪替備份：path.bak.(n-1) → path.bak.n，…，path 複製為 path.bak.1"""
+    for i in range(backups - 1, 0, -1):
+        older = f'{path}.bak.{i}'
+        if os.path.exists(older):
+            os.replace(older, f'{path}.bak.{i + 1}')
+    if os.path.exists(path):
+        # 使用複製而非移動，目標文件在任何時刻都存在
+        shutil.copyfile(path, f'{path}.bak.1')
+
+
+def recompress_gzip(path, chunk_size=1024 * 1024):
+    """把由多個 gzip 成員串接而成的文件重新壓縮為單一成員（原子取代）
+
+    每個成員都有各自的檔頭且壓縮字典從零開始，內容零碎時壓縮率很差；
+    文件完成後重新壓縮一次。原文件損壞時拋出錯誤，原文件保持不變。
+    """
+    folder = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            with gzip.open(path, 'rb') as src, gzip.GzipFile(fileobj=raw, mode='wb') as dst:
+                shutil.copyfileobj(src, dst, chunk_size)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write(path, data, backups=0, encoding='utf-8'):
+    """原子寫入文件
+
+    先寫入同目錄下的暫存檔並 fsync，再以 os.replace 取代目標文件，
+    進程在寫入途中結束時原文件保持完整。backups > 0 時保留多代 `.bak.N` 備份。
+    """
+    folder = os.path.dirname(path) or '.'
+    os.makedirs(folder, exist_ok=True)
+
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **({} if mode == 'wb' else {'encoding': encoding})) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp 建立的文件權限為 0600，沿用原文件的權限
+        file_mode = stat.S_IMODE(os.stat(path).st_mode) if os.path.exists(path) else 0o644
+        os.chmod(tmp_path, file_mode)
+        if backups > 0:
+            _rotate_backups(path, backups)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    # 同步目錄項目，確保重新命名本身也已落盤（Windows 不支援）
+    if hasattr(os, 'O_DIRECTORY'):
+        try:
+            dir_fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
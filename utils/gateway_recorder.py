@@ -0,0 +1,171 @@
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from datetime import datetime
+
+from utils.buffered_writer import BufferedAppendWriter
+
+# 訊息內容的記錄方式
+CONTENT_MODES = ('redact', 'full')
+
+
+def _redact(text):
+    """保留長度、空白與標點（例如自定義命令的 ! 開頭），文字與數字換成 x"""
+    return ''.join('x' if char.isalnum() else char for char in text)
+
+
+class GatewayRecorder:
+    """Gateway 事件錄製器
+
+    在 MyBot.dispatch 中記錄訊息、反應、語音狀態與成員加入/離開事件，
+    以時間偏移寫入 gzip 壓縮的 NDJSON（BufferedAppendWriter，每次寫入一個 gzip 成員，
+    結束錄製時重新壓縮為單一成員）。
+    所有 ID 以每次錄製隨機產生的金鑰做 HMAC 轉換（同一份錄製中保持一致），
+    名稱換成代號，訊息內容預設只保留形狀（長度、空白與標點）。
+    第一行為檔頭，之後每行為 {'t': 距開始的秒數, 'event': 事件名稱, 'data': {...}}。
+    """
+
+    def __init__(self, directory, content_mode='redact', flush_interval=2.0):
+        if content_mode not in CONTENT_MODES:
+            raise ValueError(f"不支援的內容記錄方式: {content_mode}")
+        self.directory = directory
+        self.content_mode = content_mode
+        self.path = None
+        self.recorded = 0
+        self.errors = 0
+        self._key = secrets.token_bytes(16)
+        self._writer = BufferedAppendWriter(flush_interval)
+        self._started = None
+        self._encoders = {
+            'message': self._encode_message,
+            'raw_reaction_add': self._encode_reaction,
+            'raw_reaction_remove': self._encode_reaction,
+            'voice_state_update': self._encode_voice_state,
+            'member_join': self._encode_member,
+            'member_remove': self._encode_member,
+        }
+
+    def start(self):
+        """建立錄製文件並啟動背景寫入"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"gateway-{datetime.now().strftime('%Y%m%d-%H%M%S')}.ndjson.gz")
+        self._started = time.monotonic()
+        self._write('header', {
+            'started_at': datetime.now().isoformat(),
+            'content': self.content_mode,
+            'events': sorted(self._encoders),
+        })
+        self._writer.start()
+        print(f"🎙️  正在錄製 Gateway 事件: {self.path}")
+
+    async def close(self):
+        """寫入所有緩衝中的事件，並重新壓縮為單一 gzip 成員"""
+        if self.path:
+            try:
+                await self._writer.compact(self.path)
+            except Exception as e:
+                print(f"⚠️  重新壓縮錄製文件失敗 {self.path}: {e}")
+        await self._writer.close()
+        if self.path:
+            print(f"🎙️  已錄製 {self.recorded} 個事件: {self.path}")
+
+    def record(self, event_name, args):
+        """記錄一個事件（未錄製的事件類型直接略過）"""
+        encoder = self._encoders.get(event_name)
+        if encoder is None or self._started is None:
+            return
+        try:
+            data = encoder(*args)
+        except Exception:
+            self.errors += 1
+            return
+        if data is not None:
+            self._write(event_name, data)
+            self.recorded += 1
+
+    def _write(self, event_name, data):
+        line = {'t': round(time.monotonic() - self._started, 6), 'event': event_name, 'data': data}
+        self._writer.append(self.path, json.dumps(line, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+    def _id(self, value):
+        """轉換 ID（同一份錄製中相同的 ID 得到相同的代號）
+
+        每次直接計算 HMAC，不保留對照表，長時間錄製時記憶體不會隨 ID 數量增長。
+        """
+        if value is None:
+            return None
+        digest = hmac.new(self._key, str(value).encode(), hashlib.sha256).digest()
+        return int.from_bytes(digest[:8], 'big') >> 1
+
+    def _content(self, text):
+        if not text:
+            return ''
+        return text if self.content_mode == 'full' else _redact(text)
+
+    def _encode_member(self, member):
+        guild = getattr(member, 'guild', None)
+        if guild is None:
+            return None
+        return {
+            'guild_id': self._id(guild.id),
+            'user_id': self._id(member.id),
+            'bot': member.bot,
+            'role_ids': [self._id(role.id) for role in getattr(member, 'roles', ()) if role.id != guild.id],
+        }
+
+    def _encode_message(self, message):
+        if message.guild is None:
+            return None
+        author = self._encode_member(message.author) if hasattr(message.author, 'roles') else None
+        return {
+            'id': self._id(message.id),
+            'guild_id': self._id(message.guild.id),
+            'channel_id': self._id(message.channel.id),
+            'user_id': self._id(message.author.id),
+            'bot': message.author.bot,
+            'role_ids': author['role_ids'] if author else [],
+            'content': self._content(message.content),
+            'attachments': len(message.attachments),
+            'embeds': len(message.embeds),
+        }
+
+    def _encode_reaction(self, payload):
+        if payload.guild_id is None:
+            return None
+        emoji = payload.emoji
+        return {
+            'guild_id': self._id(payload.guild_id),
+            'channel_id': self._id(payload.channel_id),
+            'message_id': self._id(payload.message_id),
+            'user_id': self._id(payload.user_id),
+            # 自訂表情保留名稱與轉換後的 ID，Unicode 表情原樣保留
+            'emoji': emoji.name if emoji.id is None else f'<:{emoji.name}:{self._id(emoji.id)}>',
+        }
+
+    def _encode_voice_state(self, member, before, after):
+        data = self._encode_member(member)
+        if data is None:
+            return None
+        data['before'] = self._id(before.channel.id) if before.channel else None
+        data['after'] = self._id(after.channel.id) if after.channel else None
+        data['self_mute'] = after.self_mute
+        data['self_deaf'] = after.self_deaf
+        return data
+
+
+def read_recording(path):
+    """逐筆讀取錄製文件，回傳 (檔頭, 事件迭代器)"""
+    f = gzip.open(path, 'rt', encoding='utf-8')
+    header = json.loads(f.readline())
+
+    def events():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header['data'], events()
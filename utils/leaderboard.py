@@ -0,0 +1,241 @@
+import asyncio
+import time
+from bisect import bisect_left, insort
+
+
+class _BlockedSortedList:
+    """分塊的排序列表
+
+    元素分散在多個各自排序、長度不超過 2 × load 的小列表中，另記錄每塊的最大值。
+    插入與刪除只移動單一小列表的元素，耗時 O(log n + load)，
+    不會像單一大列表那樣每次搬移 O(n) 個元素；位置查詢需加總前面各塊長度，O(n / load)。
+    """
+
+    def __init__(self, values=(), load=512):
+        self._load = load
+        values = sorted(values)
+        self._lists = [values[i:i + load] for i in range(0, len(values), load)]
+        self._maxes = [block[-1] for block in self._lists]
+        self._len = len(values)
+
+    def __len__(self):
+        return self._len
+
+    def add(self, value):
+        if not self._maxes:
+            self._lists.append([value])
+            self._maxes.append(value)
+        else:
+            pos = bisect_left(self._maxes, value)
+            if pos == len(self._maxes):
+                pos -= 1
+                self._lists[pos].append(value)
+                self._maxes[pos] = value
+            else:
+                insort(self._lists[pos], value)
+            block = self._lists[pos]
+            if len(block) > self._load * 2:
+                # 過大的塊對半分開
+                half = block[self._load:]
+                del block[self._load:]
+                self._maxes[pos] = block[-1]
+                self._lists.insert(pos + 1, half)
+                self._maxes.insert(pos + 1, half[-1])
+        self._len += 1
+
+    def remove(self, value):
+        """移除元素（元素必須存在）"""
+        pos = bisect_left(self._maxes, value)
+        block = self._lists[pos]
+        del block[bisect_left(block, value)]
+        self._len -= 1
+        if not block:
+            del self._lists[pos]
+            del self._maxes[pos]
+        else:
+            self._maxes[pos] = block[-1]
+
+    def index(self, value):
+        """元素的位置（從 0 開始，元素必須存在）"""
+        pos = bisect_left(self._maxes, value)
+        before = sum(len(block) for block in self._lists[:pos])
+        return before + bisect_left(self._lists[pos], value)
+
+    def head(self, n):
+        """前 n 個元素"""
+        result = []
+        for block in self._lists:
+            if len(result) >= n:
+                break
+            result.extend(block[:n - len(result)])
+        return result
+
+
+class SortedRanking:
+    """依分數排序的排名表
+
+    以 (-分數, 用戶 ID) 排序的分塊列表加上 {用戶 ID: 分數} 的索引，
+    更新只移動單一用戶的位置（O(log n) 加上搬移一個小塊），排名查詢不需排序。
+    """
+
+    def __init__(self, items=()):
+        self._scores = {}
+        for user_id, score in items:
+            self._scores[str(user_id)] = score
+        self._order = _BlockedSortedList((-score, user_id) for user_id, score in self._scores.items())
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, user_id):
+        return str(user_id) in self._scores
+
+    def update(self, user_id, score):
+        """更新用戶分數"""
+        user_id = str(user_id)
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._order.remove((-old, user_id))
+        self._scores[user_id] = score
+        self._order.add((-score, user_id))
+
+    def remove(self, user_id):
+        """從排名中移除用戶"""
+        user_id = str(user_id)
+        old = self._scores.pop(user_id, None)
+        if old is not None:
+            self._order.remove((-old, user_id))
+
+    def score(self, user_id):
+        return self._scores.get(str(user_id))
+
+    def rank(self, user_id):
+        """回傳用戶排名（從 1 開始），不在排名中時回傳 0"""
+        user_id = str(user_id)
+        score = self._scores.get(user_id)
+        if score is None:
+            return 0
+        return self._order.index((-score, user_id)) + 1
+
+    def top(self, n=10):
+        """回傳前 n 名 [(用戶 ID, 分數)]"""
+        return [(user_id, -neg_score) for neg_score, user_id in self._order.head(n)]
+
+
+class LeaderboardService:
+    """排行榜服務
+
+    每種排行榜（等級、簽到積分、遊戲勝率、訊息數…）由 cog 以 register 註冊數據來源，
+    每個伺服器的排行榜在第一次使用時建立，之後由 cog 在分數變動時呼叫 update 增量維護。
+    用戶名稱優先從成員快取取得，其餘以批次查詢並快取。
+    """
+
+    def __init__(self, bot, name_ttl=600, name_cache_size=10000):
+        self.bot = bot
+        self.name_ttl = name_ttl  # 查詢到的用戶名稱快取時間（秒）
+        self.name_cache_size = name_cache_size  # 名稱快取上限，超過時先清除過期項目，再移除最舊的項目
+        self._sources = {}  # {排行榜名稱: source(guild_id) -> [(用戶 ID, 分數)]}
+        self._boards = {}  # {(guild_id, 排行榜名稱): SortedRanking}
+        self._names = {}  # {user_id: (過期時間, 名稱)}，依寫入順序排列
+
+    def register(self, name, source):
+        """註冊排行榜的數據來源，並丟棄以舊來源建立的排行榜"""
+        self._sources[name] = source
+        for key in [key for key in self._boards if key[1] == name]:
+            del self._boards[key]
+
+    def board(self, guild_id, name):
+        """獲取伺服器的排行榜（第一次使用時從數據來源建立）"""
+        key = (str(guild_id), name)
+        ranking = self._boards.get(key)
+        if ranking is None:
+            ranking = SortedRanking(self._sources[name](str(guild_id)))
+            self._boards[key] = ranking
+        return ranking
+
+    def rank(self, guild_id, name, user_id):
+        """回傳用戶排名（從 1 開始），排行榜未註冊或用戶不在排名中時回傳 0"""
+        if name not in self._sources:
+            return 0
+        return self.board(guild_id, name).rank(user_id)
+
+    def update(self, guild_id, name, user_id, score):
+        """更新用戶分數（排行榜尚未建立時忽略，建立時會從數據讀取）"""
+        ranking = self._boards.get((str(guild_id), name))
+        if ranking is not None:
+            ranking.update(user_id, score)
+
+    def remove(self, guild_id, name, user_id):
+        """從排行榜移除用戶"""
+        ranking = self._boards.get((str(guild_id), name))
+        if ranking is not None:
+            ranking.remove(user_id)
+
+    def invalidate(self, guild_id, name):
+        """數據被大量修改後丟棄排行榜，下次使用時重建"""
+        self._boards.pop((str(guild_id), name), None)
+
+    async def resolve_names(self, guild, user_ids):
+        """解析用戶顯示名稱 {user_id: 名稱}
+
+        依序使用：伺服器成員快取 → 用戶快取 → 名稱快取 → 批次查詢成員 → 並行查詢用戶。
+        找不到的用戶不會出現在結果中。
+        """
+        names = {}
+        missing = []
+        now = time.monotonic()
+        for user_id in map(str, user_ids):
+            member = guild.get_member(int(user_id)) if guild else None
+            if member:
+                names[user_id] = member.display_name
+                continue
+            user = self.bot.get_user(int(user_id))
+            if user:
+                names[user_id] = user.display_name
+                continue
+            cached = self._names.get(user_id)
+            if cached and cached[0] > now:
+                names[user_id] = cached[1]
+                continue
+            missing.append(user_id)
+
+        if missing and guild:
+            # 透過 gateway 批次查詢成員（每次最多 100 個）
+            for i in range(0, len(missing), 100):
+                chunk = missing[i:i + 100]
+                try:
+                    members = await guild.query_members(user_ids=[int(uid) for uid in chunk], limit=len(chunk))
+                except Exception:
+                    continue
+                for member in members:
+                    self._remember(names, str(member.id), member.display_name, now)
+            missing = [uid for uid in missing if uid not in names]
+
+        if missing:
+            # 已離開伺服器的用戶：並行查詢
+            results = await asyncio.gather(
+                *[self.bot.fetch_user(int(uid)) for uid in missing],
+                return_exceptions=True
+            )
+            for user_id, user in zip(missing, results):
+                if not isinstance(user, Exception):
+                    self._remember(names, user_id, user.display_name, now)
+
+        return names
+
+    def _remember(self, names, user_id, name, now):
+        names[user_id] = name
+        # 重新插入，讓字典順序保持為寫入（過期）順序
+        self._names.pop(user_id, None)
+        self._names[user_id] = (now + self.name_ttl, name)
+        if len(self._names) > self.name_cache_size:
+            self._prune_names(now)
+
+    def _prune_names(self, now):
+        """清除過期的名稱，仍超過上限時移除最舊的項目"""
+        for user_id in [uid for uid, (expires, _) in self._names.items() if expires <= now]:
+            del self._names[user_id]
+        while len(self._names) > self.name_cache_size:
+            del self._names[next(iter(self._names))]
@@ -0,0 +1,153 @@
+import time
+
+# 各階段的執行順序（數字小的先執行），未列出的階段排在最後
+STAGE_ORDER = {
+    'security': 0,  # 違禁詞檢查必須最先執行，刪除訊息後停止其餘階段
+    'tickets': 10,
+    'statistics': 20,
+    'leveling': 30,
+    'custom_commands': 40,
+    'auto_reply': 50,
+}
+DEFAULT_STAGE_ORDER = 100
+
+
+class MessageContext:
+    """單則訊息的唯讀上下文
+
+    每則訊息只建立一次，所有階段共用：作者、頻道、伺服器 ID（字串）、
+    小寫內容、角色 ID 集合，以及伺服器設定文件的存取。
+    """
+
+    __slots__ = (
+        'message', 'guild', 'author', 'guild_id', 'channel_id', 'author_id',
+        'content', 'content_lower', 'role_ids', '_store', '_configs'
+    )
+
+    def __init__(self, message, data_store):
+        setattr_ = object.__setattr__
+        setattr_(self, 'message', message)
+        setattr_(self, 'guild', message.guild)
+        setattr_(self, 'author', message.author)
+        setattr_(self, 'guild_id', str(message.guild.id))
+        setattr_(self, 'channel_id', str(message.channel.id))
+        setattr_(self, 'author_id', str(message.author.id))
+        setattr_(self, 'content', message.content or '')
+        # 與違禁詞匹配器、自動回覆引擎相同，大小寫不敏感的比對使用 str.lower()
+        setattr_(self, 'content_lower', self.content.lower())
+        setattr_(self, 'role_ids', frozenset(str(role.id) for role in getattr(message.author, 'roles', ())))
+        setattr_(self, '_store', data_store)
+        setattr_(self, '_configs', {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MessageContext 為唯讀物件")
+
+    def config(self, name, default=None):
+        """獲取本伺服器的設定文件（同一則訊息內只查詢一次）"""
+        doc = self._configs.get(name)
+        if doc is None:
+            doc = self._configs[name] = self._store.get(self.guild_id, name, default)
+        return doc
+
+
+class MessagePipeline:
+    """訊息處理管線
+
+    取代各 cog 各自註冊的 on_message：機器人與私訊只在這裡過濾一次，
+    每則訊息建立一個 MessageContext，再依 STAGE_ORDER 依序執行已註冊的階段。
+    階段為 `async def handler(ctx)`，回傳 True 表示訊息已被處理掉（例如被刪除），
+    後續階段不再執行。每個階段的執行次數與耗時都會記錄。
+
+    註冊時可列出階段讀取的伺服器文件（documents），伺服器的第一則訊息會先在
+    數據存儲的執行緒中載入這些文件，冷讀取不阻塞事件循環。
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._stages = []  # [(順序, 名稱, handler)]
+        self._timings = {}  # {名稱: [次數, 總耗時, 最大耗時]}（秒）
+        self._documents = {}  # {名稱: 階段讀取的伺服器文件}
+        self._warm = set()  # 文件已載入的伺服器 ID
+        self.metrics = getattr(bot, 'metrics', None)  # 另記錄延遲直方圖（/metrics）
+        self.processed = 0
+        self.stopped = 0
+
+    def register(self, name, handler, order=None, documents=()):
+        """註冊處理階段（同名階段會被替換）"""
+        if order is None:
+            order = STAGE_ORDER.get(name, DEFAULT_STAGE_ORDER)
+        # 建立新列表而非原地修改，正在處理中的訊息不受影響
+        stages = [stage for stage in self._stages if stage[1] != name]
+        stages.append((order, name, handler))
+        self._stages = sorted(stages, key=lambda stage: (stage[0], stage[1]))
+        self._timings.setdefault(name, [0, 0.0, 0.0])
+        self._documents[name] = tuple(documents)
+        self._warm = set()
+
+    def unregister(self, name):
+        """移除處理階段（cog 卸載時呼叫）"""
+        self._stages = [stage for stage in self._stages if stage[1] != name]
+        self._documents.pop(name, None)
+
+    async def _preload(self, guild_id):
+        """在數據存儲的執行緒中載入各階段讀取的文件"""
+        names = {name for documents in self._documents.values() for name in documents}
+        try:
+            await self.bot.data_store.preload(guild_id, names)
+        except Exception as e:
+            print(f"⚠️  預先載入伺服器 {guild_id} 的數據失敗: {e}")
+            return
+        self._warm.add(guild_id)
+
+    @property
+    def stage_names(self):
+        return [name for _, name, _ in self._stages]
+
+    async def process(self, message):
+        """執行所有階段，回傳訊息是否被某個階段停止"""
+        if message.author.bot or not message.guild:
+            return False
+
+        ctx = MessageContext(message, self.bot.data_store)
+        self.processed += 1
+        if ctx.guild_id not in self._warm:
+            await self._preload(ctx.guild_id)
+        for _, name, handler in self._stages:
+            start = time.perf_counter()
+            try:
+                stop = await handler(ctx)
+            except Exception as e:
+                print(f"❌ 訊息處理階段 {name} 發生錯誤: {e}")
+                stop = False
+            finally:
+                elapsed = time.perf_counter() - start
+                timing = self._timings[name]
+                timing[0] += 1
+                timing[1] += elapsed
+                if elapsed > timing[2]:
+                    timing[2] = elapsed
+                if self.metrics is not None:
+                    self.metrics.stages.observe((name,), elapsed)
+            if stop:
+                self.stopped += 1
+                return True
+        return False
+
+    def stats(self):
+        """各階段的耗時統計 {名稱: {'calls', 'total_ms', 'avg_ms', 'max_ms'}}"""
+        result = {}
+        for name, (calls, total, peak) in self._timings.items():
+            result[name] = {
+                'calls': calls,
+                'total_ms': total * 1000,
+                'avg_ms': total * 1000 / calls if calls else 0.0,
+                'max_ms': peak * 1000,
+            }
+        return result
+
+    def reset_stats(self):
+        """清除耗時統計"""
+        for name in self._timings:
+            self._timings[name] = [0, 0.0, 0.0]
+        self.processed = 0
+        self.stopped = 0
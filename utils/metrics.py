@@ -0,0 +1,191 @@
+import time
+from bisect import bisect_left
+
+# 延遲直方圖的桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """單一標籤組合的延遲直方圖（記錄只需一次二分搜尋與幾次加法）"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'max')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後一格為 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """以桶的上限估算分位數（不超過實際最大值）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class HistogramFamily:
+    """同一名稱、不同標籤值的直方圖"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.children = {}  # {標籤值 tuple: Histogram}
+
+    def observe(self, labels, value):
+        child = self.children.get(labels)
+        if child is None:
+            child = self.children[labels] = Histogram(self.buckets)
+        child.observe(value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, child in sorted(self.children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            le = 'le="+Inf"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {child.count}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {child.sum}')
+            lines.append(f'{self.name}_count{label_text} {child.count}')
+        return lines
+
+
+class CounterFamily:
+    """同一名稱、不同標籤值的計數器"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.children = {}  # {標籤值 tuple: 數值}
+
+    def inc(self, labels, amount=1):
+        self.children[labels] = self.children.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.children.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Metrics:
+    """效能指標
+
+    記錄事件處理函數、斜線命令、數據讀寫與 Discord API 請求的次數與延遲直方圖，
+    以 Prometheus 文字格式輸出（網頁伺服器的 /metrics），
+    並提供依總耗時排序的摘要（終端 status 命令與開發者面板）。
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.families = {}
+        self.events = self.histogram(
+            'bot_event_handler_seconds', '事件處理函數（含各 cog 的 listener）耗時', ('event', 'handler'))
+        self.commands = self.histogram(
+            'bot_app_command_seconds', '斜線命令耗時', ('command', 'status'))
+        self.storage = self.histogram(
+            'bot_storage_seconds', '數據文件讀取與批次寫入耗時', ('op',))
+        self.storage_documents = self.counter(
+            'bot_storage_documents_total', '讀取或寫入的數據文件數量', ('op',))
+        self.http = self.histogram(
+            'bot_http_request_seconds', 'Discord API 請求耗時', ('method', 'route'))
+        self.http_errors = self.counter(
+            'bot_http_request_errors_total', 'Discord API 請求錯誤次數', ('method', 'route', 'status'))
+        self.stages = self.histogram(
+            'bot_message_stage_seconds', '訊息管線各階段耗時', ('stage',))
+
+    def histogram(self, name, help_text, labelnames, buckets=DEFAULT_BUCKETS):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = HistogramFamily(name, help_text, labelnames, buckets)
+        return family
+
+    def counter(self, name, help_text, labelnames):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = CounterFamily(name, help_text, labelnames)
+        return family
+
+    def render(self):
+        """Prometheus 文字格式"""
+        lines = [
+            '# HELP bot_uptime_seconds 機器人運行時間',
+            '# TYPE bot_uptime_seconds gauge',
+            f'bot_uptime_seconds {time.time() - self.started_at}',
+        ]
+        for family in self.families.values():
+            if family.children:
+                lines.extend(family.render())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, limit=10):
+        """依總耗時排序的直方圖摘要 [{'metric', 'labels', 'count', 'avg_ms', 'p99_ms', 'max_ms', 'total_ms'}]"""
+        rows = []
+        for family in self.families.values():
+            if family.kind != 'histogram':
+                continue
+            for labels, child in family.children.items():
+                rows.append({
+                    'metric': family.name,
+                    'labels': ' '.join(str(value) for value in labels),
+                    'count': child.count,
+                    'avg_ms': child.sum * 1000 / child.count if child.count else 0.0,
+                    'p99_ms': child.quantile(0.99) * 1000,
+                    'max_ms': child.max * 1000,
+                    'total_ms': child.sum * 1000,
+                })
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows[:limit] if limit else rows
+
+
+def instrument_http(http, metrics):
+    """包裝 discord.py 的 HTTPClient.request，記錄每個 API 路由的耗時與錯誤"""
+    original_request = http.request
+
+    async def request(route, **kwargs):
+        labels = (route.method, route.path)
+        start = time.perf_counter()
+        try:
+            return await original_request(route, **kwargs)
+        except Exception as e:
+            metrics.http_errors.inc(labels + (str(getattr(e, 'status', type(e).__name__)),))
+            raise
+        finally:
+            metrics.http.observe(labels, time.perf_counter() - start)
+
+    http.request = request
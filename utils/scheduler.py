@@ -0,0 +1,155 @@
+import asyncio
+import heapq
+import secrets
+import time
+
+# 單次等待的最長時間（秒），避免系統時間調整後長時間不醒來
+MAX_SLEEP = 300
+
+
+class Scheduler:
+    """持久化的排程服務
+
+    所有延遲執行的工作（提醒、倒數計時、定時消息、投票到期、臨時語音清理）
+    都是一筆小記錄 {id, kind, run_at, user_id, guild_id, payload}，
+    保存在全局文件 `scheduled_jobs`，啟動時重新載入。記憶體中以最小堆依到期時間排序，
+    只有一個計時任務等待最早到期的工作，不再為每個工作保留一個睡眠中的協程。
+
+    各 cog 以 `register(kind, handler)` 註冊處理函數 `async def handler(job)`；
+    到期時該類型尚未註冊（cog 還沒載入）的工作會保留，註冊後再執行。
+    重啟期間已過期的工作會在機器人就緒後立即補執行。
+    """
+
+    name = 'scheduled_jobs'
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._jobs = bot.data_store.get(None, self.name)  # {job_id: 工作記錄}
+        self._heap = [(job['run_at'], job_id) for job_id, job in self._jobs.items()]
+        heapq.heapify(self._heap)
+        self._handlers = {}  # {kind: handler}
+        self._parked = {}  # {kind: [job_id]} 到期但尚無處理函數的工作
+        self._running = set()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def register(self, kind, handler):
+        """註冊工作類型的處理函數"""
+        self._handlers[kind] = handler
+        for job_id in self._parked.pop(kind, []):
+            job = self._jobs.get(job_id)
+            if job is not None:
+                heapq.heappush(self._heap, (job['run_at'], job_id))
+        self._wakeup.set()
+
+    def unregister(self, kind):
+        """移除處理函數（cog 卸載時呼叫），該類型的工作保留到重新註冊"""
+        self._handlers.pop(kind, None)
+
+    def schedule(self, kind, run_at, payload=None, user_id=None, guild_id=None):
+        """新增工作，run_at 為 UNIX 時間戳（秒），回傳工作 ID"""
+        job_id = secrets.token_hex(4)
+        while job_id in self._jobs:
+            job_id = secrets.token_hex(4)
+        self._jobs[job_id] = {
+            'id': job_id,
+            'kind': kind,
+            'run_at': float(run_at),
+            'user_id': str(user_id) if user_id is not None else None,
+            'guild_id': str(guild_id) if guild_id is not None else None,
+            'payload': payload or {},
+        }
+        heapq.heappush(self._heap, (float(run_at), job_id))
+        self._save()
+        # 新工作比目前等待的更早到期時，喚醒計時任務重新計算
+        if self._heap[0][1] == job_id:
+            self._wakeup.set()
+        return job_id
+
+    def cancel(self, job_id):
+        """取消工作，回傳被取消的工作記錄（不存在時為 None）
+
+        堆中的項目不立即移除，到期時發現記錄已不存在便直接略過。
+        """
+        job = self._jobs.pop(job_id, None)
+        if job is not None:
+            self._save()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self, kind=None, user_id=None, guild_id=None):
+        """依條件列出工作（依到期時間排序）"""
+        result = [
+            job for job in self._jobs.values()
+            if (kind is None or job['kind'] == kind)
+            and (user_id is None or job['user_id'] == str(user_id))
+            and (guild_id is None or job['guild_id'] == str(guild_id))
+        ]
+        result.sort(key=lambda job: job['run_at'])
+        return result
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _save(self):
+        self.bot.data_store.mark_dirty(None, self.name)
+
+    async def _run(self, job):
+        try:
+            await self._handlers[job['kind']](job)
+        except Exception as e:
+            print(f"❌ 排程工作 {job['kind']} ({job['id']}) 執行失敗: {e}")
+
+    def _dispatch(self, run_at, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job['run_at'] != run_at:
+            return
+        if job['kind'] not in self._handlers:
+            self._parked.setdefault(job['kind'], []).append(job_id)
+            return
+        # 先移除記錄再執行，處理函數失敗也不會在重啟後重複執行
+        del self._jobs[job_id]
+        self._save()
+        task = asyncio.create_task(self._run(job))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _timer_loop(self):
+        """單一計時任務：等待最早到期的工作"""
+        await self.bot.wait_until_ready()
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                run_at, job_id = heapq.heappop(self._heap)
+                self._dispatch(run_at, job_id)
+            # 丟棄堆頂已取消的項目
+            while self._heap and self._heap[0][1] not in self._jobs:
+                heapq.heappop(self._heap)
+
+            timeout = MAX_SLEEP
+            if self._heap:
+                timeout = min(max(self._heap[0][0] - time.time(), 0), MAX_SLEEP)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """啟動計時任務"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._timer_loop())
+
+    async def close(self, timeout=5):
+        """停止計時任務並等待執行中的工作（未到期的工作已保存，下次啟動繼續）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._running:
+            await asyncio.wait(list(self._running), timeout=timeout)
@@ -0,0 +1,215 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from utils.fileio import atomic_write
+
+
+class StorageWriteError(Exception):
+    """批次寫入時部分文件失敗，failed 為失敗的 (guild_id, name) 列表"""
+
+    def __init__(self, failed, errors):
+        self.failed = failed
+        super().__init__(f"{len(failed)} 個文件寫入失敗: " + '; '.join(errors))
+
+
+class JsonBackend:
+    """JSON 文件存儲後端（原本的 `data/` 目錄結構）
+
+    伺服器文件位於 `data/<guild_id>/<name>.json`，
+    全域文件（guild_id 為 None）位於 `data/<name>.json`。
+    寫入為原子操作，可選擇保留多代 `.bak.N` 備份。
+    """
+
+    name = 'json'
+
+    def __init__(self, data_dir='data', backups=0):
+        self.data_dir = data_dir
+        self.backups = backups  # 每個文件保留的備份數量
+        os.makedirs(self.data_dir, exist_ok=True)
+
+    def get_path(self, guild_id, name):
+        """獲取文件在磁碟上的路徑"""
+        if guild_id is None:
+            return os.path.join(self.data_dir, f'{name}.json')
+        return os.path.join(self.data_dir, str(guild_id), f'{name}.json')
+
+    def load(self, guild_id, name):
+        """讀取文件，不存在時回傳 None"""
+        path = self.get_path(guild_id, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def exists(self, guild_id, name):
+        """檢查文件是否存在"""
+        return os.path.exists(self.get_path(guild_id, name))
+
+    def list_names(self, guild_id):
+        """列出伺服器的所有文件名稱"""
+        folder = os.path.join(self.data_dir, str(guild_id))
+        if not os.path.isdir(folder):
+            return set()
+        return {f[:-5] for f in os.listdir(folder) if f.endswith('.json')}
+
+    def list_guilds(self):
+        """列出所有有數據文件的伺服器 ID"""
+        return {
+            entry for entry in os.listdir(self.data_dir)
+            if entry.isdigit() and os.path.isdir(os.path.join(self.data_dir, entry))
+        }
+
+    def write(self, payloads):
+        """寫入多個已序列化的文件 [(guild_id, name, text)]
+
+        每個文件各自寫入，單一文件失敗不影響其他文件；
+        全部嘗試後若有失敗，拋出 StorageWriteError 並附上失敗的文件。
+        """
+        failed, errors = [], []
+        for guild_id, name, text in payloads:
+            path = self.get_path(guild_id, name)
+            try:
+                atomic_write(path, text, backups=self.backups)
+            except Exception as e:
+                failed.append((guild_id, name))
+                errors.append(f"{path}: {e}")
+        if failed:
+            raise StorageWriteError(failed, errors)
+
+    def close(self):
+        pass
+
+
+class SqliteBackend:
+    """SQLite 存儲後端
+
+    每個文件存為 `documents` 表中的一列，以 (guild_id, name) 為主鍵，
+    全域文件的 guild_id 為空字串。整個進程只使用一個連線（WAL 模式），
+    批次寫入在同一個交易中完成，不會留下寫到一半的文件。
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path='data/bot.db'):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS documents ('
+            'guild_id TEXT NOT NULL, '
+            'name TEXT NOT NULL, '
+            'data TEXT NOT NULL, '
+            'updated_at TEXT NOT NULL, '
+            'PRIMARY KEY (guild_id, name))'
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _gid(guild_id):
+        return '' if guild_id is None else str(guild_id)
+
+    def load(self, guild_id, name):
+        """讀取文件，不存在時回傳 None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM documents WHERE guild_id = ? AND name = ?',
+                (self._gid(guild_id), name)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def exists(self, guild_id, name):
+        """檢查文件是否存在"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM documents WHERE guild_id = ? AND name = ?',
+                (self._gid(guild_id), name)
+            ).fetchone()
+        return row is not None
+
+    def list_names(self, guild_id):
+        """列出伺服器的所有文件名稱"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT name FROM documents WHERE guild_id = ?',
+                (self._gid(guild_id),)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def list_guilds(self):
+        """列出所有有數據文件的伺服器 ID"""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT guild_id FROM documents WHERE guild_id != ''").fetchall()
+        return {row[0] for row in rows}
+
+    def write(self, payloads):
+        """在單一交易中寫入多個已序列化的文件 [(guild_id, name, text)]"""
+        now = datetime.now().isoformat()
+        rows = [(self._gid(guild_id), name, text, now) for guild_id, name, text in payloads]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO documents (guild_id, name, data, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(guild_id, name) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at',
+                rows
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_backend(kind='json', data_dir='data', sqlite_path=None, backups=0):
+    """依設定建立存儲後端（json 或 sqlite）"""
+    kind = (kind or 'json').lower()
+    if kind == 'sqlite':
+        return SqliteBackend(sqlite_path or os.path.join(data_dir, 'bot.db'))
+    if kind != 'json':
+        print(f"⚠️  未知的數據存儲後端 {kind}，使用 JSON")
+    return JsonBackend(data_dir, backups=backups)
+
+
+def migrate_json_to_sqlite(data_dir='data', sqlite_path=None, overwrite=False):
+    """將 `data/` 目錄中的 JSON 文件匯入 SQLite 數據庫
+
+    Returns:
+        tuple: (匯入數量, 略過數量, 失敗的文件列表)
+    """
+    source = JsonBackend(data_dir)
+    target = SqliteBackend(sqlite_path or os.path.join(data_dir, 'bot.db'))
+    imported, skipped, failed = 0, 0, []
+
+    # 全域文件 + 各伺服器目錄
+    documents = []
+    for entry in sorted(os.listdir(data_dir)):
+        path = os.path.join(data_dir, entry)
+        if entry.endswith('.json') and os.path.isfile(path):
+            documents.append((None, entry[:-5]))
+        elif os.path.isdir(path):
+            for name in sorted(source.list_names(entry)):
+                documents.append((entry, name))
+
+    try:
+        payloads = []
+        for guild_id, name in documents:
+            if not overwrite and target.exists(guild_id, name):
+                skipped += 1
+                continue
+            try:
+                data = source.load(guild_id, name)
+            except Exception as e:
+                failed.append((source.get_path(guild_id, name), str(e)))
+                continue
+            payloads.append((guild_id, name, json.dumps(data, ensure_ascii=False)))
+            imported += 1
+        target.write(payloads)
+    finally:
+        target.close()
+
+    return imported, skipped, failed
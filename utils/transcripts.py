@@ -0,0 +1,338 @@
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime
+from html import escape
+
+# 每頁顯示的消息數量（網頁後台分頁查看聊天記錄）
+TRANSCRIPT_PAGE_SIZE = 500
+# 串流輸出時每批 HTML 的大約大小
+RENDER_BATCH_BYTES = 64 * 1024
+
+TRANSCRIPT_CSS = '''
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+        body {
+            font-family: 'Segoe UI', 'Microsoft JhengHei', sans-serif;
+            background: #36393f;
+            color: #dcddde;
+            padding: 20px;
+        }
+        .container {
+            max-width: 1200px;
+            margin: 0 auto;
+            background: #2f3136;
+            border-radius: 8px;
+            padding: 20px;
+        }
+        .header {
+            border-bottom: 2px solid #202225;
+            padding-bottom: 15px;
+            margin-bottom: 20px;
+        }
+        .header h1 {
+            color: #ffffff;
+            font-size: 24px;
+            margin-bottom: 5px;
+        }
+        .header .info {
+            color: #b9bbbe;
+            font-size: 14px;
+        }
+        .message {
+            display: flex;
+            padding: 10px 0;
+            border-bottom: 1px solid #2d2d2d;
+        }
+        .message:hover {
+            background: #32353b;
+        }
+        .avatar {
+            width: 40px;
+            height: 40px;
+            border-radius: 50%;
+            margin-right: 15px;
+            flex-shrink: 0;
+        }
+        .message-content {
+            flex: 1;
+        }
+        .message-header {
+            display: flex;
+            align-items: baseline;
+            margin-bottom: 5px;
+        }
+        .username {
+            font-weight: 600;
+            color: #ffffff;
+            margin-right: 8px;
+        }
+        .timestamp {
+            font-size: 12px;
+            color: #72767d;
+        }
+        .text {
+            color: #dcddde;
+            line-height: 1.5;
+            word-wrap: break-word;
+        }
+        .embed {
+            background: #2f3136;
+            border-left: 4px solid #5865f2;
+            padding: 10px;
+            margin-top: 5px;
+            border-radius: 4px;
+        }
+        .attachment {
+            margin-top: 5px;
+            max-width: 400px;
+        }
+        .attachment img {
+            max-width: 100%;
+            border-radius: 4px;
+        }
+        .system-message {
+            background: #2d2d2d;
+            padding: 8px 12px;
+            border-left: 4px solid #faa61a;
+            margin: 10px 0;
+            border-radius: 4px;
+            font-size: 14px;
+            color: #b9bbbe;
+        }
+        .pager {
+            display: flex;
+            justify-content: space-between;
+            margin: 15px 0;
+        }
+        .pager a {
+            color: #00aff4;
+        }
+'''
+
+
+def transcript_dir(guild_id, data_dir='data'):
+    return os.path.join(data_dir, str(guild_id), 'ticket')
+
+
+def transcript_path(guild_id, ticket_id, channel_name, data_dir='data'):
+    """聊天記錄文件路徑（壓縮的 NDJSON）"""
+    return os.path.join(transcript_dir(guild_id, data_dir), f'{channel_name}-{ticket_id}.ndjson.gz')
+
+
+def legacy_transcript_path(guild_id, ticket_id, channel_name, data_dir='data'):
+    """舊版 HTML 聊天記錄文件路徑"""
+    return os.path.join(transcript_dir(guild_id, data_dir), f'{channel_name}-{ticket_id}.html')
+
+
+def rendered_cache_path(guild_id, ticket_id, channel_name, data_dir='data'):
+    """已關閉客服單渲染後的 HTML 快取路徑"""
+    return os.path.join(transcript_dir(guild_id, data_dir), '.rendered', f'{channel_name}-{ticket_id}.html')
+
+
+def encode_record(record):
+    """將一筆記錄編碼為 NDJSON 的一行"""
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def header_record(ticket_id, channel_name, user):
+    return {
+        'type': 'header',
+        'ticket_id': ticket_id,
+        'channel_name': channel_name,
+        'creator': f'{user.name}#{user.discriminator}',
+        'creator_id': str(user.id),
+        'created_at': datetime.now().isoformat(),
+    }
+
+
+def message_record(message):
+    """將 Discord 消息轉換為聊天記錄的一筆記錄"""
+    avatar = message.author.display_avatar
+    return {
+        'type': 'message',
+        'id': str(message.id),
+        'author': message.author.name,
+        'author_id': str(message.author.id),
+        'avatar': avatar.url if avatar else None,
+        'timestamp': message.created_at.isoformat(),
+        'content': message.content,
+        'attachments': [
+            {'url': a.url, 'filename': a.filename, 'content_type': a.content_type}
+            for a in message.attachments
+        ],
+        'embeds': [
+            {'title': e.title, 'description': e.description}
+            for e in message.embeds if e.title or e.description
+        ],
+    }
+
+
+def closed_record():
+    return {'type': 'closed', 'closed_at': datetime.now().isoformat()}
+
+
+def read_records(path):
+    """逐筆讀取聊天記錄
+
+    文件由多個 gzip 成員串接而成（每次追加寫入一個），
+    最後一個成員若因異常中斷而不完整，讀到該處為止。
+    """
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except (EOFError, zlib.error, gzip.BadGzipFile):
+        return
+
+
+def _format_time(value):
+    try:
+        return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return value or ''
+
+
+def render_header(header):
+    """渲染聊天記錄的 HTML 開頭"""
+    ticket_id = escape(str(header.get('ticket_id', '')))
+    channel_name = escape(str(header.get('channel_name', '')))
+    return f'''<!DOCTYPE html>
+<html lang="zh-TW">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>客服單 #{ticket_id} - {channel_name}</title>
+    <style>{TRANSCRIPT_CSS}    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🎫 客服單 #{ticket_id}</h1>
+            <div class="info">
+                <strong>頻道名稱：</strong>{channel_name}<br>
+                <strong>創建者：</strong>{escape(str(header.get('creator', '')))}<br>
+                <strong>創建時間：</strong>{_format_time(header.get('created_at'))}
+            </div>
+        </div>
+        <div class="messages">
+'''
+
+
+def render_message(record):
+    """渲染單筆消息"""
+    avatar_url = escape(record.get('avatar') or "https://cdn.discordapp.com/embed/avatars/0.png")
+    parts = [f'''
+            <div class="message">
+                <img src="{avatar_url}" alt="Avatar" class="avatar">
+                <div class="message-content">
+                    <div class="message-header">
+                        <span class="username">{escape(record.get('author', ''))}</span>
+                        <span class="timestamp">{_format_time(record.get('timestamp'))}</span>
+                    </div>
+''']
+
+    content = record.get('content')
+    if content:
+        parts.append(f'                    <div class="text">{escape(content)}</div>\n')
+
+    for attachment in record.get('attachments', []):
+        url = escape(attachment.get('url', ''))
+        content_type = attachment.get('content_type') or ''
+        if content_type.startswith('image/'):
+            parts.append(f'                    <div class="attachment"><img src="{url}" alt="附件"></div>\n')
+        else:
+            parts.append(f'                    <div class="attachment"><a href="{url}">{escape(attachment.get("filename", ""))}</a></div>\n')
+
+    for embed in record.get('embeds', []):
+        parts.append('                    <div class="embed">\n')
+        if embed.get('title'):
+            parts.append(f'                        <strong>{escape(embed["title"])}</strong><br>\n')
+        if embed.get('description'):
+            parts.append(f'                        {escape(embed["description"])}<br>\n')
+        parts.append('                    </div>\n')
+
+    parts.append('''
+                </div>
+            </div>
+''')
+    return ''.join(parts)
+
+
+def render_footer(closed=None, pager=''):
+    """渲染聊天記錄的 HTML 結尾"""
+    closed_html = ''
+    if closed:
+        closed_html = f'''
+        <div class="system-message">
+            ✅ 客服單已於 {_format_time(closed.get('closed_at'))} 關閉
+        </div>'''
+    return f'''
+        </div>{pager}{closed_html}
+    </div>
+</body>
+</html>
+'''
+
+
+def render_html(records, page=None, page_size=TRANSCRIPT_PAGE_SIZE, page_url=None):
+    """將記錄逐段渲染為 HTML（產生器，每段約 RENDER_BATCH_BYTES）
+
+    page 為 None 時渲染全部消息；否則只渲染第 page 頁（從 0 開始），
+    並以 page_url(頁碼) 產生上一頁/下一頁連結。
+    """
+    header = None
+    closed = None
+    batch = []
+    size = 0
+    index = 0
+    has_next = False
+    start = page * page_size if page is not None else 0
+    end = start + page_size if page is not None else None
+
+    for record in records:
+        kind = record.get('type')
+        if kind == 'header' and header is None:
+            header = record
+            batch.append(render_header(header))
+            continue
+        if kind == 'closed':
+            closed = record
+            continue
+        if kind != 'message':
+            continue
+        if header is None:
+            header = {}
+            batch.append(render_header(header))
+        if end is not None and index >= end:
+            has_next = True
+            break
+        if index >= start:
+            html = render_message(record)
+            batch.append(html)
+            size += len(html)
+            if size >= RENDER_BATCH_BYTES:
+                yield ''.join(batch)
+                batch, size = [], 0
+        index += 1
+
+    if header is None:
+        batch.append(render_header({}))
+
+    pager = ''
+    if page is not None and page_url and (page > 0 or has_next):
+        prev_link = f'<a href="{escape(page_url(page - 1))}">« 上一頁</a>' if page > 0 else '<span></span>'
+        next_link = f'<a href="{escape(page_url(page + 1))}">下一頁 »</a>' if has_next else '<span></span>'
+        pager = f'\n        <div class="pager">{prev_link}{next_link}</div>'
+    batch.append(render_footer(closed, pager))
+    yield ''.join(batch)
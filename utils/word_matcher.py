@@ -0,0 +1,165 @@
+import re
+
+# 違禁詞少於此數量時，直接逐詞以 `in` 檢查比自動機更快
+SMALL_LIST_THRESHOLD = 32
+
+
+class AhoCorasick:
+    """Aho-Corasick 多模式字串匹配自動機
+
+    建立一次後，每次搜尋只需掃描文字一遍，耗時與模式數量無關。
+    words 為 (附帶值, 模式) 的序列，命中時回傳附帶值。
+    """
+
+    def __init__(self, words):
+        self._goto = [{}]  # 每個狀態的轉移表
+        self._fail = [0]
+        self._out = [[]]  # 在此狀態結束的模式的附帶值
+        self._link = [0]  # 失敗鏈上最近一個有輸出的狀態
+
+        for value, word in words:
+            if not word:
+                continue
+            state = 0
+            for char in word:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._link.append(0)
+                state = nxt
+            self._out[state].append(value)
+
+        # 廣度優先建立失敗指標與輸出鏈
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[nxt] = fail
+                self._link[nxt] = fail if self._out[fail] else self._link[fail]
+
+    def _states(self, text):
+        """逐字元推進自動機，產生每個位置的狀態"""
+        goto, fail = self._goto, self._fail
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            yield state
+
+    def search(self, text):
+        """回傳文字中最先結束的模式的附帶值，沒有則回傳 None"""
+        goto, fail, out, link = self._goto, self._fail, self._out, self._link
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                return out[state][0]
+            if link[state]:
+                return out[link[state]][0]
+        return None
+
+    def search_all(self, text):
+        """回傳文字中出現的所有模式的附帶值（集合）"""
+        out, link = self._out, self._link
+        found = set()
+        for state in self._states(text):
+            while state:
+                found.update(out[state])
+                state = link[state]
+        return found
+
+
+class BannedWordMatcher:
+    """預先編譯的違禁詞匹配器
+
+    - contains：Aho-Corasick 自動機（詞數很少時為預先轉換大小寫的詞列表）
+    - exact：雜湊表查詢
+    - regex：合併成單一正則表達式，命中後再找出是哪一條規則
+    """
+
+    def __init__(self, banned_words, case_sensitive=False, match_type="contains"):
+        self.case_sensitive = case_sensitive
+        self.match_type = match_type
+        self.size = len(banned_words)
+
+        if match_type == "exact":
+            self._exact = {}
+            for word in banned_words:
+                self._exact.setdefault(self._normalize(word), word)
+        elif match_type == "regex":
+            self._build_regex(banned_words)
+        elif len(banned_words) < SMALL_LIST_THRESHOLD:
+            self._automaton = None
+            self._small = [(word, self._normalize(word)) for word in banned_words if word]
+        else:
+            self._automaton = AhoCorasick((word, self._normalize(word)) for word in banned_words)
+
+    def _normalize(self, text):
+        return text if self.case_sensitive else text.lower()
+
+    def _build_regex(self, banned_words):
+        flags = 0 if self.case_sensitive else re.IGNORECASE
+        self._patterns = []  # [(原始詞, 已編譯規則)]，無效的規則略過
+        combinable = []
+        for word in banned_words:
+            try:
+                pattern = re.compile(word, flags)
+            except re.error:
+                continue
+            self._patterns.append((word, pattern))
+            # 含有分組的規則合併後編號會改變（例如反向引用），不合併
+            if pattern.groups == 0:
+                combinable.append(word)
+
+        self._combined = None
+        if combinable:
+            try:
+                self._combined = re.compile('|'.join(f'(?:{word})' for word in combinable), flags)
+            except re.error:
+                # 例如規則中含有只能放在開頭的行內旗標
+                self._combined = None
+        self._combined_words = set(combinable) if self._combined else set()
+
+    def find(self, content, content_lower=None):
+        """回傳命中的違禁詞，沒有則回傳 None
+
+        content_lower 為呼叫端已轉換好的小寫內容，提供時不再重複轉換。
+        """
+        if self.match_type == "regex":
+            if self._combined is not None and self._combined.search(content):
+                for word, pattern in self._patterns:
+                    if word in self._combined_words and pattern.search(content):
+                        return word
+            for word, pattern in self._patterns:
+                if word not in self._combined_words and pattern.search(content):
+                    return word
+            return None
+
+        if not self.case_sensitive and content_lower is not None:
+            normalized = content_lower
+        else:
+            normalized = self._normalize(content)
+
+        if self.match_type == "exact":
+            return self._exact.get(normalized)
+
+        if self._automaton is None:
+            for word, check_word in self._small:
+                if check_word in normalized:
+                    return word
+            return None
+        return self._automaton.search(normalized)
@@ -0,0 +1,77 @@
+from functools import lru_cache
+from math import isqrt
+
+# 預設經驗曲線：升到下一級所需經驗 = 100 + (等級 - 1) × 50
+DEFAULT_BASE = 100
+DEFAULT_STEP = 50
+
+
+class XPCurve:
+    """等級經驗曲線
+
+    等級 L 升到 L+1 需要 base + (L-1) × step 經驗，
+    因此到達等級 L 的累計經驗為 n × base + step × n(n-1)/2（n = L-1），
+    由總經驗反推等級只需解一次二次方程式，不必逐級累加。
+    """
+
+    def __init__(self, base=DEFAULT_BASE, step=DEFAULT_STEP):
+        base, step = int(base), int(step)
+        if base <= 0 or step < 0:
+            raise ValueError("經驗曲線的基礎經驗必須大於 0，每級增加量不可為負數")
+        self.base = base
+        self.step = step
+
+    def xp_for_level(self, level):
+        """計算從 level 升到下一級所需經驗"""
+        return self.base + (level - 1) * self.step
+
+    def total_xp_for_level(self, level):
+        """計算到達 level 所需的累計經驗"""
+        n = max(level - 1, 0)
+        return n * self.base + self.step * n * (n - 1) // 2
+
+    def level_for_xp(self, xp):
+        """根據總經驗計算等級"""
+        if xp < self.base:
+            return 1
+        if self.step == 0:
+            return 1 + xp // self.base
+        # step·n² + (2·base - step)·n - 2·xp = 0 的正根，取整後校正浮動誤差
+        b = 2 * self.base - self.step
+        n = (isqrt(b * b + 8 * self.step * xp) - b) // (2 * self.step)
+        while self.total_xp_for_level(n + 2) <= xp:
+            n += 1
+        while n > 0 and self.total_xp_for_level(n + 1) > xp:
+            n -= 1
+        return n + 1
+
+    def progress(self, xp):
+        """計算等級進度
+
+        Returns:
+            tuple: (等級, 本級已獲得經驗, 升到下一級所需經驗)
+        """
+        level = self.level_for_xp(xp)
+        return level, xp - self.total_xp_for_level(level), self.xp_for_level(level)
+
+    def to_dict(self):
+        return {'base': self.base, 'step': self.step}
+
+
+@lru_cache(maxsize=None)
+def _curve(base, step):
+    return XPCurve(base, step)
+
+
+DEFAULT_CURVE = _curve(DEFAULT_BASE, DEFAULT_STEP)
+
+
+def get_curve(data_store, guild_id):
+    """獲取伺服器的經驗曲線（`level_curve` 文件，未設定時使用預設曲線）"""
+    settings = data_store.get(guild_id, 'level_curve')
+    if not settings:
+        return DEFAULT_CURVE
+    try:
+        return _curve(int(settings.get('base', DEFAULT_BASE)), int(settings.get('step', DEFAULT_STEP)))
+    except (TypeError, ValueError):
+        return DEFAULT_CURVE
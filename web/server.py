@@ -4,8 +4,14 @@ from aiohttp_session.cookie_storage import EncryptedCookieStorage
 from cryptography import fernet
 import discord
 import os
+import asyncio
 import base64
-import json
+import copy
+import hmac
+import tempfile
+import time
+
+from utils import transcripts
 
 class WebServer:
     """網頁後台控制器"""
@@ -19,11 +25,24 @@ class WebServer:
         self.client_id = os.getenv('DISCORD_CLIENT_ID')
         self.client_secret = os.getenv('DISCORD_CLIENT_SECRET')
         self.redirect_uri = os.getenv('DISCORD_REDIRECT_URI', f'http://localhost:{port}/callback')
+        self.discord_api = os.getenv('DISCORD_API_BASE', 'https://discord.com/api').rstrip('/')
+        
+        # 共用的 HTTP 連線池（第一次使用時建立）
+        self.http_session = None
+        self.runner = None
+        
+        # 用戶伺服器列表快取 {access_token: (過期時間, 伺服器列表)}
+        self.guilds_cache_ttl = float(os.getenv('WEB_GUILDS_CACHE_TTL', 60))
+        self._guilds_cache = {}
+        self._guilds_inflight = {}  # 進行中的請求 {access_token: Task}
         
         # 開發者 ID
         dev_ids = os.getenv('DEV_ID', '')
         self.dev_ids = [int(id.strip()) for id in dev_ids.split(',') if id.strip()]
         
+        # /metrics 的存取令牌（留空則不驗證，請只在內網開放）
+        self.metrics_token = os.getenv('METRICS_TOKEN', '')
+        
         # Session 密鑰
         session_secret = os.getenv('SESSION_SECRET', fernet.Fernet.generate_key().decode())
         secret_key = base64.urlsafe_b64decode(session_secret.encode() if len(session_secret) == 44 else base64.urlsafe_b64encode(session_secret.encode()[:32]))
@@ -123,6 +142,10 @@ class WebServer:
         self.app.router.add_get('/api/dev/all-guilds', self.api_dev_all_guilds)
         self.app.router.add_get('/api/dev/guild-config/{guild_id}', self.api_dev_guild_config)
         self.app.router.add_get('/api/dev/guild-members/{guild_id}', self.api_dev_guild_members)
+        self.app.router.add_get('/api/dev/metrics', self.api_dev_metrics)
+        
+        # 效能指標（Prometheus 文字格式）
+        self.app.router.add_get('/metrics', self.metrics)
     
     async def index(self, request):
         """主頁"""
@@ -140,7 +163,7 @@ class WebServer:
     async def login(self, request):
         """Discord 登錄"""
         oauth_url = (
-            f"https://discord.com/api/oauth2/authorize"
+            f"{self.discord_api}/oauth2/authorize"
             f"?client_id={self.client_id}"
             f"&redirect_uri={self.redirect_uri}"
             f"&response_type=code"
@@ -156,38 +179,38 @@ class WebServer:
             return web.Response(text="錯誤：未提供授權碼", status=400)
         
         # 交換 access token
-        async with ClientSession() as session:
-            data = {
-                'client_id': self.client_id,
-                'client_secret': self.client_secret,
-                'grant_type': 'authorization_code',
-                'code': code,
-                'redirect_uri': self.redirect_uri
-            }
-            
-            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-            
-            async with session.post('https://discord.com/api/oauth2/token', data=data, headers=headers) as resp:
-                if resp.status != 200:
-                    return web.Response(text="登錄失敗", status=400)
-                
-                token_data = await resp.json()
-                access_token = token_data['access_token']
-            
-            # 獲取用戶資訊
-            headers = {'Authorization': f"Bearer {access_token}"}
-            async with session.get('https://discord.com/api/users/@me', headers=headers) as resp:
-                user_data = await resp.json()
+        http_session = await self.get_http_session()
+        data = {
+            'client_id': self.client_id,
+            'client_secret': self.client_secret,
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': self.redirect_uri
+        }
+        
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        
+        async with http_session.post(f'{self.discord_api}/oauth2/token', data=data, headers=headers) as resp:
+            if resp.status != 200:
+                return web.Response(text="登錄失敗", status=400)
             
-            # 儲存 session
-            session = await get_session(request)
-            session['user'] = {
-                'id': user_data['id'],
-                'username': user_data['username'],
-                'avatar': user_data.get('avatar'),
-                'discriminator': user_data.get('discriminator', '0')
-            }
-            session['access_token'] = access_token
+            token_data = await resp.json()
+            access_token = token_data['access_token']
+        
+        # 獲取用戶資訊
+        headers = {'Authorization': f"Bearer {access_token}"}
+        async with http_session.get(f'{self.discord_api}/users/@me', headers=headers) as resp:
+            user_data = await resp.json()
+        
+        # 儲存 session
+        session = await get_session(request)
+        session['user'] = {
+            'id': user_data['id'],
+            'username': user_data['username'],
+            'avatar': user_data.get('avatar'),
+            'discriminator': user_data.get('discriminator', '0')
+        }
+        session['access_token'] = access_token
         
         raise web.HTTPFound('/select-server')
     
@@ -242,12 +265,9 @@ class WebServer:
         bot_guild_ids = {str(guild.id) for guild in self.bot.guilds}
         
         # 獲取用戶的 Discord 伺服器
-        async with ClientSession() as client_session:
-            headers = {'Authorization': f"Bearer {access_token}"}
-            async with client_session.get('https://discord.com/api/users/@me/guilds', headers=headers) as resp:
-                if resp.status != 200:
-                    return web.json_response({'error': 'Failed to fetch guilds'}, status=500)
-                user_guilds = await resp.json()
+        user_guilds = await self.get_user_guilds(access_token)
+        if user_guilds is None:
+            return web.json_response({'error': 'Failed to fetch guilds'}, status=500)
         
         # 過濾有管理權限且機器人也在的伺服器
         accessible_guilds = []
@@ -327,14 +347,11 @@ class WebServer:
             return web.json_response({'error': 'Invalid data type'}, status=400)
         
         # 讀取數據文件
-        data_file = os.path.join('data', guild_id, f'{data_type}.json')
-        
-        if not os.path.exists(data_file):
+        if not self.bot.data_store.exists(guild_id, data_type):
             return web.json_response({'data': {}, 'exists': False})
         
         try:
-            with open(data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = await self.bot.data_store.load(guild_id, data_type)
             return web.json_response({'data': data, 'exists': True})
         except Exception as e:
             return web.json_response({'error': str(e)}, status=500)
@@ -362,22 +379,14 @@ class WebServer:
                 return web.json_response({'error': 'Invalid type'}, status=400)
             
             # 讀取現有設定
-            data_file = os.path.join('data', guild_id, 'welcome.json')
-            
-            if not os.path.exists(data_file):
-                # 創建預設設定
-                os.makedirs(os.path.dirname(data_file), exist_ok=True)
-                settings = {
-                    'welcome_enabled': False,
-                    'leave_enabled': False,
-                    'welcome_channel': None,
-                    'leave_channel': None,
-                    'welcome_message': '歡迎 {user} 加入 {server}！',
-                    'leave_message': '{username} 離開了伺服器'
-                }
-            else:
-                with open(data_file, 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
+            settings = await self.bot.data_store.load(guild_id, 'welcome', lambda: {
+                'welcome_enabled': False,
+                'leave_enabled': False,
+                'welcome_channel': None,
+                'leave_channel': None,
+                'welcome_message': '歡迎 {user} 加入 {server}！',
+                'leave_message': '{username} 離開了伺服器'
+            })
             
             # 更新設定
             if toggle_type == 'welcome':
@@ -386,8 +395,7 @@ class WebServer:
                 settings['leave_enabled'] = enabled
             
             # 儲存設定
-            with open(data_file, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'welcome', settings)
             
             return web.json_response({
                 'success': True,
@@ -415,22 +423,14 @@ class WebServer:
             data = await request.json()
             
             # 讀取現有設定
-            data_file = os.path.join('data', guild_id, 'welcome.json')
-            
-            if not os.path.exists(data_file):
-                # 創建預設設定
-                os.makedirs(os.path.dirname(data_file), exist_ok=True)
-                settings = {
-                    'welcome_enabled': False,
-                    'leave_enabled': False,
-                    'welcome_channel': None,
-                    'leave_channel': None,
-                    'welcome_message': '歡迎 {user} 加入 {server}！',
-                    'leave_message': '{username} 離開了伺服器'
-                }
-            else:
-                with open(data_file, 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
+            settings = await self.bot.data_store.load(guild_id, 'welcome', lambda: {
+                'welcome_enabled': False,
+                'leave_enabled': False,
+                'welcome_channel': None,
+                'leave_channel': None,
+                'welcome_message': '歡迎 {user} 加入 {server}！',
+                'leave_message': '{username} 離開了伺服器'
+            })
             
             # 更新設定（只更新提供的字段）
             if 'welcome_channel' in data:
@@ -443,8 +443,7 @@ class WebServer:
                 settings['leave_message'] = data['leave_message']
             
             # 儲存設定
-            with open(data_file, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'welcome', settings)
             
             return web.json_response({
                 'success': True,
@@ -467,14 +466,11 @@ class WebServer:
         if not await self.check_guild_permission(session.get('user')['id'], guild_id, session.get('access_token')):
             return web.json_response({'error': 'Forbidden'}, status=403)
         
-        data_file = os.path.join('data', guild_id, 'custom_commands.json')
-        
-        if not os.path.exists(data_file):
+        if not self.bot.data_store.exists(guild_id, 'custom_commands'):
             return web.json_response({'commands': {}})
         
         try:
-            with open(data_file, 'r', encoding='utf-8') as f:
-                commands = json.load(f)
+            commands = await self.bot.data_store.load(guild_id, 'custom_commands')
             return web.json_response({'commands': commands})
         except Exception as e:
             return web.json_response({'error': str(e)}, status=500)
@@ -500,14 +496,8 @@ class WebServer:
             if not command_name or not response:
                 return web.json_response({'error': 'Missing name or response'}, status=400)
             
-            data_file = os.path.join('data', guild_id, 'custom_commands.json')
-            os.makedirs(os.path.dirname(data_file), exist_ok=True)
-            
             # 讀取現有命令
-            commands = {}
-            if os.path.exists(data_file):
-                with open(data_file, 'r', encoding='utf-8') as f:
-                    commands = json.load(f)
+            commands = await self.bot.data_store.load(guild_id, 'custom_commands')
             
             # 檢查命令是否已存在
             if command_name in commands:
@@ -523,8 +513,7 @@ class WebServer:
             }
             
             # 儲存
-            with open(data_file, 'w', encoding='utf-8') as f:
-                json.dump(commands, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'custom_commands', commands)
             
             return web.json_response({'success': True, 'commands': commands})
         
@@ -553,13 +542,10 @@ class WebServer:
             if not new_response:
                 return web.json_response({'error': 'Missing response'}, status=400)
             
-            data_file = os.path.join('data', guild_id, 'custom_commands.json')
-            
-            if not os.path.exists(data_file):
+            if not self.bot.data_store.exists(guild_id, 'custom_commands'):
                 return web.json_response({'error': 'Commands file not found'}, status=404)
             
-            with open(data_file, 'r', encoding='utf-8') as f:
-                commands = json.load(f)
+            commands = await self.bot.data_store.load(guild_id, 'custom_commands')
             
             if command_name not in commands:
                 return web.json_response({'error': 'Command not found'}, status=404)
@@ -571,8 +557,7 @@ class WebServer:
             commands[command_name]['edited_at'] = datetime.utcnow().isoformat()
             
             # 儲存
-            with open(data_file, 'w', encoding='utf-8') as f:
-                json.dump(commands, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'custom_commands', commands)
             
             return web.json_response({'success': True, 'commands': commands})
         
@@ -595,13 +580,10 @@ class WebServer:
         command_name = request.match_info.get('command_name')
         
         try:
-            data_file = os.path.join('data', guild_id, 'custom_commands.json')
-            
-            if not os.path.exists(data_file):
+            if not self.bot.data_store.exists(guild_id, 'custom_commands'):
                 return web.json_response({'error': 'Commands file not found'}, status=404)
             
-            with open(data_file, 'r', encoding='utf-8') as f:
-                commands = json.load(f)
+            commands = await self.bot.data_store.load(guild_id, 'custom_commands')
             
             if command_name not in commands:
                 return web.json_response({'error': 'Command not found'}, status=404)
@@ -610,8 +592,7 @@ class WebServer:
             del commands[command_name]
             
             # 儲存
-            with open(data_file, 'w', encoding='utf-8') as f:
-                json.dump(commands, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'custom_commands', commands)
             
             return web.json_response({'success': True, 'commands': commands})
         
@@ -631,9 +612,7 @@ class WebServer:
         if not await self.check_guild_permission(session.get('user')['id'], guild_id, session.get('access_token')):
             return web.json_response({'error': 'Forbidden'}, status=403)
         
-        data_file = os.path.join('data', guild_id, 'temp_voice.json')
-        
-        if not os.path.exists(data_file):
+        if not self.bot.data_store.exists(guild_id, 'temp_voice'):
             return web.json_response({
                 'config': {
                     'enabled': False,
@@ -646,8 +625,7 @@ class WebServer:
             })
         
         try:
-            with open(data_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
+            config = await self.bot.data_store.load(guild_id, 'temp_voice')
             return web.json_response({'config': config})
         except Exception as e:
             return web.json_response({'error': str(e)}, status=500)
@@ -668,22 +646,15 @@ class WebServer:
         try:
             data = await request.json()
             
-            data_file = os.path.join('data', guild_id, 'temp_voice.json')
-            os.makedirs(os.path.dirname(data_file), exist_ok=True)
-            
             # 讀取現有配置
-            config = {
+            config = await self.bot.data_store.load(guild_id, 'temp_voice', lambda: {
                 'enabled': False,
                 'trigger_channel_id': None,
                 'category_id': None,
                 'channel_name_format': '{username} 的頻道',
                 'user_limit': 0,
                 'default_bitrate': 64000
-            }
-            
-            if os.path.exists(data_file):
-                with open(data_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+            })
             
             # 更新配置
             if 'enabled' in data:
@@ -706,10 +677,15 @@ class WebServer:
                 config['user_limit'] = data['user_limit']
             if 'default_bitrate' in data:
                 config['default_bitrate'] = data['default_bitrate']
+            if 'pool_size' in data:
+                try:
+                    config['pool_size'] = max(0, min(10, int(data['pool_size'])))
+                except (ValueError, TypeError):
+                    config['pool_size'] = 0
             
             # 儲存
-            with open(data_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'temp_voice', config)
+            self.invalidate_temp_voice_config(guild_id)
             
             return web.json_response({'success': True, 'config': config})
         
@@ -798,13 +774,9 @@ class WebServer:
                 return web.Response(text=html, content_type='text/html', status=404)
         else:
             # 非開發者需要有管理權限
-            access_token = session.get('access_token')
-            async with ClientSession() as client_session:
-                headers = {'Authorization': f"Bearer {access_token}"}
-                async with client_session.get('https://discord.com/api/users/@me/guilds', headers=headers) as resp:
-                    if resp.status != 200:
-                        raise web.HTTPFound('/select-server')
-                    user_guilds = await resp.json()
+            user_guilds = await self.get_user_guilds(session.get('access_token'))
+            if user_guilds is None:
+                raise web.HTTPFound('/select-server')
             
             # 檢查用戶是否在此伺服器且有管理權限
             for guild in user_guilds:
@@ -836,6 +808,7 @@ class WebServer:
     async def logout(self, request):
         """登出"""
         session = await get_session(request)
+        self._guilds_cache.pop(session.get('access_token'), None)
         session.clear()
         raise web.HTTPFound('/')
     
@@ -853,12 +826,10 @@ class WebServer:
             return web.json_response({'error': 'Forbidden'}, status=403)
         
         try:
-            file_path = f'./data/{guild_id}/warnings.json'
-            if not os.path.exists(file_path):
+            if not self.bot.data_store.exists(guild_id, 'warnings'):
                 return web.json_response({'warnings': {}})
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                warnings_data = json.load(f)
+            warnings_data = await self.bot.data_store.load(guild_id, 'warnings')
             
             # 獲取用戶信息
             guild = self.bot.get_guild(int(guild_id))
@@ -898,19 +869,16 @@ class WebServer:
         user_id = request.match_info['user_id']
         
         try:
-            file_path = f'./data/{guild_id}/warnings.json'
-            if not os.path.exists(file_path):
+            if not self.bot.data_store.exists(guild_id, 'warnings'):
                 return web.json_response({'success': True, 'message': '沒有警告記錄'})
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                warnings_data = json.load(f)
+            warnings_data = await self.bot.data_store.load(guild_id, 'warnings')
             
             if user_id in warnings_data:
                 warn_count = len(warnings_data[user_id])
                 del warnings_data[user_id]
                 
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(warnings_data, f, ensure_ascii=False, indent=4)
+                self.bot.data_store.set(guild_id, 'warnings', warnings_data)
                 
                 return web.json_response({
                     'success': True, 
@@ -938,12 +906,10 @@ class WebServer:
         user_id = request.match_info['user_id']
         
         try:
-            file_path = f'./data/{guild_id}/warnings.json'
-            if not os.path.exists(file_path):
+            if not self.bot.data_store.exists(guild_id, 'warnings'):
                 return web.json_response({'success': False, 'message': '沒有警告記錄'})
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                warnings_data = json.load(f)
+            warnings_data = await self.bot.data_store.load(guild_id, 'warnings')
             
             if user_id in warnings_data and len(warnings_data[user_id]) > 0:
                 removed = warnings_data[user_id].pop()
@@ -951,8 +917,7 @@ class WebServer:
                 if len(warnings_data[user_id]) == 0:
                     del warnings_data[user_id]
                 
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(warnings_data, f, ensure_ascii=False, indent=4)
+                self.bot.data_store.set(guild_id, 'warnings', warnings_data)
                 
                 return web.json_response({
                     'success': True, 
@@ -982,12 +947,10 @@ class WebServer:
         index = int(request.match_info['index'])
         
         try:
-            file_path = f'./data/{guild_id}/warnings.json'
-            if not os.path.exists(file_path):
+            if not self.bot.data_store.exists(guild_id, 'warnings'):
                 return web.json_response({'success': False, 'message': '沒有警告記錄'})
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                warnings_data = json.load(f)
+            warnings_data = await self.bot.data_store.load(guild_id, 'warnings')
             
             if user_id in warnings_data and len(warnings_data[user_id]) > index >= 0:
                 removed = warnings_data[user_id].pop(index)
@@ -995,8 +958,7 @@ class WebServer:
                 if len(warnings_data[user_id]) == 0:
                     del warnings_data[user_id]
                 
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(warnings_data, f, ensure_ascii=False, indent=4)
+                self.bot.data_store.set(guild_id, 'warnings', warnings_data)
                 
                 return web.json_response({
                     'success': True, 
@@ -1023,12 +985,10 @@ class WebServer:
             return web.json_response({'error': 'Forbidden'}, status=403)
         
         try:
-            file_path = f'./data/{guild_id}/achievements.json'
-            if not os.path.exists(file_path):
+            if not self.bot.data_store.exists(guild_id, 'achievements'):
                 return web.json_response({'achievements': {}})
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                achievements_data = json.load(f)
+            achievements_data = await self.bot.data_store.load(guild_id, 'achievements')
             
             # 獲取用戶信息和成就定義
             guild = self.bot.get_guild(int(guild_id))
@@ -1087,14 +1047,8 @@ class WebServer:
         achievement_id = request.match_info['achievement_id']
         
         try:
-            file_path = f'./data/{guild_id}/achievements.json'
-            
             # 載入數據
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    achievements_data = json.load(f)
-            else:
-                achievements_data = {}
+            achievements_data = await self.bot.data_store.load(guild_id, 'achievements')
             
             # 添加成就
             if user_id not in achievements_data:
@@ -1104,9 +1058,7 @@ class WebServer:
                 achievements_data[user_id].append(achievement_id)
                 
                 # 保存
-                os.makedirs(f'./data/{guild_id}', exist_ok=True)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(achievements_data, f, ensure_ascii=False, indent=4)
+                self.bot.data_store.set(guild_id, 'achievements', achievements_data)
                 
                 return web.json_response({
                     'success': True, 
@@ -1138,12 +1090,10 @@ class WebServer:
         achievement_id = request.match_info['achievement_id']
         
         try:
-            file_path = f'./data/{guild_id}/achievements.json'
-            if not os.path.exists(file_path):
+            if not self.bot.data_store.exists(guild_id, 'achievements'):
                 return web.json_response({'success': False, 'message': '沒有成就記錄'})
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                achievements_data = json.load(f)
+            achievements_data = await self.bot.data_store.load(guild_id, 'achievements')
             
             if user_id in achievements_data and achievement_id in achievements_data[user_id]:
                 achievements_data[user_id].remove(achievement_id)
@@ -1151,8 +1101,7 @@ class WebServer:
                 if len(achievements_data[user_id]) == 0:
                     del achievements_data[user_id]
                 
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(achievements_data, f, ensure_ascii=False, indent=4)
+                self.bot.data_store.set(guild_id, 'achievements', achievements_data)
                 
                 return web.json_response({
                     'success': True, 
@@ -1181,8 +1130,7 @@ class WebServer:
             return web.json_response({'error': 'Forbidden'}, status=403)
         
         try:
-            file_path = f'./data/{guild_id}/tickets.json'
-            if not os.path.exists(file_path):
+            if not self.bot.data_store.exists(guild_id, 'tickets'):
                 return web.json_response({
                     'exists': False,
                     'data': {
@@ -1195,8 +1143,8 @@ class WebServer:
                     }
                 })
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # 複製一份再添加顯示用欄位，避免寫回共享數據
+            data = copy.deepcopy(await self.bot.data_store.load(guild_id, 'tickets'))
             
             # 豐富客服單信息（添加用戶名等）
             guild = self.bot.get_guild(int(guild_id))
@@ -1230,21 +1178,16 @@ class WebServer:
         
         try:
             body = await request.json()
-            file_path = f'./data/{guild_id}/tickets.json'
             
             # 讀取現有數據
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            else:
-                data = {
-                    'enabled': False,
-                    'category_id': None,
-                    'support_role_id': None,
-                    'log_channel_id': None,
-                    'tickets': {},
-                    'ticket_count': 0
-                }
+            data = await self.bot.data_store.load(guild_id, 'tickets', lambda: {
+                'enabled': False,
+                'category_id': None,
+                'support_role_id': None,
+                'log_channel_id': None,
+                'tickets': {},
+                'ticket_count': 0
+            })
             
             # 更新設定
             if 'enabled' in body:
@@ -1259,9 +1202,7 @@ class WebServer:
                 data['panel_channel_id'] = body['panel_channel_id']
             
             # 保存數據
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            self.bot.data_store.set(guild_id, 'tickets', data)
             
             return web.json_response({'success': True, 'message': '設定已更新'})
             
@@ -1276,54 +1217,66 @@ class WebServer:
         }, status=403)
     
     async def api_my_tickets(self, request):
-        """API：獲取當前用戶的所有客服單"""
+        """API：獲取當前用戶的客服單（分頁，?page=1&per_page=50）"""
         session = await get_session(request)
         user = session.get('user')
         
         if not user:
             return web.json_response({'error': 'Unauthorized'}, status=401)
         
-        user_id = user['id']
+        user_id = str(user['id'])
         
         try:
-            all_tickets = []
-            server_map = {}
+            page = max(int(request.query.get('page', 1)), 1)
+            per_page = min(max(int(request.query.get('per_page', 50)), 1), 100)
+        except ValueError:
+            return web.json_response({'error': '無效的分頁參數'}, status=400)
+        
+        try:
+            # 從用戶客服單索引查詢（由客服單系統維護），最新的在前
+            tickets_cog = self.bot.get_cog('Tickets')
+            if tickets_cog:
+                entries = tickets_cog.get_user_tickets(user_id)
+            else:
+                entries = (await self.bot.data_store.load(None, 'ticket_user_index')).get(user_id, [])
             
-            # 遍歷所有伺服器，找出用戶的客服單
-            for guild in self.bot.guilds:
-                guild_id = str(guild.id)
-                file_path = f'./data/{guild_id}/tickets.json'
-                
-                if not os.path.exists(file_path):
+            found = []
+            counts = {'open': 0, 'closed': 0}
+            for guild_id, ticket_id in reversed(entries):
+                guild = self.bot.get_guild(int(guild_id))
+                if not guild:
                     continue
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    # 找出屬於該用戶的客服單
-                    for ticket_id, ticket in data.get('tickets', {}).items():
-                        if str(ticket.get('user_id')) == str(user_id):
-                            ticket_info = {
-                                'ticket_id': ticket_id,
-                                'guild_id': guild_id,
-                                'channel_name': ticket.get('channel_name', '未知'),
-                                'channel_id': ticket.get('channel_id'),
-                                'status': ticket.get('status', 'unknown'),
-                                'created_at': ticket.get('created_at', ''),
-                                'closed_at': ticket.get('closed_at'),
-                                'closed_reason': ticket.get('close_reason')
-                            }
-                            all_tickets.append(ticket_info)
-                            server_map[guild_id] = guild.name
-                
-                except Exception as e:
-                    print(f"讀取伺服器 {guild.name} 的客服單時發生錯誤: {e}")
+                ticket = (await self.bot.data_store.load(guild_id, 'tickets')).get('tickets', {}).get(ticket_id)
+                if not ticket:
                     continue
+                status = ticket.get('status', 'unknown')
+                counts[status] = counts.get(status, 0) + 1
+                found.append((guild, ticket_id, ticket))
+            
+            all_tickets = []
+            server_map = {}
+            for guild, ticket_id, ticket in found[(page - 1) * per_page:page * per_page]:
+                guild_id = str(guild.id)
+                all_tickets.append({
+                    'ticket_id': ticket_id,
+                    'guild_id': guild_id,
+                    'channel_name': ticket.get('channel_name', '未知'),
+                    'channel_id': ticket.get('channel_id'),
+                    'status': ticket.get('status', 'unknown'),
+                    'created_at': ticket.get('created_at', ''),
+                    'closed_at': ticket.get('closed_at'),
+                    'closed_reason': ticket.get('close_reason')
+                })
+                server_map[guild_id] = guild.name
             
             return web.json_response({
                 'tickets': all_tickets,
-                'servers': server_map
+                'servers': server_map,
+                'page': page,
+                'per_page': per_page,
+                'total': len(found),
+                'pages': (len(found) + per_page - 1) // per_page,
+                'counts': counts
             })
             
         except Exception as e:
@@ -1344,10 +1297,8 @@ class WebServer:
         if not await self.check_guild_permission(user['id'], guild_id, session.get('access_token')):
             # 如果不是管理員，檢查是否為客服單創建者
             try:
-                file_path = f'./data/{guild_id}/tickets.json'
-                if os.path.exists(file_path):
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
+                if self.bot.data_store.exists(guild_id, 'tickets'):
+                    data = await self.bot.data_store.load(guild_id, 'tickets')
                     if ticket_id in data['tickets']:
                         ticket = data['tickets'][ticket_id]
                         if str(ticket.get('user_id')) != str(user['id']):
@@ -1361,12 +1312,10 @@ class WebServer:
         
         try:
             # 獲取客服單數據
-            file_path = f'./data/{guild_id}/tickets.json'
-            if not os.path.exists(file_path):
+            if not self.bot.data_store.exists(guild_id, 'tickets'):
                 return web.json_response({'error': '找不到客服單'}, status=404)
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = await self.bot.data_store.load(guild_id, 'tickets')
             
             if ticket_id not in data['tickets']:
                 return web.json_response({'error': '客服單不存在'}, status=404)
@@ -1381,35 +1330,100 @@ class WebServer:
             is_admin = False
             access_token = session.get('access_token')
             if access_token:
-                async with ClientSession() as client_session:
-                    headers = {'Authorization': f"Bearer {access_token}"}
-                    async with client_session.get('https://discord.com/api/users/@me/guilds', headers=headers) as resp:
-                        if resp.status == 200:
-                            user_guilds = await resp.json()
-                            for guild in user_guilds:
-                                if str(guild['id']) == str(guild_id):
-                                    permissions = int(guild.get('permissions', 0))
-                                    is_admin = (permissions & 0x8) == 0x8
-                                    break
+                user_guilds = await self.get_user_guilds(access_token) or []
+                for guild in user_guilds:
+                    if str(guild['id']) == str(guild_id):
+                        permissions = int(guild.get('permissions', 0))
+                        is_admin = (permissions & 0x8) == 0x8
+                        break
             
             if not (is_ticket_owner or is_admin):
                 return web.json_response({'error': '無權查看此客服單'}, status=403)
             
-            # 獲取HTML文件
             channel_name = ticket.get('channel_name', f"客服單-{ticket_id}")
-            transcript_path = f'./data/{guild_id}/ticket/{channel_name}-{ticket_id}.html'
             
-            if not os.path.exists(transcript_path):
-                return web.json_response({'error': '找不到聊天記錄'}, status=404)
+            # 開啟中的客服單：先寫入緩衝中的消息
+            tickets_cog = self.bot.get_cog('Tickets')
+            if tickets_cog and ticket.get('status') == 'open':
+                await tickets_cog.flush_transcript(guild_id, ticket_id, channel_name)
+            
+            transcript_path = transcripts.transcript_path(guild_id, ticket_id, channel_name)
+            if os.path.exists(transcript_path):
+                return await self.stream_transcript(request, guild_id, ticket_id, ticket, transcript_path)
             
-            with open(transcript_path, 'r', encoding='utf-8') as f:
-                html_content = f.read()
+            # 舊版 HTML 聊天記錄直接以文件串流回傳
+            legacy_path = transcripts.legacy_transcript_path(guild_id, ticket_id, channel_name)
+            if os.path.exists(legacy_path):
+                return web.FileResponse(legacy_path, headers={'Content-Type': 'text/html; charset=utf-8'})
             
-            return web.Response(text=html_content, content_type='text/html')
+            return web.json_response({'error': '找不到聊天記錄'}, status=404)
             
         except Exception as e:
             return web.json_response({'error': str(e)}, status=500)
     
+    async def stream_transcript(self, request, guild_id, ticket_id, ticket, path):
+        """將 NDJSON 聊天記錄渲染為 HTML 並串流回傳
+        
+        可用 ?page=N 分頁查看（每頁 TRANSCRIPT_PAGE_SIZE 則消息）。
+        已關閉客服單的完整渲染結果會快取到磁碟，之後直接回傳快取文件。
+        """
+        channel_name = ticket.get('channel_name', f"客服單-{ticket_id}")
+        headers = {'Content-Type': 'text/html; charset=utf-8'}
+        
+        page = None
+        if 'page' in request.query:
+            try:
+                page = max(int(request.query['page']), 0)
+            except ValueError:
+                page = 0
+        
+        closed = ticket.get('status') == 'closed'
+        cache_path = transcripts.rendered_cache_path(guild_id, ticket_id, channel_name)
+        use_cache = closed and page is None
+        if use_cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            return web.FileResponse(cache_path, headers=headers)
+        
+        chunks = transcripts.render_html(
+            transcripts.read_records(path),
+            page=page,
+            page_url=lambda p: f'{request.path}?page={p}'
+        )
+        cache_file = None
+        tmp_path = None
+        if use_cache:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix='.tmp')
+            cache_file = os.fdopen(fd, 'w', encoding='utf-8')
+        
+        def next_chunk():
+            # 解壓縮、渲染與寫入快取都在執行緒中進行
+            chunk = next(chunks, None)
+            if chunk is not None and cache_file is not None:
+                cache_file.write(chunk)
+            return chunk
+        
+        response = web.StreamResponse(headers=headers)
+        await response.prepare(request)
+        loop = asyncio.get_running_loop()
+        complete = False
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next_chunk)
+                if chunk is None:
+                    break
+                await response.write(chunk.encode('utf-8'))
+            complete = True
+        finally:
+            if cache_file is not None:
+                cache_file.close()
+                if complete:
+                    os.replace(tmp_path, cache_path)
+                else:
+                    os.remove(tmp_path)
+        
+        await response.write_eof()
+        return response
+    
     async def api_create_ticket_panel(self, request):
         """API：創建客服單面板"""
         session = await get_session(request)
@@ -1461,28 +1475,21 @@ class WebServer:
             message = await channel.send(embed=embed, view=view)
             
             # 保存面板訊息ID
-            file_path = f'./data/{guild_id}/tickets.json'
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            else:
-                data = {
-                    'enabled': False,
-                    'category_id': None,
-                    'support_role_id': None,
-                    'log_channel_id': None,
-                    'panel_channel_id': None,
-                    'panel_message_id': None,
-                    'tickets': {},
-                    'ticket_count': 0
-                }
+            data = await self.bot.data_store.load(guild_id, 'tickets', lambda: {
+                'enabled': False,
+                'category_id': None,
+                'support_role_id': None,
+                'log_channel_id': None,
+                'panel_channel_id': None,
+                'panel_message_id': None,
+                'tickets': {},
+                'ticket_count': 0
+            })
             
             data['panel_channel_id'] = str(channel_id)
             data['panel_message_id'] = str(message.id)
             
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            self.bot.data_store.set(guild_id, 'tickets', data)
             
             return web.json_response({
                 'success': True,
@@ -1509,17 +1516,15 @@ class WebServer:
         if not await self.check_guild_permission(session.get('user')['id'], guild_id, session.get('access_token')):
             return web.json_response({'error': 'Forbidden'}, status=403)
         
-        file_path = f'./data/{guild_id}/auto_reply.json'
-        
-        if not os.path.exists(file_path):
+        if not self.bot.data_store.exists(guild_id, 'auto_reply'):
             return web.json_response({
                 'enabled': True,
                 'rules': []
             })
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # 複製一份再添加顯示用欄位，避免寫回共享數據
+            data = copy.deepcopy(await self.bot.data_store.load(guild_id, 'auto_reply'))
             
             # 獲取伺服器頻道和角色信息
             guild = self.bot.get_guild(int(guild_id))
@@ -1565,12 +1570,7 @@ class WebServer:
             data_input = await request.json()
             
             # 載入現有數據
-            file_path = f'./data/{guild_id}/auto_reply.json'
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            else:
-                data = {'enabled': True, 'rules': []}
+            data = await self.bot.data_store.load(guild_id, 'auto_reply', lambda: {'enabled': True, 'rules': []})
             
             # 創建新規則
             new_rule = {
@@ -1594,9 +1594,8 @@ class WebServer:
             data.setdefault('rules', []).append(new_rule)
             
             # 保存
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'auto_reply', data)
+            self.invalidate_auto_reply_engine(guild_id)
             
             return web.json_response({'success': True, 'rule': new_rule})
         except Exception as e:
@@ -1620,12 +1619,10 @@ class WebServer:
         try:
             data_input = await request.json()
             
-            file_path = f'./data/{guild_id}/auto_reply.json'
-            if not os.path.exists(file_path):
+            if not self.bot.data_store.exists(guild_id, 'auto_reply'):
                 return web.json_response({'error': '找不到自動回覆數據'}, status=404)
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = await self.bot.data_store.load(guild_id, 'auto_reply')
             
             # 查找並更新規則
             found = False
@@ -1650,8 +1647,8 @@ class WebServer:
                 return web.json_response({'error': '找不到指定規則'}, status=404)
             
             # 保存
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'auto_reply', data)
+            self.invalidate_auto_reply_engine(guild_id)
             
             return web.json_response({'success': True})
         except Exception as e:
@@ -1673,12 +1670,10 @@ class WebServer:
         rule_id = int(request.match_info.get('rule_id'))
         
         try:
-            file_path = f'./data/{guild_id}/auto_reply.json'
-            if not os.path.exists(file_path):
+            if not self.bot.data_store.exists(guild_id, 'auto_reply'):
                 return web.json_response({'error': '找不到自動回覆數據'}, status=404)
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = await self.bot.data_store.load(guild_id, 'auto_reply')
             
             # 刪除規則
             original_length = len(data.get('rules', []))
@@ -1688,8 +1683,8 @@ class WebServer:
                 return web.json_response({'error': '找不到指定規則'}, status=404)
             
             # 保存
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'auto_reply', data)
+            self.invalidate_auto_reply_engine(guild_id)
             
             return web.json_response({'success': True})
         except Exception as e:
@@ -1712,19 +1707,13 @@ class WebServer:
             data_input = await request.json()
             enabled = data_input.get('enabled', True)
             
-            file_path = f'./data/{guild_id}/auto_reply.json'
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            else:
-                data = {'enabled': True, 'rules': []}
+            data = await self.bot.data_store.load(guild_id, 'auto_reply', lambda: {'enabled': True, 'rules': []})
             
             data['enabled'] = enabled
             
             # 保存
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'auto_reply', data)
+            self.invalidate_auto_reply_engine(guild_id)
             
             return web.json_response({'success': True, 'enabled': enabled})
         except Exception as e:
@@ -1749,12 +1738,10 @@ class WebServer:
             data_input = await request.json()
             enabled = data_input.get('enabled', True)
             
-            file_path = f'./data/{guild_id}/auto_reply.json'
-            if not os.path.exists(file_path):
+            if not self.bot.data_store.exists(guild_id, 'auto_reply'):
                 return web.json_response({'error': '找不到自動回覆數據'}, status=404)
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = await self.bot.data_store.load(guild_id, 'auto_reply')
             
             # 更新規則狀態
             found = False
@@ -1768,8 +1755,8 @@ class WebServer:
                 return web.json_response({'error': '找不到指定規則'}, status=404)
             
             # 保存
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'auto_reply', data)
+            self.invalidate_auto_reply_engine(guild_id)
             
             return web.json_response({'success': True, 'enabled': enabled})
         except Exception as e:
@@ -1793,21 +1780,16 @@ class WebServer:
                 return web.json_response({'error': 'Forbidden'}, status=403)
             
             # 獲取數據
-            filepath = f"./data/{guild_id}/security.json"
-            if os.path.exists(filepath):
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            else:
-                data = {
-                    "enabled": True,
-                    "banned_words": [],
-                    "timeout_duration": 60,
-                    "action_type": "timeout",
-                    "whitelist_roles": [],
-                    "whitelist_channels": [],
-                    "case_sensitive": False,
-                    "match_type": "contains"
-                }
+            data = await self.bot.data_store.load(guild_id, 'security', lambda: {
+                "enabled": True,
+                "banned_words": [],
+                "timeout_duration": 60,
+                "action_type": "timeout",
+                "whitelist_roles": [],
+                "whitelist_channels": [],
+                "case_sensitive": False,
+                "match_type": "contains"
+            })
             
             return web.json_response(data)
         except Exception as e:
@@ -1846,33 +1828,24 @@ class WebServer:
                     return web.json_response({'error': '無效的匹配模式'}, status=400)
             
             # 保存數據
-            folder = f"./data/{guild_id}"
-            os.makedirs(folder, exist_ok=True)
-            
-            filepath = f"{folder}/security.json"
-            
             # 讀取現有數據或創建新數據
-            if os.path.exists(filepath):
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-            else:
-                existing_data = {
-                    "enabled": True,
-                    "banned_words": [],
-                    "timeout_duration": 60,
-                    "action_type": "timeout",
-                    "whitelist_roles": [],
-                    "whitelist_channels": [],
-                    "case_sensitive": False,
-                    "match_type": "contains"
-                }
+            existing_data = await self.bot.data_store.load(guild_id, 'security', lambda: {
+                "enabled": True,
+                "banned_words": [],
+                "timeout_duration": 60,
+                "action_type": "timeout",
+                "whitelist_roles": [],
+                "whitelist_channels": [],
+                "case_sensitive": False,
+                "match_type": "contains"
+            })
             
             # 更新數據
             existing_data.update(data)
             
             # 保存
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(existing_data, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'security', existing_data)
+            self.invalidate_security_matcher(guild_id)
             
             return web.json_response({'success': True, 'data': existing_data})
         except Exception as e:
@@ -1901,24 +1874,16 @@ class WebServer:
                 return web.json_response({'error': '違禁詞不能為空'}, status=400)
             
             # 讀取現有數據
-            folder = f"./data/{guild_id}"
-            os.makedirs(folder, exist_ok=True)
-            filepath = f"{folder}/security.json"
-            
-            if os.path.exists(filepath):
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    security_data = json.load(f)
-            else:
-                security_data = {
-                    "enabled": True,
-                    "banned_words": [],
-                    "timeout_duration": 60,
-                    "action_type": "timeout",
-                    "whitelist_roles": [],
-                    "whitelist_channels": [],
-                    "case_sensitive": False,
-                    "match_type": "contains"
-                }
+            security_data = await self.bot.data_store.load(guild_id, 'security', lambda: {
+                "enabled": True,
+                "banned_words": [],
+                "timeout_duration": 60,
+                "action_type": "timeout",
+                "whitelist_roles": [],
+                "whitelist_channels": [],
+                "case_sensitive": False,
+                "match_type": "contains"
+            })
             
             # 檢查是否已存在
             if word in security_data['banned_words']:
@@ -1928,8 +1893,8 @@ class WebServer:
             security_data['banned_words'].append(word)
             
             # 保存
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(security_data, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'security', security_data)
+            self.invalidate_security_matcher(guild_id)
             
             return web.json_response({'success': True, 'word': word, 'banned_words': security_data['banned_words']})
         except Exception as e:
@@ -1958,12 +1923,10 @@ class WebServer:
                 return web.json_response({'error': '違禁詞不能為空'}, status=400)
             
             # 讀取現有數據
-            filepath = f"./data/{guild_id}/security.json"
-            if not os.path.exists(filepath):
+            if not self.bot.data_store.exists(guild_id, 'security'):
                 return web.json_response({'error': '安全系統數據不存在'}, status=404)
             
-            with open(filepath, 'r', encoding='utf-8') as f:
-                security_data = json.load(f)
+            security_data = await self.bot.data_store.load(guild_id, 'security')
             
             # 檢查是否存在
             if word not in security_data['banned_words']:
@@ -1973,13 +1936,85 @@ class WebServer:
             security_data['banned_words'].remove(word)
             
             # 保存
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(security_data, f, ensure_ascii=False, indent=2)
+            self.bot.data_store.set(guild_id, 'security', security_data)
+            self.invalidate_security_matcher(guild_id)
             
             return web.json_response({'success': True, 'word': word, 'banned_words': security_data['banned_words']})
         except Exception as e:
             return web.json_response({'error': str(e)}, status=500)
     
+    def invalidate_auto_reply_engine(self, guild_id):
+        """自動回覆規則變更後通知自動回覆系統重新編譯規則"""
+        auto_reply_cog = self.bot.get_cog('AutoReply')
+        if auto_reply_cog:
+            auto_reply_cog.invalidate_engine(guild_id)
+    
+    def invalidate_security_matcher(self, guild_id):
+        """違禁詞設定變更後通知安全系統重新編譯匹配器"""
+        security_cog = self.bot.get_cog('SecuritySystem')
+        if security_cog:
+            security_cog.invalidate_matcher(guild_id)
+    
+    def invalidate_temp_voice_config(self, guild_id):
+        """臨時語音配置變更後清除臨時語音系統的配置快取"""
+        temp_voice_cog = self.bot.get_cog('TempVoice')
+        if temp_voice_cog:
+            temp_voice_cog.invalidate_config(guild_id)
+    
+    async def get_http_session(self):
+        """獲取共用的 HTTP 連線池（第一次使用時建立）"""
+        if self.http_session is None or self.http_session.closed:
+            self.http_session = ClientSession()
+        return self.http_session
+    
+    async def get_user_guilds(self, access_token):
+        """獲取用戶的 Discord 伺服器列表
+        
+        結果依 access token 快取 WEB_GUILDS_CACHE_TTL 秒；同一個 token 同時進行的
+        查詢只會向 Discord 發出一次請求。請求失敗（例如被限速）時若有過期的快取則沿用。
+        
+        Returns:
+            list: 伺服器列表，失敗時為 None
+        """
+        if not access_token:
+            return None
+        
+        cached = self._guilds_cache.get(access_token)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        task = self._guilds_inflight.get(access_token)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_user_guilds(access_token))
+            self._guilds_inflight[access_token] = task
+            task.add_done_callback(lambda _: self._guilds_inflight.pop(access_token, None))
+        
+        # shield：單一請求被取消時不影響其他等待同一個結果的請求
+        try:
+            user_guilds = await asyncio.shield(task)
+        except Exception as e:
+            print(f"獲取用戶伺服器列表錯誤: {e}")
+            user_guilds = None
+        if user_guilds is None and cached:
+            return cached[1]
+        return user_guilds
+    
+    async def _fetch_user_guilds(self, access_token):
+        """向 Discord 請求用戶的伺服器列表並寫入快取"""
+        http_session = await self.get_http_session()
+        headers = {'Authorization': f"Bearer {access_token}"}
+        async with http_session.get(f'{self.discord_api}/users/@me/guilds', headers=headers) as resp:
+            if resp.status != 200:
+                return None
+            user_guilds = await resp.json()
+        
+        now = time.monotonic()
+        # 順便清除過期的快取
+        if len(self._guilds_cache) >= 1000:
+            self._guilds_cache = {token: entry for token, entry in self._guilds_cache.items() if entry[0] > now}
+        self._guilds_cache[access_token] = (now + self.guilds_cache_ttl, user_guilds)
+        return user_guilds
+    
     def is_developer(self, user_id):
         """檢查用戶是否為開發者"""
         return int(user_id) in self.dev_ids
@@ -2000,18 +2035,14 @@ class WebServer:
             return True
         
         # 檢查機器人是否在該伺服器中
-        bot_guild_ids = {str(guild.id) for guild in self.bot.guilds}
-        if guild_id not in bot_guild_ids:
+        if not str(guild_id).isdigit() or not self.bot.get_guild(int(guild_id)):
             return False
         
         # 獲取用戶的 Discord 伺服器列表
         try:
-            async with ClientSession() as client_session:
-                headers = {'Authorization': f"Bearer {access_token}"}
-                async with client_session.get('https://discord.com/api/users/@me/guilds', headers=headers) as resp:
-                    if resp.status != 200:
-                        return False
-                    user_guilds = await resp.json()
+            user_guilds = await self.get_user_guilds(access_token)
+            if user_guilds is None:
+                return False
             
             # 檢查用戶是否對該伺服器有管理權限
             for guild in user_guilds:
@@ -2050,6 +2081,44 @@ class WebServer:
         
         return web.Response(text=html, content_type='text/html')
     
+    async def metrics(self, request):
+        """效能指標（Prometheus 文字格式）"""
+        if self.metrics_token:
+            # 只接受 Authorization 標頭（避免令牌出現在網址與存取日誌中）
+            auth = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(auth.encode(), f'Bearer {self.metrics_token}'.encode()):
+                return web.Response(text='Unauthorized\n', status=401)
+        else:
+            # 未設定令牌時僅限已登入的開發者
+            session = await get_session(request)
+            user = session.get('user')
+            if not user:
+                return web.Response(text='Unauthorized\n', status=401)
+            if not self.is_developer(user['id']):
+                return web.Response(text='Forbidden\n', status=403)
+        return web.Response(
+            text=self.bot.metrics.render(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+    
+    async def api_dev_metrics(self, request):
+        """API：效能指標摘要（開發者專用）"""
+        session = await get_session(request)
+        user = session.get('user')
+        
+        if not user:
+            return web.json_response({'error': 'Unauthorized'}, status=401)
+        
+        if not self.is_developer(user['id']):
+            return web.json_response({'error': 'Forbidden'}, status=403)
+        
+        limit = request.query.get('limit', '30')
+        limit = int(limit) if limit.isdigit() else 30
+        return web.json_response({
+            'uptime': time.time() - self.bot.metrics.started_at,
+            'rows': self.bot.metrics.summary(limit)
+        })
+    
     async def api_dev_all_guilds(self, request):
         """API：獲取所有伺服器列表（開發者專用）"""
         try:
@@ -2118,20 +2187,14 @@ class WebServer:
                 return web.json_response({'error': 'Guild not found'}, status=404)
             
             # 讀取所有配置文件
-            data_dir = os.path.join('data', guild_id)
             configs = {}
             
-            if os.path.exists(data_dir):
-                for filename in os.listdir(data_dir):
-                    if filename.endswith('.json'):
-                        filepath = os.path.join(data_dir, filename)
-                        try:
-                            with open(filepath, 'r', encoding='utf-8') as f:
-                                config_name = filename[:-5]  # 移除 .json
-                                configs[config_name] = json.load(f)
-                        except Exception as e:
-                            print(f"讀取配置文件 {filename} 失敗: {e}")
-                            configs[filename] = {'error': str(e)}
+            for config_name in self.bot.data_store.list_names(guild_id):
+                try:
+                    configs[config_name] = await self.bot.data_store.load(guild_id, config_name)
+                except Exception as e:
+                    print(f"讀取配置文件 {config_name}.json 失敗: {e}")
+                    configs[config_name] = {'error': str(e)}
             
             # 獲取伺服器基本資訊
             guild_info = {
@@ -2223,9 +2286,18 @@ class WebServer:
         """啟動 Web 伺服器"""
         runner = web.AppRunner(self.app)
         await runner.setup()
+        self.runner = runner
         site = web.TCPSite(runner, self.host, self.port)
         await site.start()
         print(f'🌐 網頁控制台已啟動: http://{self.host}:{self.port}')
         print(f'   本地訪問: http://localhost:{self.port}')
         if self.dev_ids:
             print(f'👨‍💻 開發者面板: http://localhost:{self.port}/dev-panel')
+    
+    async def stop(self):
+        """停止 Web 伺服器並關閉 HTTP 連線池"""
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+        if self.http_session is not None and not self.http_session.closed:
+            await self.http_session.close()